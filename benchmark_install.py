@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Install benchmark - Times a cold offline install against host.py's HTTP/1.1 and HTTP/2 servers
+Downloads everything the service worker fetches on a first visit (the files in
+resource-manifest.json) the way a browser would: over 6 connections for
+HTTP/1.1, multiplexed over a single connection for HTTP/2.
+Automatically manages a virtual environment for dependencies
+
+Usage:
+	python benchmark_install.py [--runs=N] [--latency=MS]
+
+--latency adds a simulated round trip (in milliseconds) between the client and
+the server, which is where multiplexing pays off; on localhost the difference
+is mostly connection and TLS setup.
+"""
+
+import http.client
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import socketserver
+import ssl
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+
+import profiling
+from options import get_option
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+CERT_HOSTS = ["localhost", "127.0.0.1"]
+
+HTTP1_CONNECTIONS = 6  # What browsers open per origin
+HTTP2_MAX_STREAMS = 100
+HTTP2_WINDOW = 16 * 1024 * 1024
+DEFAULT_RUNS = 3
+READ_SIZE = 64 * 1024
+
+
+def install_paths(root=SCRIPT_DIR):
+	"""URL paths a cold install downloads, in the service worker's order"""
+	with open(root / "resource-manifest.json", "r", encoding="utf-8") as f:
+		resource_manifest = json.load(f)
+
+	urls = [
+		"service-worker.js",
+		"manifest.json",
+		"resource-manifest.json",
+		*resource_manifest.get("static_files", []),
+		*resource_manifest.get("tracks", []),
+	]
+	return ["/" + quote("" if url == "./" else url) for url in dict.fromkeys(urls)]
+
+
+def serve(mode, port):
+	"""Run one of host.py's servers (in a child process) until terminated"""
+	import host
+
+	os.chdir(SCRIPT_DIR)
+	if mode == "http":
+		# What host.py runs without --watch or --https
+		server = socketserver.TCPServer(("127.0.0.1", port), host.QuietHandler)
+	else:
+		import http2
+		server = http2.SecureServer(("127.0.0.1", port), host.QuietHandler, http2.server_context(CERT_HOSTS))
+	server.serve_forever()
+
+
+def free_port():
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+	deadline = time.time() + timeout
+	while time.time() < deadline:
+		try:
+			socket.create_connection(("127.0.0.1", port), timeout=1).close()
+			return True
+		except OSError:
+			time.sleep(0.05)
+	return False
+
+
+def start_latency_relay(target_port, latency):
+	"""Forward connections to target_port, delaying data by half of latency each way
+
+	Returns the port to connect to instead.
+	"""
+	listener = socket.create_server(("127.0.0.1", 0))
+
+	def pipe(source, destination):
+		chunks = queue.Queue()
+
+		def read():
+			while True:
+				try:
+					data = source.recv(READ_SIZE)
+				except OSError:
+					data = b""
+				chunks.put((time.perf_counter() + latency / 2, data))
+				if not data:
+					return
+
+		threading.Thread(target=read, daemon=True).start()
+		while True:
+			due, data = chunks.get()
+			delay = due - time.perf_counter()
+			if delay > 0:
+				time.sleep(delay)
+			try:
+				if not data:
+					destination.shutdown(socket.SHUT_WR)
+					return
+				destination.sendall(data)
+			except OSError:
+				return
+
+	def accept():
+		while True:
+			client, _ = listener.accept()
+			server = socket.create_connection(("127.0.0.1", target_port))
+			threading.Thread(target=pipe, args=(client, server), daemon=True).start()
+			threading.Thread(target=pipe, args=(server, client), daemon=True).start()
+
+	threading.Thread(target=accept, daemon=True).start()
+	return listener.getsockname()[1]
+
+
+def client_context(protocol):
+	"""TLS client context that accepts the self-signed certificate"""
+	context = ssl.create_default_context()
+	context.check_hostname = False
+	context.verify_mode = ssl.CERT_NONE
+	context.set_alpn_protocols([protocol])
+	return context
+
+
+def fetch_http1(port, paths, secure):
+	"""Download every path over HTTP1_CONNECTIONS parallel connections; returns bytes received"""
+	context = client_context("http/1.1") if secure else None
+
+	def fetch(path):
+		if secure:
+			connection = http.client.HTTPSConnection("127.0.0.1", port, context=context)
+		else:
+			connection = http.client.HTTPConnection("127.0.0.1", port)
+		try:
+			connection.request("GET", path)
+			response = connection.getresponse()
+			body = response.read()
+			if response.status != 200:
+				raise RuntimeError(f"{path}: HTTP {response.status}")
+			return len(body)
+		finally:
+			connection.close()
+
+	with ThreadPoolExecutor(max_workers=HTTP1_CONNECTIONS) as pool:
+		return sum(pool.map(fetch, paths))
+
+
+def fetch_http2(port, paths):
+	"""Download every path as streams on one HTTP/2 connection; returns bytes received"""
+	import h2.config
+	import h2.connection
+	import h2.events
+	import h2.settings
+
+	sock = client_context("h2").wrap_socket(socket.create_connection(("127.0.0.1", port)),
+	                                       server_hostname="localhost")
+	with sock:
+		if sock.selected_alpn_protocol() != "h2":
+			raise RuntimeError("the server didn't agree to HTTP/2")
+
+		connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=True))
+		connection.initiate_connection()
+		connection.update_settings({h2.settings.SettingCodes.INITIAL_WINDOW_SIZE: HTTP2_WINDOW})
+		connection.increment_flow_control_window(HTTP2_WINDOW)
+		sock.sendall(connection.data_to_send())
+
+		waiting = list(paths)
+		open_streams = {}
+		received = 0
+		while waiting or open_streams:
+			limit = min(HTTP2_MAX_STREAMS, connection.remote_settings.max_concurrent_streams)
+			while waiting and len(open_streams) < limit:
+				path = waiting.pop(0)
+				stream_id = connection.get_next_available_stream_id()
+				connection.send_headers(stream_id, [
+					(":method", "GET"),
+					(":path", path),
+					(":scheme", "https"),
+					(":authority", "localhost"),
+				], end_stream=True)
+				open_streams[stream_id] = path
+			sock.sendall(connection.data_to_send())
+
+			data = sock.recv(READ_SIZE)
+			if not data:
+				raise RuntimeError("the server closed the connection")
+			for event in connection.receive_data(data):
+				if isinstance(event, h2.events.ResponseReceived):
+					status = dict(event.headers).get(b":status")
+					if status != b"200":
+						raise RuntimeError(f"{open_streams[event.stream_id]}: HTTP {status.decode()}")
+				elif isinstance(event, h2.events.DataReceived):
+					received += len(event.data)
+					connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+				elif isinstance(event, h2.events.StreamEnded):
+					open_streams.pop(event.stream_id, None)
+				elif isinstance(event, h2.events.StreamReset):
+					raise RuntimeError(f"{open_streams.get(event.stream_id)}: stream reset")
+			sock.sendall(connection.data_to_send())
+
+		return received
+
+
+def run_benchmark(runs=DEFAULT_RUNS, latency_ms=0):
+	"""Time cold installs against each server and print a comparison"""
+	import http2
+
+	try:
+		paths = install_paths()
+	except (OSError, ValueError) as e:
+		print(f"✗ Could not read resource-manifest.json ({e}); run generate_manifests.py first")
+		return False
+
+	try:
+		http2.ensure_certificate(CERT_HOSTS)
+	except RuntimeError as e:
+		print(f"✗ {e}")
+		return False
+
+	modes = [
+		("HTTP/1.1, 6 connections (host.py)", "http", lambda port: fetch_http1(port, paths, secure=False)),
+		("HTTP/1.1 over TLS, 6 connections (--https)", "https", lambda port: fetch_http1(port, paths, secure=True)),
+	]
+	if http2.h2 is not None:
+		modes.append(("HTTP/2, 1 connection (--https)", "https", lambda port: fetch_http2(port, paths)))
+	else:
+		print("Note: h2 not installed, skipping the HTTP/2 run")
+
+	servers = {}
+	for mode in ("http", "https"):
+		port = free_port()
+		process = multiprocessing.Process(target=serve, args=(mode, port), daemon=True)
+		process.start()
+		servers[mode] = (process, port)
+
+	results = []
+	total_bytes = 0
+	try:
+		for label, mode, fetch in modes:
+			process, port = servers[mode]
+			if not wait_for_port(port):
+				print(f"✗ The {mode} server didn't start")
+				return False
+			if latency_ms:
+				port = start_latency_relay(port, latency_ms / 1000)
+
+			times = []
+			for _ in range(runs):
+				started = time.perf_counter()
+				try:
+					total_bytes = fetch(port)
+				except (OSError, RuntimeError) as e:
+					print(f"✗ {label}: {e}")
+					return False
+				times.append(time.perf_counter() - started)
+
+			median = statistics.median(times)
+			profiling.record(label, sum(times))
+			results.append((label, median))
+	finally:
+		for process, _ in servers.values():
+			process.terminate()
+
+	print(f"Cold install: {len(paths)} files, {total_bytes / 1024 / 1024:.1f} MB, "
+	      f"median of {runs} run(s), {latency_ms} ms round trip")
+	baseline = results[0][1]
+	width = max(len(label) for label, _ in results)
+	for index, (label, median) in enumerate(results):
+		line = f"  {label.ljust(width)}  {median:6.2f}s"
+		if index and median > 0:
+			ratio = baseline / median
+			line += f"  {ratio:.1f}x faster" if ratio >= 1 else f"  {1 / ratio:.1f}x slower"
+		print(line)
+	return True
+
+
+def main():
+	"""Main entry point"""
+	profiling.enable_from_argv()
+
+	# h2 lives in the virtual environment, like host.py's other dependencies
+	if "--in-venv" not in sys.argv:
+		from host import setup_venv
+		with profiling.stage("venv bootstrap"):
+			python_path = setup_venv()
+		sys.exit(subprocess.call([str(python_path), __file__, "--in-venv", *sys.argv[1:]],
+		                         env=profiling.child_env()))
+
+	try:
+		runs = max(1, int(get_option("runs", DEFAULT_RUNS)))
+		latency_ms = max(0, int(get_option("latency", 0)))
+	except ValueError:
+		print("✗ --runs and --latency must be numbers")
+		sys.exit(1)
+
+	sys.exit(0 if run_benchmark(runs, latency_ms) else 1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Deploy - Publishes the capsule to a static host, uploading only what changed
+Run generate_manifests.py first. Standard library only, so it can run outside
+the virtual environment.
+
+Usage:
+	python deploy.py DESTINATION [--jobs=N] [--dry-run] [--full] [--deep]
+
+DESTINATION is a local directory (e.g. a checkout of your GitHub Pages repo)
+or an S3-compatible bucket written as s3://bucket/prefix. For S3, credentials
+come from AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY (plus AWS_SESSION_TOKEN
+if set), the region from AWS_REGION, and --endpoint=URL (or AWS_ENDPOINT_URL)
+points at another S3-compatible service such as MinIO or R2.
+
+The capsule is checked with verify.py first and nothing is uploaded if it
+fails; --deep makes that check re-read every file.
+"""
+
+import hashlib
+import hmac
+import json
+import mimetypes
+import os
+import shutil
+import sys
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+import profiling
+from options import get_option
+from hashes import cached_file_digests
+from verify import run_verification
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+
+# Stored next to the deployed files; maps each path to the digest last uploaded
+DEPLOY_MANIFEST = ".deploy-manifest.json"
+
+# Uploaded after everything else, so visitors never get a service worker
+# or page that points at files which haven't arrived yet
+ENTRY_POINTS = ["resource-manifest.json", "manifest.json", "service-worker.js", "index.html"]
+
+DEFAULT_JOBS = 8
+TRANSFER_ATTEMPTS = 3
+EMPTY_PAYLOAD_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+def deploy_files(root=SCRIPT_DIR):
+	"""List the files that make up the published app, entry points last
+
+	Everything the service worker caches (from resource-manifest.json) plus the
+	manifests themselves; source audio, scripts and caches stay behind.
+	"""
+	with open(root / "resource-manifest.json", "r", encoding="utf-8") as f:
+		resource_manifest = json.load(f)
+
+	files = [
+		*resource_manifest.get("static_files", []),
+		*resource_manifest.get("tracks", []),
+		*resource_manifest.get("seek_indexes", []),
+	]
+	files = [path for path in dict.fromkeys(files) if path not in ("./", *ENTRY_POINTS)]
+	return files + ENTRY_POINTS
+
+
+class LocalTarget:
+	"""A directory on this machine, e.g. a GitHub Pages checkout or a mounted share"""
+
+	def __init__(self, directory):
+		self.root = Path(directory).expanduser().absolute()
+
+	def __str__(self):
+		return str(self.root)
+
+	def read_manifest(self):
+		try:
+			with open(self.root / DEPLOY_MANIFEST, "r", encoding="utf-8") as f:
+				return json.load(f).get("files", {})
+		except (OSError, ValueError):
+			return {}
+
+	def write_manifest(self, files):
+		self.root.mkdir(parents=True, exist_ok=True)
+		temp_file = self.root / f"{DEPLOY_MANIFEST}.tmp"
+		with open(temp_file, "w", encoding="utf-8") as f:
+			json.dump({"files": files}, f, indent=2, sort_keys=True)
+		os.replace(temp_file, self.root / DEPLOY_MANIFEST)
+
+	def destination(self, path):
+		"""Where path goes under the root; refuses paths that lead outside it"""
+		destination = (self.root / path).resolve()
+		if self.root.resolve() not in destination.parents:
+			raise PermissionError(f"{path} is outside {self.root}")
+		return destination
+
+	def put(self, path, source, digest):
+		destination = self.destination(path)
+		destination.parent.mkdir(parents=True, exist_ok=True)
+		# Copy then rename, so a half-written file is never served
+		temp_file = destination.with_name(f".{destination.name}.tmp")
+		shutil.copyfile(source, temp_file)
+		os.replace(temp_file, destination)
+
+	def delete(self, path):
+		destination = self.destination(path)
+		destination.unlink(missing_ok=True)
+		# Tidy up folders left empty (e.g. tracks/art after its images are removed)
+		root = self.root.resolve()
+		parent = destination.parent
+		while parent != root and parent.is_dir() and not any(parent.iterdir()):
+			parent.rmdir()
+			parent = parent.parent
+
+
+class S3Target:
+	"""An S3-compatible bucket, addressed path-style and signed with SigV4"""
+
+	def __init__(self, url, endpoint=None):
+		parts = urlsplit(url)
+		self.bucket = parts.netloc
+		self.prefix = parts.path.strip("/")
+		self.region = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION") or "us-east-1"
+		self.endpoint = (
+			endpoint
+			or os.environ.get("AWS_ENDPOINT_URL_S3")
+			or os.environ.get("AWS_ENDPOINT_URL")
+			or f"https://s3.{self.region}.amazonaws.com"
+		).rstrip("/")
+		self.access_key = os.environ.get("AWS_ACCESS_KEY_ID")
+		self.secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
+		self.session_token = os.environ.get("AWS_SESSION_TOKEN")
+
+		if not self.bucket:
+			raise ValueError(f"no bucket in {url} (expected s3://bucket/prefix)")
+		if not self.access_key or not self.secret_key:
+			raise ValueError("set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY to deploy to S3")
+
+	def __str__(self):
+		return f"s3://{self.bucket}/{self.prefix}".rstrip("/") + f" ({self.endpoint})"
+
+	def object_url(self, path):
+		key = f"{self.prefix}/{path}" if self.prefix else path
+		return f"{self.endpoint}/{quote(self.bucket)}/{quote(key, safe='/-_.~')}"
+
+	def sign(self, method, url, headers, payload_hash):
+		"""Return headers with an AWS Signature Version 4 Authorization added"""
+		now = datetime.now(timezone.utc)
+		amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+		scope = f"{now:%Y%m%d}/{self.region}/s3/aws4_request"
+
+		headers = {
+			**headers,
+			"host": urlsplit(url).netloc,
+			"x-amz-date": amz_date,
+			"x-amz-content-sha256": payload_hash,
+		}
+		if self.session_token:
+			headers["x-amz-security-token"] = self.session_token
+
+		names = sorted(name.lower() for name in headers)
+		values = {name.lower(): str(value).strip() for name, value in headers.items()}
+		signed_headers = ";".join(names)
+		canonical_request = "\n".join([
+			method,
+			urlsplit(url).path,
+			"",  # No query string
+			"".join(f"{name}:{values[name]}\n" for name in names),
+			signed_headers,
+			payload_hash,
+		])
+		string_to_sign = "\n".join([
+			"AWS4-HMAC-SHA256",
+			amz_date,
+			scope,
+			hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+		])
+
+		key = f"AWS4{self.secret_key}".encode("utf-8")
+		for part in scope.split("/"):
+			key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+		signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+		headers["Authorization"] = (
+			f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+			f"SignedHeaders={signed_headers}, Signature={signature}"
+		)
+		return headers
+
+	def request(self, method, path, body=None, payload_hash=EMPTY_PAYLOAD_SHA256, headers=None):
+		url = self.object_url(path)
+		headers = self.sign(method, url, headers or {}, payload_hash)
+		request = urllib.request.Request(url, data=body, headers=headers, method=method)
+		with urllib.request.urlopen(request, timeout=60) as response:
+			return response.read()
+
+	def read_manifest(self):
+		try:
+			return json.loads(self.request("GET", DEPLOY_MANIFEST)).get("files", {})
+		except urllib.error.HTTPError as e:
+			if e.code in (403, 404):  # 403: no ListBucket permission hides a missing key
+				return {}
+			raise
+
+	def write_manifest(self, files):
+		body = json.dumps({"files": files}, indent=2, sort_keys=True).encode("utf-8")
+		self.request("PUT", DEPLOY_MANIFEST, body, hashlib.sha256(body).hexdigest(),
+		             {"content-type": "application/json", "content-length": str(len(body))})
+
+	def put(self, path, source, digest):
+		content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+		headers = {"content-type": content_type, "content-length": str(os.path.getsize(source))}
+		if path in ENTRY_POINTS:
+			headers["cache-control"] = "no-cache"
+		# The content hash doubles as the signed payload hash
+		with open(source, "rb") as f:
+			self.request("PUT", path, f, digest, headers)
+
+	def delete(self, path):
+		try:
+			self.request("DELETE", path)
+		except urllib.error.HTTPError as e:
+			if e.code != 404:
+				raise
+
+
+def open_target(destination, endpoint=None):
+	"""Pick the target type from the destination string"""
+	if destination.startswith("s3://"):
+		return S3Target(destination, endpoint)
+	return LocalTarget(destination)
+
+
+def transfer(target, path, source, digest):
+	"""Upload one file, retrying transient failures"""
+	for attempt in range(1, TRANSFER_ATTEMPTS + 1):
+		try:
+			target.put(path, source, digest)
+			return
+		except urllib.error.HTTPError as e:
+			if e.code < 500 or attempt == TRANSFER_ATTEMPTS:
+				raise
+		except OSError:
+			if attempt == TRANSFER_ATTEMPTS:
+				raise
+
+
+def upload_all(target, uploads, sources, local, jobs):
+	"""Upload files in parallel; returns (uploaded paths, failures)"""
+	uploaded = []
+	failures = []
+	with ThreadPoolExecutor(max_workers=jobs) as pool:
+		futures = {
+			pool.submit(transfer, target, path, sources[path], local[path]): path
+			for path in uploads
+		}
+		for future in as_completed(futures):
+			path = futures[future]
+			try:
+				future.result()
+				uploaded.append(path)
+			except (OSError, urllib.error.URLError) as e:
+				failures.append(path)
+				print(f"✗ Could not upload {path}: {e}")
+	return uploaded, failures
+
+
+def deploy(destination, jobs=DEFAULT_JOBS, dry_run=False, full=False, endpoint=None, deep=False,
+           root=SCRIPT_DIR):
+	"""Bring the destination in line with the local capsule
+
+	The capsule is verified first (see verify.py; deep re-hashes every file).
+	Returns True if everything was uploaded. Stale files are only removed
+	once every upload has succeeded.
+	"""
+	try:
+		target = open_target(destination, endpoint)
+	except ValueError as e:
+		print(f"✗ {e}")
+		return False
+
+	# Pre-flight: never ship a capsule with missing, truncated or stale files
+	with profiling.stage("verification"):
+		if not run_verification(root, deep):
+			print("✗ Nothing was deployed")
+			return False
+
+	paths = deploy_files(root)
+
+	with profiling.stage("hashing"):
+		sources = {path: root / path for path in paths}
+		digests = cached_file_digests(list(sources.values()), root / ".cache" / "hashes.json")
+		local = {path: digests[source] for path, source in sources.items()}
+
+	missing = [path for path, digest in local.items() if digest is None]
+	if missing:
+		print(f"✗ Missing {', '.join(missing)}; run generate_manifests.py first")
+		return False
+
+	try:
+		remote = {} if full else target.read_manifest()
+	except (OSError, ValueError) as e:
+		print(f"✗ Could not read the deploy manifest from {target}: {e}")
+		return False
+
+	uploads = [path for path in paths if remote.get(path) != local[path]]
+	stale = sorted(set(remote) - set(local))
+	upload_bytes = sum(sources[path].stat().st_size for path in uploads)
+
+	print(f"Deploying to {target}")
+	print(f"  {len(uploads)} to upload ({upload_bytes / (1024 * 1024):.1f} MB), "
+	      f"{len(paths) - len(uploads)} unchanged, {len(stale)} stale")
+	if dry_run:
+		for path in uploads:
+			print(f"  + {path}")
+		for path in stale:
+			print(f"  - {path}")
+		return True
+
+	# Record what actually reached the destination, even if some uploads fail,
+	# so the next run only retries the failures
+	deployed = dict(remote)
+
+	with profiling.stage("upload"):
+		content = [path for path in uploads if path not in ENTRY_POINTS]
+		uploaded, failures = upload_all(target, content, sources, local, jobs)
+		if not failures:
+			entry_points = [path for path in uploads if path in ENTRY_POINTS]
+			uploaded_entry_points, failures = upload_all(target, entry_points, sources, local, jobs)
+			uploaded += uploaded_entry_points
+		for path in uploaded:
+			deployed[path] = local[path]
+
+	if failures:
+		try:
+			target.write_manifest(deployed)
+		except (OSError, urllib.error.URLError) as e:
+			print(f"✗ Could not write the deploy manifest: {e}")
+		print(f"✗ {len(failures)} file(s) failed to upload; the live site was left as it was. Run deploy.py again to retry.")
+		return False
+
+	with profiling.stage("cleanup"):
+		removed = 0
+		for path in stale:
+			try:
+				target.delete(path)
+				deployed.pop(path, None)
+				removed += 1
+			except (OSError, urllib.error.URLError) as e:
+				print(f"✗ Could not remove {path}: {e}")
+
+		try:
+			target.write_manifest(deployed)
+		except (OSError, urllib.error.URLError) as e:
+			print(f"✗ Could not write the deploy manifest: {e}")
+			return False
+
+	print(f"✓ Uploaded {len(uploaded)} file(s), removed {removed} stale file(s)")
+	return removed == len(stale)
+
+
+if __name__ == "__main__":
+	profiling.enable_from_argv()
+
+	arguments = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+	destination = arguments[0] if arguments else input("Deploy to (a directory or s3://bucket/prefix): ").strip()
+	if not destination:
+		print("Error: a destination is required")
+		sys.exit(1)
+
+	try:
+		jobs = max(1, int(get_option("jobs", DEFAULT_JOBS)))
+	except ValueError:
+		print("✗ --jobs must be a number")
+		sys.exit(1)
+
+	succeeded = deploy(
+		destination,
+		jobs=jobs,
+		dry_run="--dry-run" in sys.argv,
+		full="--full" in sys.argv,
+		endpoint=get_option("endpoint"),
+		deep="--deep" in sys.argv,
+	)
+	sys.exit(0 if succeeded else 1)
@@ -4,10 +4,19 @@ Creates manifest.json, resource-manifest.json, and service-worker.js
 based on the contents of tracks.json
 """
 
+import hashlib
+import html
 import json
 import re
+import sys
 from pathlib import Path
 
+import mpeg
+import profiling
+from options import get_option
+from hashes import cached_file_digests
+from verify import run_verification
+
 def get_configuration(localhost=False):
 	"""Prompt user for configuration values
 
@@ -65,19 +74,41 @@ def get_configuration(localhost=False):
 
 	return app_name, base_path
 
+# How many files the service worker downloads at once while precaching
+# (override with --precache-concurrency=N)
+PRECACHE_CONCURRENCY = 4
+
+# Minutes of music in the smallest useful offline install (see build_install_plan)
+FIRST_TIER_MINUTES = 30
+
 # File paths (no need to edit these)
 SCRIPT_DIR = Path(__file__).parent.absolute()
 TRACKS_JSON = SCRIPT_DIR / "tracks" / "tracks.json"
+TRACKS_INDEX = SCRIPT_DIR / "tracks" / "tracks-index.json"
+ARTWORK_JSON = SCRIPT_DIR / "tracks" / "art" / "artwork.json"
 STYLES_CSS = SCRIPT_DIR / "resources" / "styles.css"
 
+# The page index.html is built from; index.html itself is a generated file
+INDEX_TEMPLATE = "resources/index.template.html"
+
+# What the <!-- capsule:name --> blocks in the template hold when it isn't pre-rendered
+PLAIN_INDEX_BLOCKS = {
+	"styles": '\n\t<link rel="stylesheet" href="resources/styles.css">\n\t',
+	"playlist": "",
+	"script": '\n\t<script src="resources/script.js"></script>\n\t',
+}
 
-def get_background_color():
-	"""Extract the --background CSS variable from styles.css"""
-	if not STYLES_CSS.exists():
+
+def get_background_color(styles_css=STYLES_CSS, quiet=False):
+	"""Extract the --background CSS variable from styles.css
+
+	quiet leaves out the note about the color found (warnings still print).
+	"""
+	if not styles_css.exists():
 		print("Warning: styles.css not found. Using default color.")
 		return "#080a0c"
 
-	with open(STYLES_CSS, 'r', encoding='utf-8') as f:
+	with open(styles_css, 'r', encoding='utf-8') as f:
 		content = f.read()
 
 	# Look for --background: <color>; pattern
@@ -87,41 +118,342 @@ def get_background_color():
 	)
 	if match:
 		color = match.group(1).strip()
-		print(f"Found background color in styles.css: {color}")
+		if not quiet:
+			print(f"Found background color in styles.css: {color}")
 		return color
 
 	print("Warning: --background not found in styles.css. Using default color.")
 	return "#080a0c"
 
 
-def generate_pwa_manifests(app_name=None, base_path=None):
-	"""Generate PWA manifest files based on tracks.json
+def load_artwork(artwork_json=ARTWORK_JSON):
+	"""Load the pre-sized artwork written by scan.py (empty if there is none)"""
+	if not artwork_json.exists():
+		return {}
 
-	Args:
-		app_name: Name of the app. If None, will be prompted via get_configuration()
-		base_path: Base path for the app. If None, will be prompted via get_configuration()
+	with open(artwork_json, 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+def minify_js(source):
+	"""Shrink a script by dropping comment-only lines, indentation and blank lines
+
+	Deliberately conservative: line breaks are kept so automatic semicolon
+	insertion behaves exactly as before, and lines inside multi-line template
+	literals are left untouched.
 	"""
-	# Get configuration if not provided
-	if app_name is None or base_path is None:
-		app_name, base_path = get_configuration()
+	lines = []
+	in_template = False
+	for line in source.splitlines():
+		opens_or_closes_template = line.count("`") % 2 == 1
+		if in_template:
+			lines.append(line)
+		elif opens_or_closes_template:
+			lines.append(line.lstrip())
+		else:
+			stripped = line.strip()
+			if stripped and not stripped.startswith("//"):
+				lines.append(stripped)
+		if opens_or_closes_template:
+			in_template = not in_template
+	return "\n".join(lines) + "\n"
+
+
+def minify_css(source):
+	"""Drop comments, indentation and blank lines from a stylesheet"""
+	source = re.sub(r"/\*.*?\*/", "", source, flags=re.S)
+	return "\n".join(line.strip() for line in source.splitlines() if line.strip())
+
+
+CSS_URL_PATTERN = re.compile(r"""url\(\s*(['"]?)([^'")\s]+)\1\s*\)""")
+
+
+def rebase_css_urls(styles, base):
+	"""Point a stylesheet's relative url()s at base, for inlining it in a page
+
+	Absolute, root-relative and data: URLs are left alone. Returns the
+	rewritten stylesheet and the rebased paths, which the page then needs.
+	"""
+	assets = []
+
+	def rebase(match):
+		quote, url = match.groups()
+		if url.startswith(("/", "#", "data:")) or re.match(r"[a-z][a-z0-9+.-]*:", url, re.I):
+			return match.group(0)
+		assets.append(f"{base}{url}")
+		return f"url({quote}{base}{url}{quote})"
+
+	return CSS_URL_PATTERN.sub(rebase, styles), list(dict.fromkeys(assets))
+
+
+def playlist_markup(tracks):
+	"""The playlist rows createPlaylistItem() in script.js builds, as HTML"""
+	return "".join(
+		'<div class="playlist-item">'
+		'<div class="playlist-item-content uncached">'
+		f'<div class="playlist-item-title">{html.escape(track["title"])}</div>'
+		f'<div class="playlist-item-artist">{html.escape(track["artist"])}</div>'
+		'</div>'
+		'<span style="display: none;">🔁</span>'
+		'</div>'
+		for track in tracks
+	)
+
+
+def replace_index_block(content, name, replacement):
+	"""Swap the contents of a <!-- capsule:name --> block in the page template"""
+	pattern = re.compile(rf"(<!-- capsule:{name} -->).*?(<!-- /capsule:{name} -->)", re.S)
+	if not pattern.search(content):
+		print(f"Warning: <!-- capsule:{name} --> block not found in {INDEX_TEMPLATE}")
+		return content
+	return pattern.sub(lambda match: match.group(1) + replacement + match.group(2), content, count=1)
+
+
+def write_if_changed(path, content):
+	"""Write a text file, leaving it alone (and its mtime unchanged) if nothing changed"""
+	if path.exists() and path.read_text(encoding="utf-8") == content:
+		return
+	path.write_text(content, encoding="utf-8")
+
+
+def render_index_html(root, manifest, tracks, tracks_index=None, prerender=True):
+	"""Build a capsule's index.html from its page template
+
+	Pre-rendered, the page paints its playlist from a single request: styles
+	are inlined, the first tracks are rendered as markup and embedded as JSON
+	so script.js can skip fetching manifest.json, and script.js is swapped for
+	a minified copy. With prerender=False the blocks are plain links. The
+	template itself is never modified. Returns the generated files
+	(path -> text) and the static files index.html needs, including the
+	images styles.css refers to, so verification flags any that are missing.
+	"""
+	template = root / INDEX_TEMPLATE
+	if not template.exists():
+		# Capsule copies made before the template existed only have index.html
+		template = root / "index.html"
+	content = template.read_text(encoding="utf-8")
+
+	# Inlined, the stylesheet's url()s resolve against the page, not resources/
+	styles_css = root / "resources" / "styles.css"
+	styles = minify_css(styles_css.read_text(encoding="utf-8")) if styles_css.exists() else ""
+	styles, style_assets = rebase_css_urls(styles, "resources/")
+
+	if not prerender:
+		for name, replacement in PLAIN_INDEX_BLOCKS.items():
+			content = replace_index_block(content, name, replacement)
+		return {"index.html": content}, ["resources/styles.css", "resources/script.js", *style_assets]
+
+	# A shuffled playlist is reordered on load, so only bake rows in playlist order
+	script = (root / "resources" / "script.js").read_text(encoding="utf-8")
+	shuffled = re.search(r"^const shuffle = true;", script, re.M) is not None
+
+	if tracks_index:
+		tracks = tracks[:tracks_index["page_size"]]
+	data = {
+		"manifest": {
+			key: manifest[key]
+			for key in ("name", "cache_name", "artwork")
+			if key in manifest
+		},
+		"tracks": tracks,
+	}
+	if tracks_index:
+		data["tracks_index"] = tracks_index
+	data_json = json.dumps(data, ensure_ascii=False, separators=(",", ":")).replace("<", "\\u003c")
+
+	content = replace_index_block(content, "styles", f"\n\t<style>\n{styles}\n\t</style>\n\t")
+	content = replace_index_block(content, "playlist", "" if shuffled else playlist_markup(tracks))
+	content = replace_index_block(
+		content,
+		"script",
+		f'\n\t<script id="capsuleData" type="application/json">{data_json}</script>'
+		'\n\t<script src="resources/script.min.js"></script>\n\t'
+	)
+
+	files = {"index.html": content, "resources/script.min.js": minify_js(script)}
+	return files, ["resources/script.min.js", *style_assets]
+
+
+def file_size(url, root=SCRIPT_DIR, generated=None):
+	"""Size in bytes of a file listed in resource-manifest.json (0 if missing)
+
+	Files in generated (path -> text) are measured there rather than on disk.
+	"""
+	name = "index.html" if url == "./" else url
+	if generated and name in generated:
+		return len(generated[name].encode("utf-8"))
+	path = root / name
+	try:
+		return path.stat().st_size
+	except OSError:
+		return 0
+
+
+def build_revisions(urls, root=SCRIPT_DIR, generated=None):
+	"""Record the size and SHA-256 of every file listed in resource-manifest.json
+
+	Files in generated (path -> text) are hashed from memory; the rest go
+	through the shared digest cache, so only new or changed files are read.
+	Missing files are left out (verify.py reports them).
+	"""
+	revisions = {}
+	paths = {}
+	for url in dict.fromkeys(urls):
+		name = "index.html" if url == "./" else url
+		if generated and name in generated:
+			content = generated[name].encode("utf-8")
+			revisions[name] = {"bytes": len(content), "sha256": hashlib.sha256(content).hexdigest()}
+		else:
+			paths[name] = root / name
+
+	digests = cached_file_digests(list(paths.values()), root / ".cache" / "hashes.json")
+	for name, path in paths.items():
+		if digests[path]:
+			revisions[name] = {"bytes": path.stat().st_size, "sha256": digests[path]}
+
+	return dict(sorted(revisions.items()))
 
+
+def build_install_plan(static_files, tracks, root=SCRIPT_DIR, generated=None):
+	"""Work out how much storage an offline install needs
+
+	Returns the byte size of the static files, then every track in playlist
+	order with its size, duration and cumulative_bytes: the storage needed to
+	have everything up to and including that track playable offline. Tiers
+	give the totals for the first FIRST_TIER_MINUTES minutes and for the
+	whole capsule, so the service worker can stop at what fits.
+	"""
+	# "./" is index.html, so count the page once
+	static_names = dict.fromkeys("index.html" if url == "./" else url for url in static_files)
+	static_bytes = sum(file_size(name, root, generated) for name in static_names)
+
+	plan_tracks = []
+	cumulative_bytes = static_bytes
+	cumulative_duration = 0.0
+	first_tier = None
+	for track in tracks:
+		url = f"tracks/{track['filename']}"
+		size = file_size(url, root)
+		duration = track.get("duration")
+		if duration is None and size:
+			try:
+				duration = mpeg.estimate_duration(root / url)
+			except OSError:
+				duration = None
+		duration = round(duration or 0, 2)
+
+		cumulative_bytes += size
+		cumulative_duration += duration
+		plan_tracks.append({
+			"url": url,
+			"bytes": size,
+			"duration": duration,
+			"cumulative_bytes": cumulative_bytes
+		})
+
+		if first_tier is None and cumulative_duration >= FIRST_TIER_MINUTES * 60:
+			first_tier = {
+				"name": f"first {FIRST_TIER_MINUTES} minutes",
+				"track_count": len(plan_tracks),
+				"bytes": cumulative_bytes,
+				"duration": round(cumulative_duration, 2)
+			}
+
+	everything = {
+		"name": "everything",
+		"track_count": len(plan_tracks),
+		"bytes": cumulative_bytes,
+		"duration": round(cumulative_duration, 2)
+	}
+
+	tiers = [everything]
+	if first_tier and first_tier["track_count"] < len(plan_tracks):
+		tiers.insert(0, first_tier)
+
+	return {
+		"static_bytes": static_bytes,
+		"total_bytes": cumulative_bytes,
+		"tracks": plan_tracks,
+		"tiers": tiers
+	}
+
+
+def build_pwa_files(root, app_name, base_path, precache_concurrency=PRECACHE_CONCURRENCY,
+                    prerender=True, cache_name=None, shared_origin=False, refresh_pages=True,
+                    record_revisions=True, quiet=False):
+	"""Build a capsule's manifests in memory
+
+	Reads tracks.json, styles and artwork under root and returns a dict mapping
+	each generated file (manifest.json, resource-manifest.json,
+	service-worker.js, index.html and, when pre-rendering,
+	resources/script.min.js) to its text, or None if there is no tracks.json.
+
+	Args:
+		cache_name: Cache Storage name, defaults to the app name
+		shared_origin: Other capsules are served from the same origin, so the
+		               service worker must leave their caches alone
+		refresh_pages: Rewrite paged track shards from tracks.json (paged capsules)
+		record_revisions: Hash every listed file into resource-manifest.json so
+		                  verify.py can check the capsule before it ships
+		quiet: Only print warnings, for hosts that rebuild many capsules
+	"""
 	# Derived values
 	short_name = app_name
-	cache_name = app_name
+	cache_name = cache_name or app_name
 	app_description = f"{app_name} · vibe capsule"
-
-	print("Generating PWA manifests...")
+	files = {}
 
 	# Load tracks.json
-	if not TRACKS_JSON.exists():
-		print("Error: tracks.json not found. Run scan.py first.")
-		return
+	tracks_json = root / "tracks" / "tracks.json"
+	if not tracks_json.exists():
+		return None
 
-	with open(TRACKS_JSON, 'r', encoding='utf-8') as f:
+	with open(tracks_json, 'r', encoding='utf-8') as f:
 		tracks = json.load(f)
 
 	# Get background color from styles.css
-	background_color = get_background_color()
+	background_color = get_background_color(root / "resources" / "styles.css", quiet)
+
+	# Paged mode (scan.py --paged): refresh the shards so hand edits to
+	# tracks.json carry over, and let the player load them lazily
+	track_data_files = ["tracks/tracks.json"]
+	tracks_index = None
+	index = None
+	tracks_index_file = root / "tracks" / "tracks-index.json"
+	if tracks_index_file.exists():
+		from scan import write_track_pages, DEFAULT_PAGE_SIZE
+
+		with open(tracks_index_file, 'r', encoding='utf-8') as f:
+			index = json.load(f)
+
+		if refresh_pages:
+			index = write_track_pages(tracks, index.get("page_size", DEFAULT_PAGE_SIZE), root)
+			if not quiet:
+				print(f"✓ Refreshed {len(index['pages'])} track page(s)")
+		tracks_index = "tracks/tracks-index.json"
+		track_data_files = [tracks_index] + index["pages"]
+
+	# Pre-sized artwork from scan.py replaces the full-size originals
+	artwork = load_artwork(root / "tracks" / "art" / "artwork.json")
+	icons = [
+		{**icon, "purpose": "any maskable"}
+		for icon in artwork.get("icons", [])
+	] or [
+		{
+			"src": "resources/icon.png",
+			"sizes": "640x640",
+			"type": "image/png",
+			"purpose": "any maskable"
+		}
+	]
+	album_art_files = [image["src"] for image in artwork.get("album", [])]
+	if not album_art_files and (root / "tracks" / "album_art.jpg").exists():
+		album_art_files = ["tracks/album_art.jpg"]
+	track_art_files = sorted({
+		image["src"]
+		for track in tracks
+		for image in track.get("artwork", [])
+	})
 
 	# Generate manifest.json
 	manifest = {
@@ -135,98 +467,192 @@ def generate_pwa_manifests(app_name=None, base_path=None):
 		"background_color": background_color,
 		"theme_color": background_color,
 		"cache_name": cache_name,  # Custom field for script.js to use
-		"icons": [
-			{
-				"src": "resources/icon.png",
-				"sizes": "640x640",
-				"type": "image/png",
-				"purpose": "any maskable"
-			}
-		]
+		"icons": icons
 	}
+	if tracks_index:
+		manifest["tracks_index"] = tracks_index  # Custom field for script.js to use
+	if artwork.get("album"):
+		manifest["artwork"] = artwork["album"]  # Custom field for the media session
 
-	with open(SCRIPT_DIR / "manifest.json", 'w', encoding='utf-8') as f:
-		json.dump(manifest, f, indent=2)
-	print("✓ Generated manifest.json")
+	files["manifest.json"] = json.dumps(manifest, indent=2)
+
+	index_html_files, index_files = render_index_html(root, manifest, tracks, index, prerender)
+	files.update(index_html_files)
 
 	# Generate resource-manifest.json
 	resource_manifest = {
-		"static_files": [
+		# dict.fromkeys drops repeats (e.g. album art that is also embedded in tracks)
+		"static_files": list(dict.fromkeys([
 			"./",
 			"index.html",
-			"resources/styles.css",
-			"resources/script.js",
-			"tracks/tracks.json",
+			*index_files,
+			*track_data_files,
 			"resources/icon.png",
-			"resources/play.png",
-			"resources/pause.png",
-			"resources/prev.png",
-			"resources/next.png",
-			"tracks/album_art.jpg"
-		],
-		"tracks": [f"tracks/{track['filename']}" for track in tracks]
+			*album_art_files,
+			*[icon["src"] for icon in icons if icon["src"] != "resources/icon.png"],
+			*track_art_files
+		])),
+		"tracks": [f"tracks/{track['filename']}" for track in tracks],
+		# Deployed for range-capable servers, but never precached: the player doesn't read them
+		"seek_indexes": [track["seek_index"] for track in tracks if track.get("seek_index")]
 	}
+	resource_manifest["install_plan"] = build_install_plan(resource_manifest["static_files"], tracks, root, files)
+	if record_revisions:
+		resource_manifest["revisions"] = build_revisions(
+			[*resource_manifest["static_files"], *resource_manifest["tracks"]],
+			root,
+			files
+		)
 
-	with open(SCRIPT_DIR / "resource-manifest.json", 'w', encoding='utf-8') as f:
-		json.dump(resource_manifest, f, indent=2)
-	print("✓ Generated resource-manifest.json")
+	files["resource-manifest.json"] = json.dumps(resource_manifest, indent=2)
 
 	# Generate service-worker.js
 	static_files = resource_manifest["static_files"]
 	service_worker_content = f'''// Auto-generated service worker for {app_name} PWA
 const CACHE_NAME = '{cache_name}';
+const PRECACHE_CONCURRENCY = {max(1, int(precache_concurrency))};
+const DELETE_OTHER_CACHES = {json.dumps(not shared_origin)};
 const staticFilesToCache = {json.dumps(static_files, indent=2)};
 
-// Get the base path from the service worker location
-const getBasePath = () => {{
-	const swPath = self.location.pathname;
-	return swPath.substring(0, swPath.lastIndexOf('/') + 1);
-}};
+// Resolve paths relative to the service worker location
+const absoluteUrl = (url) => new URL(url, self.location.href).href;
+
+// Precache scheduler
+// Static files and tracks are downloaded PRECACHE_CONCURRENCY at a time,
+// highest priority first. Cache Storage doubles as the progress record:
+// tracks that are already cached are skipped, so an interrupted run picks up
+// where it left off the next time the worker starts.
+let precacheQueue = [];
+const refreshUrls = new Set(); // Queued URLs to download even if cached
+const inFlightUrls = new Set();
+const trackBytes = new Map(); // Sizes from the install plan in resource-manifest.json
+let precacheRun = null;
+
+// Leave some of the free space alone; storage estimates are approximate
+const STORAGE_HEADROOM = 0.9;
+
+// Queue URLs once each, at the front (highest priority) or the back
+function enqueuePrecache(urls, {{ front = false, refresh = false }} = {{}}) {{
+	const wanted = [...new Set(urls.map(absoluteUrl))];
+	if (refresh) {{
+		wanted.forEach(url => refreshUrls.add(url));
+	}}
+	if (front) {{
+		const moved = new Set(wanted);
+		precacheQueue = [...wanted, ...precacheQueue.filter(url => !moved.has(url))];
+	}} else {{
+		const queued = new Set(precacheQueue);
+		precacheQueue.push(...wanted.filter(url => !queued.has(url)));
+	}}
+}}
+
+// Queue every track listed in resource-manifest.json (playlist order wins
+// for tracks the player has already asked for)
+async function queueManifestTracks() {{
+	try {{
+		const response = await fetch(absoluteUrl('resource-manifest.json'), {{ cache: 'no-cache' }});
+		const resourceManifest = await response.json();
+		const plan = resourceManifest.install_plan;
+		if (plan) {{
+			plan.tracks.forEach(track => trackBytes.set(absoluteUrl(track.url), track.bytes));
+		}}
+		enqueuePrecache(resourceManifest.tracks || []);
+	}} catch (error) {{
+		console.log('Could not load resource-manifest.json:', error);
+	}}
+}}
+
+// Bytes we can still store, or Infinity if the browser won't say
+async function storageBudget() {{
+	if (!self.navigator.storage || !self.navigator.storage.estimate) {{
+		return Infinity;
+	}}
+	try {{
+		const {{ usage = 0, quota = Infinity }} = await self.navigator.storage.estimate();
+		return Math.max(0, (quota - usage) * STORAGE_HEADROOM);
+	}} catch (error) {{
+		return Infinity;
+	}}
+}}
 
-const basePath = getBasePath();
+async function notifyClients(message) {{
+	const windows = await self.clients.matchAll({{ type: 'window', includeUncontrolled: true }});
+	windows.forEach(client => client.postMessage(message));
+}}
+
+// Drain the queue; resolves once it is empty
+function runPrecache() {{
+	if (precacheRun) {{
+		return precacheRun;
+	}}
 
-// Install event - cache only static resources (not MP3s)
-// MP3s will be cached by the main app's blob preloading system
+	precacheRun = (async () => {{
+		const cache = await caches.open(CACHE_NAME);
+		const cachedUrls = new Set((await cache.keys()).map(request => request.url));
+		let budget = await storageBudget();
+		let downloaded = 0;
+		let skippedForSpace = 0;
+
+		const worker = async () => {{
+			while (precacheQueue.length > 0) {{
+				const url = precacheQueue.shift();
+				const refresh = refreshUrls.delete(url);
+				if (inFlightUrls.has(url) || (cachedUrls.has(url) && !refresh)) {{
+					continue;
+				}}
+
+				// Skip tracks that won't fit rather than failing partway through
+				const bytes = trackBytes.get(url) || 0;
+				if (bytes > budget) {{
+					skippedForSpace++;
+					continue;
+				}}
+				budget -= bytes;
+
+				inFlightUrls.add(url);
+				try {{
+					const response = await fetch(url, refresh ? {{ cache: 'no-cache' }} : {{}});
+					if (!response.ok) {{
+						throw new Error(`HTTP error! status: ${{response.status}}`);
+					}}
+					await cache.put(url, response);
+					cachedUrls.add(url);
+					downloaded++;
+					console.log('✓ Cached:', url);
+					await notifyClients({{ type: 'cached', url }});
+				}} catch (error) {{
+					console.error('✗ Failed to cache:', url, error);
+				}} finally {{
+					inFlightUrls.delete(url);
+				}}
+			}}
+		}};
+
+		await Promise.all(Array.from({{ length: PRECACHE_CONCURRENCY }}, worker));
+		if (downloaded > 0) {{
+			console.log(`Precached ${{downloaded}} file(s)`);
+		}}
+		if (skippedForSpace > 0) {{
+			console.warn(`Not enough storage for ${{skippedForSpace}} track(s)`);
+			await notifyClients({{ type: 'storage-full', skipped: skippedForSpace }});
+		}}
+	}})().finally(() => {{
+		precacheRun = null;
+		// URLs queued while the last workers were finishing
+		if (precacheQueue.length > 0) {{
+			runPrecache();
+		}}
+	}});
+
+	return precacheRun;
+}}
+
+// Install event - refresh the static resources (tracks are queued after activation)
 self.addEventListener('install', (event) => {{
-	console.log('Service Worker installing...', 'Base path:', basePath);
+	console.log('Service Worker installing...', 'Scope:', self.registration.scope);
+	enqueuePrecache(staticFilesToCache, {{ front: true, refresh: true }});
 	event.waitUntil(
-		caches.open(CACHE_NAME)
-			.then((cache) => {{
-				console.log('Opened cache');
-				// Make URLs absolute relative to service worker location
-				const absoluteUrls = staticFilesToCache.map(url => {{
-					if (url === './') return basePath;
-					return new URL(url, basePath + 'index.html').href;
-				}});
-				console.log('Caching', absoluteUrls.length, 'static resources');
-				console.log('URLs to cache:', absoluteUrls);
-
-				// Cache files individually with better error handling
-				// Using Promise.allSettled to continue even if some fail
-				return Promise.allSettled(
-					absoluteUrls.map(url =>
-						fetch(url)
-							.then(response => {{
-								if (!response.ok) {{
-									throw new Error(`HTTP error! status: ${{response.status}}`);
-								}}
-								return cache.put(url, response);
-							}})
-							.then(() => console.log('✓ Cached:', url))
-							.catch(err => {{
-								console.error('✗ Failed to cache:', url, err);
-								throw err;
-							}})
-					)
-				).then(results => {{
-					const failed = results.filter(r => r.status === 'rejected');
-					const succeeded = results.filter(r => r.status === 'fulfilled');
-					console.log(`Cached ${{succeeded.length}}/${{results.length}} static resources`);
-					if (failed.length > 0) {{
-						console.warn(`Failed to cache ${{failed.length}} resources`);
-					}}
-				}});
-			}})
+		runPrecache()
 			.then(() => {{
 				console.log('Service Worker installation complete');
 				return self.skipWaiting();
@@ -237,14 +663,14 @@ self.addEventListener('install', (event) => {{
 	);
 }});
 
-// Activate event - clean up old caches
+// Activate event - clean up old caches (unless other capsules share this origin)
 self.addEventListener('activate', (event) => {{
 	console.log('Service Worker activating...');
 	event.waitUntil(
 		caches.keys().then((cacheNames) => {{
 			return Promise.all(
 				cacheNames.map((cacheName) => {{
-					if (cacheName !== CACHE_NAME) {{
+					if (DELETE_OTHER_CACHES && cacheName !== CACHE_NAME) {{
 						console.log('Deleting old cache:', cacheName);
 						return caches.delete(cacheName);
 					}}
@@ -252,8 +678,69 @@ self.addEventListener('activate', (event) => {{
 			);
 		}}).then(() => self.clients.claim())
 	);
+	// Track downloads start when the player posts 'precache', not here: pages
+	// wait for activation before their own requests go through the worker
 }});
 
+// Messages from the player
+// precache: tracks in playlist order, downloaded ahead of the rest
+// prioritize: a track the listener just picked, downloaded next
+self.addEventListener('message', (event) => {{
+	const data = event.data || {{}};
+	if (data.type === 'precache') {{
+		enqueuePrecache(data.tracks || [], {{ front: true }});
+		event.waitUntil(queueManifestTracks().then(runPrecache));
+	}} else if (data.type === 'prioritize') {{
+		enqueuePrecache([data.url], {{ front: true }});
+		event.waitUntil(runPrecache());
+	}}
+}});
+
+// Answer a Range request (sent by <audio> when streaming or seeking) from a
+// cached response. Slicing the blob lets the browser read just those bytes
+// from disk instead of loading the whole track into memory.
+async function respondWithRange(request, rangeHeader) {{
+	const cachedResponse = await caches.match(request.url);
+	if (!cachedResponse) {{
+		return fetch(request);
+	}}
+
+	const blob = await cachedResponse.blob();
+	const size = blob.size;
+	const match = /^bytes=(\\d*)-(\\d*)$/.exec(rangeHeader.trim());
+	let start = NaN;
+	let end = size - 1;
+	if (match && match[1] !== '') {{
+		start = parseInt(match[1], 10);
+		if (match[2] !== '') {{
+			end = Math.min(parseInt(match[2], 10), size - 1);
+		}}
+	}} else if (match && match[2] !== '') {{
+		// Suffix range: the last N bytes
+		start = Math.max(0, size - parseInt(match[2], 10));
+	}}
+
+	if (isNaN(start) || start >= size || start > end) {{
+		return new Response(null, {{
+			status: 416,
+			statusText: 'Range Not Satisfiable',
+			headers: {{ 'Content-Range': `bytes */${{size}}` }}
+		}});
+	}}
+
+	console.log(`✓ Serving bytes ${{start}}-${{end}} from cache:`, request.url);
+	return new Response(blob.slice(start, end + 1), {{
+		status: 206,
+		statusText: 'Partial Content',
+		headers: {{
+			'Content-Type': cachedResponse.headers.get('Content-Type') || 'audio/mpeg',
+			'Content-Range': `bytes ${{start}}-${{end}}/${{size}}`,
+			'Content-Length': String(end - start + 1),
+			'Accept-Ranges': 'bytes'
+		}}
+	}});
+}}
+
 // Fetch event - cache first, network fallback
 self.addEventListener('fetch', (event) => {{
 	// Ignore non-http(s) requests like blob: URLs, data: URLs, chrome-extension:, etc.
@@ -261,6 +748,12 @@ self.addEventListener('fetch', (event) => {{
 		return;
 	}}
 
+	const rangeHeader = event.request.headers.get('Range');
+	if (rangeHeader) {{
+		event.respondWith(respondWithRange(event.request, rangeHeader));
+		return;
+	}}
+
 	event.respondWith(
 		caches.match(event.request)
 			.then((cachedResponse) => {{
@@ -298,14 +791,56 @@ self.addEventListener('fetch', (event) => {{
 }});
 '''
 
-	with open(SCRIPT_DIR / "service-worker.js", 'w', encoding='utf-8') as f:
-		f.write(service_worker_content)
+	files["service-worker.js"] = service_worker_content
+	return files
+
+
+def generate_pwa_manifests(app_name=None, base_path=None, precache_concurrency=PRECACHE_CONCURRENCY,
+                           prerender=True):
+	"""Generate PWA manifest files based on tracks.json
+
+	Args:
+		app_name: Name of the app. If None, will be prompted via get_configuration()
+		base_path: Base path for the app. If None, will be prompted via get_configuration()
+		precache_concurrency: How many files the service worker downloads at once
+		prerender: Bake the playlist and styles into index.html (see render_index_html)
+	"""
+	# Get configuration if not provided
+	if app_name is None or base_path is None:
+		app_name, base_path = get_configuration()
+
+	print("Generating PWA manifests...")
+
+	files = build_pwa_files(SCRIPT_DIR, app_name, base_path, precache_concurrency, prerender)
+	if files is None:
+		print("Error: tracks.json not found. Run scan.py first.")
+		return
+
+	for name, content in files.items():
+		write_if_changed(SCRIPT_DIR / name, content)
+
+	print("✓ Generated manifest.json")
+	print("✓ Pre-rendered index.html" if prerender else "✓ Built plain index.html")
+	print("✓ Generated resource-manifest.json")
+	for tier in json.loads(files["resource-manifest.json"])["install_plan"]["tiers"]:
+		print(f"  Offline install, {tier['name']}: {tier['track_count']} track(s), {tier['bytes'] / 1024 / 1024:.1f} MB")
 	print("✓ Generated service-worker.js")
 	print()
-	print("PWA manifests generated successfully!")
+	if run_verification(SCRIPT_DIR):
+		print()
+		print("PWA manifests generated successfully!")
 
 
 if __name__ == "__main__":
 	# When run directly, get configuration and generate manifests
+	profiling.enable_from_argv()
+	try:
+		precache_concurrency = int(get_option("precache-concurrency", PRECACHE_CONCURRENCY))
+	except ValueError:
+		print("✗ --precache-concurrency must be a number")
+		sys.exit(1)
+
 	app_name, base_path = get_configuration()
-	generate_pwa_manifests(app_name, base_path)
+	with profiling.stage("manifest generation"):
+		generate_pwa_manifests(app_name, base_path, precache_concurrency,
+		                       prerender="--no-prerender" not in sys.argv)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Hashes - Content hashing helpers shared by the capsule tools
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+
+# hashlib releases the GIL while hashing, so threads scale across cores
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+
+
+def file_digest(path, start=0, end=None):
+	"""Return the SHA-256 hex digest of a file, or of the bytes [start, end)"""
+	digest = hashlib.sha256()
+	with open(path, "rb") as f:
+		f.seek(start)
+		remaining = None if end is None else end - start
+		while remaining is None or remaining > 0:
+			size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+			chunk = f.read(size)
+			if not chunk:
+				break
+			digest.update(chunk)
+			if remaining is not None:
+				remaining -= len(chunk)
+	return digest.hexdigest()
+
+
+def digest_files(jobs, workers=DEFAULT_WORKERS):
+	"""Hash many files in parallel
+
+	jobs maps a key to (path, start, end); returns a dict mapping each key to
+	its digest, or to None if the file couldn't be read.
+	"""
+	def run(item):
+		key, (path, start, end) = item
+		try:
+			return key, file_digest(path, start, end)
+		except OSError:
+			return key, None
+
+	if not jobs:
+		return {}
+
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+		return dict(pool.map(run, jobs.items()))
+
+
+def cached_file_digests(paths, cache_file, workers=DEFAULT_WORKERS):
+	"""Whole-file digests for many files, re-reading only files that changed
+
+	Digests are remembered in cache_file keyed by path, size and modification
+	time. Returns a dict mapping each path to its digest (None if unreadable).
+	"""
+	cache = {}
+	try:
+		with open(cache_file, "r", encoding="utf-8") as f:
+			cache = json.load(f)
+	except (OSError, ValueError):
+		pass
+
+	results = {}
+	stats = {}
+	jobs = {}
+	for path in paths:
+		try:
+			stat = os.stat(path)
+		except OSError:
+			results[path] = None
+			continue
+		entry = cache.get(str(path))
+		if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+			results[path] = entry[2]
+		else:
+			stats[path] = stat
+			jobs[path] = (path, 0, None)
+
+	for path, digest in digest_files(jobs, workers).items():
+		results[path] = digest
+		if digest:
+			cache[str(path)] = [stats[path].st_size, stats[path].st_mtime_ns, digest]
+
+	if jobs:
+		# Forget files that no longer exist, then save atomically
+		cache = {path: entry for path, entry in cache.items() if os.path.exists(path)}
+		Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+		temp_file = f"{cache_file}.tmp"
+		with open(temp_file, "w", encoding="utf-8") as f:
+			json.dump(cache, f)
+		os.replace(temp_file, cache_file)
+
+	return results
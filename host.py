@@ -4,18 +4,82 @@ Starts HTTP server for local testing
 Automatically manages a virtual environment for dependencies
 """
 
+import html
 import http.server
 import socketserver
 import socket
 import sys
 import os
+import json
+import re
 import subprocess
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
+from stat import S_ISREG
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import profiling
 
 DEFAULT_PORT = 8000
 SCRIPT_DIR = Path(__file__).parent.absolute()
 VENV_DIR = SCRIPT_DIR / "venv"
 REQUIREMENTS_FILE = SCRIPT_DIR / "requirements.txt"
+TRACKS_DIR = SCRIPT_DIR / "tracks"
+TRACKS_JSON = TRACKS_DIR / "tracks.json"
+RESOURCES_DIR = SCRIPT_DIR / "resources"
+
+# Watch mode: connected pages listen on this endpoint and reload after a rebuild
+WATCH_ENDPOINT = "/__watch"
+WATCH_KEEPALIVE_SECONDS = 15
+WATCH_CLIENT_SCRIPT = """<script>
+// Injected by host.py --watch: drop changed files from the cache and reload
+new EventSource('/__watch').onmessage = async (event) => {
+	const { paths } = JSON.parse(event.data);
+	if ('caches' in window) {
+		for (const name of await caches.keys()) {
+			const cache = await caches.open(name);
+			await Promise.all(paths.map(path => cache.delete(new URL(path, location.href).href)));
+		}
+	}
+	location.reload();
+};
+</script>
+"""
+
+# Files rewritten by every rebuild, relative to the site root
+GENERATED_FILES = [
+	"./",
+	"index.html",
+	"manifest.json",
+	"resource-manifest.json",
+	"service-worker.js",
+	"resources/script.min.js",
+	"tracks/tracks.json",
+]
+
+# Multi-capsule mode (--capsules=DIR, --mount=NAME=DIR): small files shared
+# between capsules are kept in memory, up to these limits
+HOT_CACHE_BYTES = 64 * 1024 * 1024
+HOT_CACHE_MAX_FILE_BYTES = 2 * 1024 * 1024
+MAX_LISTED_CAPSULES = 20
+
+# A mounted capsule's manifests are rebuilt when any of these change
+CAPSULE_INPUTS = [
+	"resources/index.template.html",
+	"index.html",  # The page template in capsules copied before it moved to resources/
+	"manifest.json",
+	"resources/styles.css",
+	"resources/script.js",
+	"tracks/tracks.json",
+	"tracks/tracks-index.json",
+	"tracks/art/artwork.json",
+]
+
+# Latest rebuild, shared between the watcher thread and request handlers
+reload_condition = threading.Condition()
+reload_state = {"sequence": 0, "paths": [], "tracks_json_mtime": None}
 
 
 def setup_venv():
@@ -52,10 +116,12 @@ def setup_venv():
 
 def run_in_venv():
 	"""Re-run this script in the virtual environment"""
-	python_path = setup_venv()
+	with profiling.stage("venv bootstrap"):
+		python_path = setup_venv()
 
-	# Re-run this script with the venv Python
-	subprocess.check_call([str(python_path), __file__, "--in-venv"])
+	# Re-run this script with the venv Python, forwarding any options
+	subprocess.check_call([str(python_path), __file__, "--in-venv", *sys.argv[1:]],
+	                      env=profiling.child_env())
 	sys.exit(0)
 
 
@@ -128,10 +194,11 @@ def generate_localhost_manifests():
 		app_name, base_path = get_configuration(localhost=True)
 
 		# Generate the manifests
-		generate_pwa_manifests(app_name, base_path)
+		with profiling.stage("manifest generation"):
+			generate_pwa_manifests(app_name, base_path)
 		print()
 
-		return app_name
+		return app_name, base_path
 
 	except ImportError as e:
 		print(f"Error: Could not import generate_manifests.py: {e}")
@@ -142,13 +209,622 @@ def generate_localhost_manifests():
 		sys.exit(1)
 
 
+def seek_offset(path, seconds):
+	"""Byte offset of the frame playing seconds into a track, from its seek index
+
+	Returns None if scan.py wrote no index for the track or seconds isn't a
+	number.
+	"""
+	path = Path(path)
+	index_file = path.parent / "seek" / f"{path.name}.json"
+	try:
+		with open(index_file, 'r', encoding='utf-8') as f:
+			index = json.load(f)
+		position = max(0, int(float(seconds) / index["resolution"]))
+		offsets = index["offsets"]
+		return offsets[min(position, len(offsets) - 1)]
+	except (OSError, ValueError, OverflowError, ZeroDivisionError, KeyError, IndexError, TypeError):
+		return None
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+	"""Static file handler without request logging or broken pipe noise
+
+	Also answers single byte-range requests with 206 Partial Content, so the
+	player can seek straight to any point of a track instead of waiting for
+	everything before it to download. A track requested with ?t=<seconds> is
+	answered the same way, from the frame its seek index gives for that time.
+	"""
+
+	range_length = None  # Bytes left to send for the current range request
+
+	def log_message(self, format, *args):
+		pass
+
+	def send_head(self):
+		self.range_length = None
+		range_header = self.headers.get("Range")
+		match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip()) if range_header else None
+		path = self.translate_path(self.path)
+		seconds = parse_qs(urlsplit(self.path).query).get("t")
+		if seconds and not os.path.isdir(path):
+			# A time, looked up in the seek index: from that frame to the end
+			start_at = seek_offset(path, seconds[0])
+			first, last = (str(start_at), "") if start_at is not None else ("", "")
+		elif match:
+			first, last = match.groups()
+		else:
+			first, last = "", ""
+		if (first, last) == ("", "") or os.path.isdir(path):
+			return super().send_head()
+
+		try:
+			f = open(path, "rb")
+		except OSError:
+			self.send_error(404, "File not found")
+			return None
+
+		size = os.fstat(f.fileno()).st_size
+		if first:
+			start = int(first)
+			end = min(int(last), size - 1) if last else size - 1
+		else:
+			# Suffix range: the last N bytes
+			start = max(0, size - int(last))
+			end = size - 1
+
+		if start >= size or start > end:
+			f.close()
+			self.send_response(416)
+			self.send_header("Content-Range", f"bytes */{size}")
+			self.send_header("Content-Length", "0")
+			self.end_headers()
+			return None
+
+		self.send_response(206)
+		self.send_header("Content-Type", self.guess_type(path))
+		self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+		self.send_header("Content-Length", str(end - start + 1))
+		self.send_header("Accept-Ranges", "bytes")
+		self.end_headers()
+		f.seek(start)
+		self.range_length = end - start + 1
+		return f
+
+	def copyfile(self, source, outputfile):
+		if self.range_length is None:
+			return super().copyfile(source, outputfile)
+		remaining = self.range_length
+		while remaining > 0:
+			chunk = source.read(min(64 * 1024, remaining))
+			if not chunk:
+				break
+			outputfile.write(chunk)
+			remaining -= len(chunk)
+
+	def handle(self):
+		"""Handle requests and suppress broken pipe errors"""
+		try:
+			super().handle()
+		except (BrokenPipeError, ConnectionResetError):
+			# Browser cancelled the request (normal for media streaming/preloading)
+			pass
+
+
+class WatchHandler(QuietHandler):
+	"""Static file handler that tells connected pages to reload after a rebuild"""
+
+	def do_GET(self):
+		path = urlsplit(self.path).path
+		if path == WATCH_ENDPOINT:
+			self.send_reload_events()
+		elif path in ("/", "/index.html"):
+			self.send_index_with_reload_script()
+		else:
+			super().do_GET()
+
+	def send_index_with_reload_script(self):
+		"""Serve index.html with the reload listener injected"""
+		try:
+			content = (SCRIPT_DIR / "index.html").read_text(encoding="utf-8")
+		except OSError:
+			self.send_error(404, "File not found")
+			return
+
+		body = content.replace("</body>", WATCH_CLIENT_SCRIPT + "</body>", 1).encode("utf-8")
+		self.send_response(200)
+		self.send_header("Content-Type", "text/html; charset=utf-8")
+		self.send_header("Content-Length", str(len(body)))
+		self.send_header("Cache-Control", "no-store")
+		self.end_headers()
+		self.wfile.write(body)
+
+	def send_reload_events(self):
+		"""Stream a server-sent event each time the watcher finishes a rebuild"""
+		self.send_response(200)
+		self.send_header("Content-Type", "text/event-stream")
+		self.send_header("Cache-Control", "no-store")
+		self.end_headers()
+
+		with reload_condition:
+			seen = reload_state["sequence"]
+
+		while True:
+			with reload_condition:
+				reload_condition.wait_for(lambda: reload_state["sequence"] != seen,
+				                          timeout=WATCH_KEEPALIVE_SECONDS)
+				sequence = reload_state["sequence"]
+				paths = reload_state["paths"]
+
+			if sequence == seen:
+				self.wfile.write(b": keep-alive\n\n")
+			else:
+				seen = sequence
+				self.wfile.write(f"data: {json.dumps({'paths': paths})}\n\n".encode("utf-8"))
+			self.wfile.flush()
+
+
+class ThreadingServer(socketserver.ThreadingTCPServer):
+	"""Threaded server so open reload streams don't block file requests"""
+	daemon_threads = True
+
+
+def create_server(port, handler_class, local_ip, threaded=True):
+	"""Create the server, HTTPS with HTTP/2 when --https was passed
+
+	Returns (server, scheme). Plain HTTP uses ThreadingServer, or a
+	single-threaded TCPServer when threaded is False.
+	"""
+	if "--https" not in sys.argv:
+		server_class = ThreadingServer if threaded else socketserver.TCPServer
+		return server_class(("", port), handler_class), "http"
+
+	import http2
+
+	hosts = ["localhost", "127.0.0.1"]
+	if http2.is_ip_address(local_ip):
+		hosts.append(local_ip)
+	try:
+		context = http2.server_context(hosts)
+	except (RuntimeError, OSError) as e:
+		print(f"✗ Could not set up HTTPS: {e}")
+		sys.exit(1)
+
+	if http2.h2 is None:
+		print("Note: h2 not installed, serving HTTPS over HTTP/1.1 only")
+	return http2.SecureServer(("", port), handler_class, context), "https"
+
+
+def print_https_note():
+	"""Explain the self-signed certificate printed by --https servers"""
+	if "--https" in sys.argv:
+		print(f"\nHTTPS certificate: {Path('.cache') / 'https' / 'cert.pem'} (self-signed)")
+		print("Trust it on your devices to install the app without browser warnings.")
+
+
+def publish_reload(paths):
+	"""Wake every connected page with the list of changed files"""
+	with reload_condition:
+		reload_state["sequence"] += 1
+		reload_state["paths"] = sorted(set(paths))
+		reload_condition.notify_all()
+
+
+def update_tracks_json(track_files):
+	"""Update only the tracks.json entries for MP3s that were added, changed or removed
+
+	New and changed entries go through the same steps as a full scan.py run:
+	track numbers are stripped when every title in /tracks has one, duplicates
+	are reported, artwork, seek indexes and exact durations are refreshed, and
+	loudness is analyzed if the library was scanned with --analyze.
+	Hand-edited fields of existing entries are kept.
+	"""
+	from scan import (analyze_tracks, find_duplicates, process_artwork, read_track_metadata,
+	                  report_duplicates, strip_track_number, titles_have_track_numbers,
+	                  write_seek_indexes, write_tracks_json)
+
+	tracks = []
+	if TRACKS_JSON.exists():
+		with open(TRACKS_JSON, 'r', encoding='utf-8') as f:
+			tracks = json.load(f)
+
+	by_filename = {track['filename']: track for track in tracks}
+	fresh = {}
+
+	for track_file in sorted(track_files):
+		existing = by_filename.get(track_file.name)
+
+		if not track_file.exists():
+			if existing is not None:
+				tracks.remove(existing)
+				del by_filename[track_file.name]
+				print(f"  - Removed {track_file.name}")
+			continue
+
+		try:
+			fresh[track_file.name] = read_track_metadata(track_file)
+		except Exception as e:
+			print(f"  ✗ Error reading {track_file.name}: {e}")
+
+	if fresh:
+		mp3_files = sorted(TRACKS_DIR.glob("*.mp3"))
+
+		# scan.py strips numbers only if every title has one, so check the whole folder
+		titles = []
+		for mp3_file in mp3_files:
+			if mp3_file.name in fresh:
+				titles.append(fresh[mp3_file.name]['title'])
+				continue
+			try:
+				titles.append(read_track_metadata(mp3_file)['title'])
+			except Exception:
+				pass
+		if titles_have_track_numbers(titles):
+			for track_info in fresh.values():
+				track_info['title'] = strip_track_number(track_info['title'])
+
+		duplicates = [
+			(kind, group) for kind, group in find_duplicates(mp3_files)
+			if any(mp3_file.name in fresh for mp3_file in group)
+		]
+		if duplicates:
+			report_duplicates(duplicates, drop=False)
+
+	for filename, track_info in fresh.items():
+		existing = by_filename.get(filename)
+		if existing is not None:
+			# Keep any hand-edited fields (looping etc.), refresh the tags
+			existing.update(track_info)
+			print(f"  ✓ Updated {track_info['artist']} - {track_info['title']}")
+		else:
+			tracks.append(track_info)
+			by_filename[filename] = track_info
+			print(f"  + Added {track_info['artist']} - {track_info['title']}")
+
+	if fresh:
+		process_artwork(tracks)
+	write_seek_indexes(tracks)
+	if fresh and any('replaygain' in track for track in tracks):
+		analyze_tracks(tracks)
+	write_tracks_json(tracks)
+	reload_state["tracks_json_mtime"] = TRACKS_JSON.stat().st_mtime_ns
+
+
+def rebuild_for_changes(paths, app_name, base_path):
+	"""Rebuild tracks.json and the manifests for a batch of changed files"""
+	from generate_manifests import generate_pwa_manifests
+
+	track_files = {path for path in paths
+	               if path.parent == TRACKS_DIR and path.suffix.lower() == ".mp3"}
+	other_files = {path for path in paths
+	               if not path.name.startswith(".")
+	               and (path.parent == RESOURCES_DIR or path.name == "album_art.jpg")
+	               and path.relative_to(SCRIPT_DIR).as_posix() not in GENERATED_FILES}
+
+	# Ignore the event for our own tracks.json write, but pick up hand edits
+	tracks_json_edited = False
+	if TRACKS_JSON in paths and TRACKS_JSON.exists():
+		tracks_json_edited = TRACKS_JSON.stat().st_mtime_ns != reload_state["tracks_json_mtime"]
+
+	if not (track_files or other_files or tracks_json_edited):
+		return
+
+	changed = sorted(track_files | other_files)
+	print(f"\n⟳ {len(changed) or 1} change(s) detected, rebuilding...")
+
+	if track_files:
+		update_tracks_json(track_files)
+
+	with profiling.stage("watch rebuild"):
+		generate_pwa_manifests(app_name, base_path)
+
+	publish_reload([path.relative_to(SCRIPT_DIR).as_posix() for path in changed] + GENERATED_FILES)
+	print("✓ Rebuilt. Connected pages will reload.")
+
+
+def start_watching(app_name, base_path):
+	"""Watch tracks/ and resources/ on a background thread"""
+	import watcher
+
+	TRACKS_DIR.mkdir(parents=True, exist_ok=True)
+	directories = [directory for directory in (TRACKS_DIR, RESOURCES_DIR) if directory.exists()]
+
+	if TRACKS_JSON.exists():
+		reload_state["tracks_json_mtime"] = TRACKS_JSON.stat().st_mtime_ns
+
+	thread = threading.Thread(
+		target=watcher.watch,
+		args=(directories, lambda paths: rebuild_for_changes(paths, app_name, base_path)),
+		kwargs={"on_start": lambda method: print(f"Watching tracks/ and resources/ for changes ({method})")},
+		daemon=True,
+	)
+	thread.start()
+
+
+class HotFileCache:
+	"""Least-recently-used cache of small file contents, shared by all capsules
+
+	Entries are checked against the file's size and modification time, so
+	edits on disk show up on the next request. Larger files (the MP3s) are
+	streamed from disk as usual.
+	"""
+
+	def __init__(self, max_bytes=HOT_CACHE_BYTES, max_file_bytes=HOT_CACHE_MAX_FILE_BYTES):
+		self.max_bytes = max_bytes
+		self.max_file_bytes = max_file_bytes
+		self.entries = OrderedDict()
+		self.size = 0
+		self.lock = threading.Lock()
+
+	def get(self, path):
+		"""Return the file's contents, or None if it is missing or too big to cache"""
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return None
+		if not S_ISREG(stat.st_mode) or stat.st_size > self.max_file_bytes:
+			return None
+
+		version = (stat.st_mtime_ns, stat.st_size)
+		with self.lock:
+			entry = self.entries.get(path)
+			if entry and entry[0] == version:
+				self.entries.move_to_end(path)
+				return entry[1]
+
+		try:
+			with open(path, "rb") as f:
+				data = f.read()
+		except OSError:
+			return None
+
+		with self.lock:
+			previous = self.entries.pop(path, None)
+			if previous:
+				self.size -= len(previous[1])
+			self.entries[path] = (version, data)
+			self.size += len(data)
+			while self.size > self.max_bytes:
+				_, (_, evicted) = self.entries.popitem(last=False)
+				self.size -= len(evicted)
+
+		return data
+
+
+class Capsule:
+	"""A capsule directory mounted under /<name>/
+
+	Its manifests are built in memory on the first request, and rebuilt when
+	any of their inputs change on disk.
+	"""
+
+	def __init__(self, name, root):
+		self.name = name
+		self.root = Path(root).resolve()
+		self.base_path = f"/{quote(name)}/"
+		self.lock = threading.Lock()
+		self.files = None
+		self.inputs_version = None
+
+	def app_name(self):
+		"""The name the capsule was generated with, or its directory name"""
+		try:
+			with open(self.root / "manifest.json", 'r', encoding='utf-8') as f:
+				return json.load(f).get("name") or self.name
+		except (OSError, ValueError):
+			return self.name
+
+	def generated_files(self):
+		"""Return the capsule's generated files (path -> bytes), building them if needed"""
+		from generate_manifests import build_pwa_files
+
+		version = []
+		for relative in CAPSULE_INPUTS:
+			try:
+				version.append((self.root / relative).stat().st_mtime_ns)
+			except OSError:
+				version.append(None)
+
+		with self.lock:
+			if self.files is None or version != self.inputs_version:
+				started = time.perf_counter()
+				app_name = self.app_name()
+				files = build_pwa_files(
+					self.root,
+					app_name,
+					self.base_path,
+					cache_name=f"{app_name} {self.base_path}",
+					shared_origin=True,
+					refresh_pages=False,
+					record_revisions=False,
+					quiet=True,
+				) or {}
+				self.files = {path: content.encode("utf-8") for path, content in files.items()}
+				self.inputs_version = version
+				profiling.record("capsule manifests", time.perf_counter() - started)
+			return self.files
+
+
+def find_capsules():
+	"""Capsules to mount, from --capsules=DIR (every capsule inside DIR)
+	and --mount=DIR or --mount=NAME=DIR (repeatable)"""
+	mounts = {}
+	for arg in sys.argv[1:]:
+		if arg.startswith("--capsules="):
+			parent = Path(arg[len("--capsules="):]).expanduser()
+			if not parent.is_dir():
+				print(f"Error: {parent} is not a directory")
+				sys.exit(1)
+			for child in sorted(parent.iterdir()):
+				if (child / "tracks" / "tracks.json").exists():
+					mounts[child.name] = child
+		elif arg.startswith("--mount="):
+			name, separator, directory = arg[len("--mount="):].partition("=")
+			if not separator:
+				directory = name
+				name = Path(directory).expanduser().resolve().name
+			mounts[name] = Path(directory).expanduser()
+
+	for name, directory in mounts.items():
+		if not any((directory / page).exists() for page in ("resources/index.template.html", "index.html")):
+			print(f"Error: {directory} doesn't look like a capsule (no index.html)")
+			sys.exit(1)
+
+	return {name: Capsule(name, directory) for name, directory in mounts.items()}
+
+
+class MultiCapsuleHandler(QuietHandler):
+	"""Serves every mounted capsule from one process
+
+	Generated manifests come from memory, small files from the shared hot-file
+	cache, and everything else (MP3s, range requests) from disk.
+	"""
+
+	capsules = {}
+	hot_files = None
+	file_path = None  # Resolved file for the current request
+
+	def translate_path(self, path):
+		if self.file_path is not None:
+			return str(self.file_path)
+		return super().translate_path(path)
+
+	def do_GET(self):
+		self.serve_capsule_file(head=False)
+
+	def do_HEAD(self):
+		self.serve_capsule_file(head=True)
+
+	def serve_capsule_file(self, head):
+		self.file_path = None
+		path = unquote(urlsplit(self.path).path)
+		if path == "/":
+			self.send_capsule_list(head)
+			return
+
+		name, slash, relative = path.lstrip("/").partition("/")
+		capsule = self.capsules.get(name)
+		if capsule is None:
+			self.send_error(404, "No capsule mounted here")
+			return
+		if not slash:
+			self.send_response(301)
+			self.send_header("Location", capsule.base_path)
+			self.send_header("Content-Length", "0")
+			self.end_headers()
+			return
+
+		relative = relative or "index.html"
+		generated = capsule.generated_files()
+		if relative in generated:
+			self.send_bytes(generated[relative], self.guess_type(relative), head, "no-cache")
+			return
+
+		file_path = (capsule.root / relative).resolve()
+		if capsule.root not in file_path.parents or not file_path.is_file():
+			self.send_error(404, "File not found")
+			return
+
+		data = None if self.headers.get("Range") else self.hot_files.get(file_path)
+		if data is not None:
+			self.send_bytes(data, self.guess_type(str(file_path)), head)
+			return
+
+		# Large files and range requests: let the regular handler stream from disk
+		self.file_path = file_path
+		if head:
+			super().do_HEAD()
+		else:
+			super().do_GET()
+
+	def send_bytes(self, data, content_type, head, cache_control=None):
+		self.send_response(200)
+		self.send_header("Content-Type", content_type)
+		self.send_header("Content-Length", str(len(data)))
+		if cache_control:
+			self.send_header("Cache-Control", cache_control)
+		self.end_headers()
+		if not head:
+			self.wfile.write(data)
+
+	def send_capsule_list(self, head):
+		"""A plain index page linking to every mounted capsule"""
+		items = "".join(
+			f'<li><a href="{capsule.base_path}">{html.escape(name)}</a></li>'
+			for name, capsule in sorted(self.capsules.items())
+		)
+		page = f"<!DOCTYPE html><meta charset=\"utf-8\"><title>vibe capsules</title><h1>💿 vibe capsules</h1><ul>{items}</ul>"
+		self.send_bytes(page.encode("utf-8"), "text/html; charset=utf-8", head, "no-cache")
+
+
+def start_multi_server(capsules):
+	"""Serve many capsules from one process, each under its own base path"""
+	server_start_time = time.perf_counter()
+
+	port = find_available_port(DEFAULT_PORT)
+	if port is None:
+		print(f"Error: Could not find an available port (tried {DEFAULT_PORT}-{DEFAULT_PORT + 9})")
+		sys.exit(1)
+
+	local_ip = get_local_ip()
+	MultiCapsuleHandler.capsules = capsules
+	MultiCapsuleHandler.hot_files = HotFileCache()
+
+	server, scheme = create_server(port, MultiCapsuleHandler, local_ip)
+
+	try:
+		with server as httpd:
+			network_url = f"{scheme}://{local_ip}:{port}"
+
+			print("=" * 60)
+			print(f"💿 {len(capsules)} capsule(s)")
+			print("=" * 60)
+			print(f"\nServer running on port {port}")
+
+			print_qr_code(network_url)
+
+			print(f"Local access:   {scheme}://localhost:{port}")
+			print(f"Network access: {network_url}")
+			print_https_note()
+			print()
+			for name, capsule in sorted(capsules.items())[:MAX_LISTED_CAPSULES]:
+				print(f"  {capsule.base_path}  →  {capsule.root}")
+			if len(capsules) > MAX_LISTED_CAPSULES:
+				print(f"  ...and {len(capsules) - MAX_LISTED_CAPSULES} more (listed at {network_url}/)")
+
+			print("\nManifests are generated on each capsule's first request.")
+			print("Press Ctrl+C to stop the server")
+
+			profiling.record("server start", time.perf_counter() - server_start_time)
+
+			httpd.serve_forever()
+
+	except KeyboardInterrupt:
+		print("\n\nShutting down server...")
+		sys.exit(0)
+	except Exception as e:
+		print(f"\nError starting server: {e}")
+		sys.exit(1)
+
+
 def start_server():
 	"""Start the HTTP server (runs after venv is set up)"""
 	# Change to script directory
 	os.chdir(SCRIPT_DIR)
 
+	# Many capsules from one process
+	capsules = find_capsules()
+	if capsules:
+		sys.path.insert(0, str(SCRIPT_DIR))
+		start_multi_server(capsules)
+		return
+
+	watch = "--watch" in sys.argv
+
 	# Generate manifests for localhost
-	app_name = generate_localhost_manifests()
+	app_name, base_path = generate_localhost_manifests()
+
+	server_start_time = time.perf_counter()
 
 	# Find an available port
 	port = find_available_port(DEFAULT_PORT)
@@ -161,25 +837,13 @@ def start_server():
 	local_ip = get_local_ip()
 
 	# Create server
-	Handler = http.server.SimpleHTTPRequestHandler
-
-	# Suppress default logging and broken pipe errors
-	class QuietHandler(Handler):
-		def log_message(self, format, *args):
-			pass
-
-		def handle(self):
-			"""Handle requests and suppress broken pipe errors"""
-			try:
-				super().handle()
-			except (BrokenPipeError, ConnectionResetError):
-				# Browser cancelled the request (normal for media streaming/preloading)
-				pass
+	handler_class = WatchHandler if watch else QuietHandler
+	server, scheme = create_server(port, handler_class, local_ip, threaded=watch)
 
 	try:
-		with socketserver.TCPServer(("", port), QuietHandler) as httpd:
-			local_url = f"http://localhost:{port}"
-			network_url = f"http://{local_ip}:{port}"
+		with server as httpd:
+			local_url = f"{scheme}://localhost:{port}"
+			network_url = f"{scheme}://{local_ip}:{port}"
 
 			print("=" * 60)
 			print(f"💿 {app_name}")
@@ -191,8 +855,15 @@ def start_server():
 
 			print(f"Local access:   {local_url}")
 			print(f"Network access: {network_url}")
+			print_https_note()
+
+			if watch:
+				start_watching(app_name, base_path)
+
 			print("\nPress Ctrl+C to stop the server")
 
+			profiling.record("server start", time.perf_counter() - server_start_time)
+
 			# Serve forever
 			httpd.serve_forever()
 
@@ -206,6 +877,8 @@ def start_server():
 
 def main():
 	"""Main entry point"""
+	profiling.enable_from_argv()
+
 	# Check if we're already running in venv
 	if "--in-venv" not in sys.argv:
 		run_in_venv()
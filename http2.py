@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+HTTP/2 - Serves host.py's request handlers over HTTPS, with HTTP/2 when the h2 package is installed
+Every HTTP/2 stream is handed to the regular http.server handler as if it were
+a connection carrying a single HTTP/1.0 request, so the handlers don't need
+to know which protocol the browser is speaking.
+"""
+
+import io
+import ipaddress
+import json
+import select
+import socket
+import socketserver
+import ssl
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+try:
+	import h2.config
+	import h2.connection
+	import h2.events
+	import h2.exceptions
+	import h2.settings
+except ImportError:
+	h2 = None
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+CERT_DIR = SCRIPT_DIR / ".cache" / "https"
+CERT_DAYS = 825  # The longest validity Apple devices accept for a trusted certificate
+
+MAX_CONCURRENT_STREAMS = 100
+HANDSHAKE_TIMEOUT = 10
+READ_SIZE = 64 * 1024
+
+# HTTP/1 connection headers that have no place in an HTTP/2 response
+HOP_BY_HOP_HEADERS = {b"connection", b"keep-alive", b"proxy-connection", b"transfer-encoding", b"upgrade"}
+
+
+def is_ip_address(host):
+	try:
+		ipaddress.ip_address(host)
+		return True
+	except ValueError:
+		return False
+
+
+def ensure_certificate(hosts, directory=CERT_DIR):
+	"""Return (cert_file, key_file) for a self-signed certificate covering hosts
+
+	The certificate is made with the openssl command line tool the first
+	time, then reused until the hosts change or it is about to expire.
+	Raises RuntimeError if openssl is missing or fails.
+	"""
+	directory = Path(directory)
+	cert_file = directory / "cert.pem"
+	key_file = directory / "key.pem"
+	hosts_file = directory / "hosts.json"
+	wanted = sorted(set(hosts))
+
+	try:
+		recorded = json.loads(hosts_file.read_text(encoding="utf-8"))
+		age_days = (time.time() - cert_file.stat().st_mtime) / 86400
+		if recorded == wanted and key_file.exists() and age_days < CERT_DAYS - 30:
+			return cert_file, key_file
+	except (OSError, ValueError):
+		pass
+
+	directory.mkdir(parents=True, exist_ok=True)
+	subject_alt_names = ",".join(f"IP:{host}" if is_ip_address(host) else f"DNS:{host}" for host in wanted)
+	try:
+		subprocess.run([
+			"openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-sha256",
+			"-days", str(CERT_DAYS),
+			"-subj", "/CN=vibe capsule (local)",
+			"-addext", f"subjectAltName={subject_alt_names}",
+			"-addext", "extendedKeyUsage=serverAuth",
+			"-keyout", str(key_file),
+			"-out", str(cert_file),
+		], check=True, capture_output=True)
+	except FileNotFoundError:
+		raise RuntimeError("openssl not found; it's needed once to create a local certificate")
+	except subprocess.CalledProcessError as e:
+		raise RuntimeError(f"openssl could not create a certificate: {e.stderr.decode(errors='replace').strip()}")
+
+	hosts_file.write_text(json.dumps(wanted), encoding="utf-8")
+	return cert_file, key_file
+
+
+def server_context(hosts):
+	"""TLS context for SecureServer, offering HTTP/2 when h2 is installed"""
+	cert_file, key_file = ensure_certificate(hosts)
+	context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+	context.load_cert_chain(cert_file, key_file)
+	context.set_alpn_protocols(["h2", "http/1.1"] if h2 else ["http/1.1"])
+	return context
+
+
+class HTTP2Stream:
+	"""One HTTP/2 request, dressed up as a socket for a regular request handler
+
+	The handler reads the request from makefile() and writes its HTTP/1.0
+	response through sendall(); the status line and headers become an HTTP/2
+	HEADERS frame and the body goes out as DATA frames, as fast as the
+	browser's flow control window allows.
+	"""
+
+	def __init__(self, connection, stream_id, request):
+		self.connection = connection
+		self.stream_id = stream_id
+		self.request = request
+		self.pending = b""  # Response bytes received before the header block was complete
+		self.headers_sent = False
+		self.closed = False
+
+	# The parts of the socket API that socketserver.StreamRequestHandler uses
+	def makefile(self, mode="r", buffering=None):
+		return io.BytesIO(self.request)
+
+	def settimeout(self, timeout):
+		pass
+
+	def setsockopt(self, *args):
+		pass
+
+	def fileno(self):
+		return self.connection.sock.fileno()
+
+	def sendall(self, data):
+		if self.closed:
+			raise BrokenPipeError("HTTP/2 stream was reset")
+
+		if not self.headers_sent:
+			self.pending += bytes(data)
+			header_end = self.pending.find(b"\r\n\r\n")
+			if header_end < 0:
+				return
+			head, data = self.pending[:header_end], self.pending[header_end + 4:]
+			self.pending = b""
+			self.send_headers(head)
+
+		if data:
+			self.send_data(memoryview(data))
+
+	def send_headers(self, head):
+		"""Turn an HTTP/1 status line and header block into an HTTP/2 HEADERS frame"""
+		lines = head.split(b"\r\n")
+		status = lines[0].split(b" ", 2)[1]
+		headers = [(b":status", status)]
+		for line in lines[1:]:
+			name, _, value = line.partition(b":")
+			name = name.strip().lower()
+			if name and name not in HOP_BY_HOP_HEADERS:
+				headers.append((name, value.strip()))
+
+		connection = self.connection
+		with connection.lock:
+			try:
+				connection.protocol.send_headers(self.stream_id, headers)
+			except h2.exceptions.ProtocolError:
+				raise BrokenPipeError("HTTP/2 stream was reset")
+		self.headers_sent = True
+		connection.wake()
+
+	def send_data(self, view):
+		connection = self.connection
+		while view:
+			with connection.lock:
+				while True:
+					if self.closed or connection.closed:
+						raise BrokenPipeError("HTTP/2 stream was reset")
+					try:
+						window = connection.protocol.local_flow_control_window(self.stream_id)
+					except h2.exceptions.ProtocolError:
+						raise BrokenPipeError("HTTP/2 stream was reset")
+					if window > 0:
+						break
+					connection.window_open.wait()
+
+				size = min(window, len(view), connection.protocol.max_outbound_frame_size)
+				connection.protocol.send_data(self.stream_id, view[:size].tobytes())
+			connection.wake()
+			view = view[size:]
+
+	def finish(self):
+		"""End the stream once the handler is done"""
+		connection = self.connection
+		with connection.lock:
+			try:
+				if not self.headers_sent:
+					# The handler gave up without responding
+					connection.protocol.send_headers(self.stream_id, [(b":status", b"500")], end_stream=True)
+				else:
+					connection.protocol.end_stream(self.stream_id)
+			except h2.exceptions.ProtocolError:
+				pass
+		connection.wake()
+
+
+class HTTP2Connection:
+	"""Drives one HTTP/2 connection: a single thread owns the TLS socket, and
+	every request runs on its own thread through the server's handler class"""
+
+	def __init__(self, sock, client_address, server):
+		self.sock = sock
+		self.client_address = client_address
+		self.server = server
+		self.lock = threading.Lock()
+		self.window_open = threading.Condition(self.lock)
+		self.requests = {}  # stream id -> (headers, body) while the request arrives
+		self.streams = {}   # stream id -> HTTP2Stream being answered
+		self.closed = False
+		self.wake_reader, self.wake_writer = socket.socketpair()
+		self.wake_writer.setblocking(False)  # A full pipe already means "wake up"
+		self.protocol = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+
+	def wake(self):
+		"""Ask the socket thread to send whatever the streams have queued"""
+		try:
+			self.wake_writer.send(b"\0")
+		except OSError:
+			pass
+
+	def flush(self):
+		with self.lock:
+			data = self.protocol.data_to_send()
+		if data:
+			self.sock.sendall(data)
+
+	def run(self):
+		with self.lock:
+			self.protocol.initiate_connection()
+			self.protocol.update_settings({h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: MAX_CONCURRENT_STREAMS})
+		try:
+			self.flush()
+			while not self.closed:
+				readable, _, _ = select.select([self.sock, self.wake_reader], [], [])
+				if self.wake_reader in readable:
+					self.wake_reader.recv(4096)
+				if self.sock in readable:
+					# TLS may hold decrypted bytes that select() can't see
+					while True:
+						data = self.sock.recv(READ_SIZE)
+						if not data:
+							self.closed = True
+							break
+						self.receive(data)
+						if not self.sock.pending():
+							break
+				self.flush()
+		except (OSError, h2.exceptions.ProtocolError):
+			pass
+		finally:
+			with self.lock:
+				self.closed = True
+				for stream in self.streams.values():
+					stream.closed = True
+				self.window_open.notify_all()
+			self.wake_reader.close()
+			self.wake_writer.close()
+
+	def receive(self, data):
+		with self.lock:
+			for event in self.protocol.receive_data(data):
+				if isinstance(event, h2.events.RequestReceived):
+					self.requests[event.stream_id] = (event.headers, bytearray())
+					if event.stream_ended:
+						self.dispatch(event.stream_id)
+				elif isinstance(event, h2.events.DataReceived):
+					if event.stream_id in self.requests:
+						self.requests[event.stream_id][1].extend(event.data)
+					self.protocol.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+					if event.stream_ended:
+						self.dispatch(event.stream_id)
+				elif isinstance(event, h2.events.StreamEnded):
+					self.dispatch(event.stream_id)
+				elif isinstance(event, h2.events.StreamReset):
+					self.requests.pop(event.stream_id, None)
+					stream = self.streams.pop(event.stream_id, None)
+					if stream:
+						stream.closed = True
+					self.window_open.notify_all()
+				elif isinstance(event, (h2.events.WindowUpdated, h2.events.RemoteSettingsChanged)):
+					self.window_open.notify_all()
+				elif isinstance(event, h2.events.ConnectionTerminated):
+					self.closed = True
+					self.window_open.notify_all()
+
+	def dispatch(self, stream_id):
+		"""Start answering a fully received request (called with the lock held)"""
+		if stream_id not in self.requests:
+			return
+		headers, body = self.requests.pop(stream_id)
+
+		pseudo = {name: value for name, value in headers if name.startswith(b":")}
+		lines = [
+			pseudo.get(b":method", b"GET") + b" " + pseudo.get(b":path", b"/") + b" HTTP/1.0",
+			b"Host: " + pseudo.get(b":authority", b""),
+		]
+		lines += [name + b": " + value for name, value in headers if not name.startswith(b":") and name != b"host"]
+		stream = HTTP2Stream(self, stream_id, b"\r\n".join(lines) + b"\r\n\r\n" + bytes(body))
+		self.streams[stream_id] = stream
+
+		threading.Thread(target=self.respond, args=(stream,), daemon=True).start()
+
+	def respond(self, stream):
+		try:
+			self.server.RequestHandlerClass(stream, self.client_address, self.server)
+		except BrokenPipeError:
+			pass
+		except Exception:
+			self.server.handle_error(stream, self.client_address)
+		finally:
+			stream.finish()
+			with self.lock:
+				self.streams.pop(stream.stream_id, None)
+
+
+class SecureServer(socketserver.ThreadingTCPServer):
+	"""HTTPS server for host.py --https
+
+	Speaks HTTP/2 to browsers that offer it (every request multiplexed over one
+	connection) and falls back to HTTP/1.1 over TLS for the rest.
+	"""
+
+	daemon_threads = True
+
+	def __init__(self, server_address, handler_class, context):
+		self.context = context
+		super().__init__(server_address, handler_class)
+
+	def finish_request(self, request, client_address):
+		request.settimeout(HANDSHAKE_TIMEOUT)
+		try:
+			tls = self.context.wrap_socket(request, server_side=True)
+		except (ssl.SSLError, OSError):
+			return
+		tls.settimeout(None)
+
+		with tls:
+			if tls.selected_alpn_protocol() == "h2":
+				HTTP2Connection(tls, client_address, self).run()
+				return
+			try:
+				self.RequestHandlerClass(tls, client_address, self)
+			except OSError:
+				pass  # The browser hung up mid-response
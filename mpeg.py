@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+MPEG audio helpers - Locates the audio frames inside MP3 files
+"""
+
+import mmap
+import struct
+
+# Bitrates in kbps, indexed by [version is MPEG-1][layer][bitrate index]
+BITRATES = {
+	True: {
+		1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+		2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+		3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+	},
+	False: {
+		1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+		2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+		3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+	},
+}
+
+# Sample rates in Hz, indexed by version bits then sample rate index
+SAMPLE_RATES = {
+	0b11: [44100, 48000, 32000],  # MPEG-1
+	0b10: [22050, 24000, 16000],  # MPEG-2
+	0b00: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+# How far past the ID3v2 tag to look for the first frame
+MAX_SYNC_SEARCH = 64 * 1024
+
+
+def parse_frame_header(header):
+	"""Parse a 4-byte MPEG audio frame header
+
+	Returns a dict with frame_length (bytes), samples (per frame), sample_rate
+	and bitrate (kbps), or None if the bytes aren't a valid frame header.
+	"""
+	if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+		return None
+
+	version_bits = (header[1] >> 3) & 0b11
+	layer_bits = (header[1] >> 1) & 0b11
+	bitrate_index = header[2] >> 4
+	sample_rate_index = (header[2] >> 2) & 0b11
+	padding = (header[2] >> 1) & 1
+
+	if version_bits == 0b01 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+		return None
+
+	mpeg1 = version_bits == 0b11
+	layer = 4 - layer_bits
+	bitrate = BITRATES[mpeg1][layer][bitrate_index]
+	sample_rate = SAMPLE_RATES[version_bits][sample_rate_index]
+
+	if layer == 1:
+		samples = 384
+		frame_length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+	else:
+		samples = 1152 if (layer == 2 or mpeg1) else 576
+		frame_length = samples // 8 * bitrate * 1000 // sample_rate + padding
+
+	return {
+		"frame_length": frame_length,
+		"samples": samples,
+		"sample_rate": sample_rate,
+		"bitrate": bitrate,
+		"channels": 1 if (header[3] >> 6) == 0b11 else 2,
+		"mpeg1": mpeg1,
+		"layer": layer,
+	}
+
+
+def id3v2_size(header):
+	"""Return the total size of the ID3v2 tag starting with these 10 bytes (0 if none)"""
+	if len(header) < 10 or header[:3] != b"ID3":
+		return 0
+	size = 0
+	for byte in header[6:10]:
+		size = (size << 7) | (byte & 0x7F)
+	footer = 10 if header[5] & 0x10 else 0
+	return 10 + size + footer
+
+
+def trailing_tags_size(f, file_size):
+	"""Return how many bytes of ID3v1 / APEv2 tags sit at the end of the file"""
+	trailing = 0
+
+	if file_size >= 128:
+		f.seek(file_size - 128)
+		if f.read(3) == b"TAG":
+			trailing = 128
+
+	# APEv2 footer, either at the very end or just before an ID3v1 tag
+	if file_size - trailing >= 32:
+		f.seek(file_size - trailing - 32)
+		footer = f.read(32)
+		if footer[:8] == b"APETAGEX":
+			tag_size, _items, flags = struct.unpack("<III", footer[12:24])
+			has_header = bool(flags & 0x80000000)
+			trailing += tag_size + (32 if has_header else 0)
+
+	return min(trailing, file_size)
+
+
+def find_frame_sync(f, start, end, limit=MAX_SYNC_SEARCH):
+	"""Find the offset of the first valid frame at or after start
+
+	A candidate only counts if the next frame header follows right after it,
+	which filters out stray 0xFF bytes in padding or album art.
+	"""
+	f.seek(start)
+	data = f.read(min(limit, end - start))
+	position = data.find(b"\xFF")
+
+	while 0 <= position < len(data) - 3:
+		header = parse_frame_header(data[position:position + 4])
+		if header:
+			next_offset = start + position + header["frame_length"]
+			if next_offset + 4 > end:
+				return start + position
+			f.seek(next_offset)
+			if parse_frame_header(f.read(4)):
+				return start + position
+		position = data.find(b"\xFF", position + 1)
+
+	return None
+
+
+def audio_data_range(path):
+	"""Return (start, end) byte offsets of the MPEG frames in an MP3 file
+
+	ID3v2 tags at the front and ID3v1 / APEv2 tags at the end are excluded,
+	so two copies of a track that differ only in their tags give the same range
+	contents. Returns None if no frames could be found.
+	"""
+	with open(path, "rb") as f:
+		f.seek(0, 2)
+		file_size = f.tell()
+
+		start = 0
+		# Some taggers write more than one ID3v2 tag back to back
+		while True:
+			f.seek(start)
+			size = id3v2_size(f.read(10))
+			if not size:
+				break
+			start += size
+
+		end = file_size - trailing_tags_size(f, file_size)
+		if start >= end:
+			return None
+
+		sync = find_frame_sync(f, start, end)
+		if sync is None:
+			return None
+
+		return sync, end
+
+
+def side_info_size(header):
+	"""Size of the Layer III side information that follows a frame header"""
+	if header["mpeg1"]:
+		return 17 if header["channels"] == 1 else 32
+	return 9 if header["channels"] == 1 else 17
+
+
+def read_encoder_gapless(path):
+	"""Read encoder delay and padding from the LAME/Xing header of an MP3
+
+	Returns {"encoder_delay", "encoder_padding", "sample_rate"} in samples,
+	or None if the first frame doesn't carry a LAME-style gapless tag.
+	"""
+	audio_range = audio_data_range(path)
+	if audio_range is None:
+		return None
+
+	with open(path, "rb") as f:
+		f.seek(audio_range[0])
+		data = f.read(4 + 32 + 120 + 24)
+
+	header = parse_frame_header(data[:4])
+	if header is None or header["layer"] != 3:
+		return None
+
+	offset = 4 + side_info_size(header)
+	if data[offset:offset + 4] not in (b"Xing", b"Info"):
+		return None
+
+	flags = int.from_bytes(data[offset + 4:offset + 8], "big")
+	position = offset + 8
+	position += 4 if flags & 0x1 else 0    # Frame count
+	position += 4 if flags & 0x2 else 0    # Byte count
+	position += 100 if flags & 0x4 else 0  # Seek table
+	position += 4 if flags & 0x8 else 0    # Quality
+
+	# LAME extension: 9-byte encoder string, then 12 bytes of fields,
+	# then 12 bits of encoder delay and 12 bits of padding
+	lame = data[position:position + 24]
+	if len(lame) < 24 or not lame[:4].isalpha():
+		return None
+
+	packed = int.from_bytes(lame[21:24], "big")
+	return {
+		"encoder_delay": packed >> 12,
+		"encoder_padding": packed & 0xFFF,
+		"sample_rate": header["sample_rate"],
+	}
+
+
+def estimate_duration(path):
+	"""Estimate the playing time of an MP3 in seconds from its frame headers
+
+	Uses the frame count from a Xing/Info header when there is one (VBR files),
+	otherwise assumes a constant bitrate. Returns None if no frames are found.
+	"""
+	audio_range = audio_data_range(path)
+	if audio_range is None:
+		return None
+
+	start, end = audio_range
+	with open(path, "rb") as f:
+		f.seek(start)
+		data = f.read(4 + 32 + 12)
+
+	header = parse_frame_header(data[:4])
+	if header is None:
+		return None
+
+	if header["layer"] == 3:
+		offset = 4 + side_info_size(header)
+		if data[offset:offset + 4] in (b"Xing", b"Info"):
+			flags = int.from_bytes(data[offset + 4:offset + 8], "big")
+			if flags & 0x1:
+				frames = int.from_bytes(data[offset + 8:offset + 12], "big")
+				return frames * header["samples"] / header["sample_rate"]
+
+	return (end - start) * 8 / (header["bitrate"] * 1000)
+
+
+def build_seek_index(path, resolution=1.0):
+	"""Walk every frame of an MP3 and map playing time to byte offsets
+
+	Returns {"resolution", "duration", "offsets"} where offsets[i] is the
+	byte offset of the first frame starting at or after i * resolution
+	seconds, or None if no frames are found. Unlike estimate_duration(), the
+	duration is exact for VBR files without a Xing header too.
+	"""
+	audio_range = audio_data_range(path)
+	if audio_range is None:
+		return None
+
+	start, end = audio_range
+	offsets = []
+	samples = 0
+	sample_rate = None
+
+	with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		position = start
+		while position + 4 <= end:
+			header = parse_frame_header(data[position:position + 4])
+			if header is None:
+				# Junk between frames: skip ahead to the next real frame
+				position = find_frame_sync(f, position + 1, end)
+				if position is None:
+					break
+				continue
+
+			# The Xing/Info frame at the start carries no audio
+			if position == start and header["layer"] == 3:
+				tag_offset = position + 4 + side_info_size(header)
+				if data[tag_offset:tag_offset + 4] in (b"Xing", b"Info"):
+					position += header["frame_length"]
+					continue
+
+			sample_rate = header["sample_rate"]
+			while samples / sample_rate >= len(offsets) * resolution:
+				offsets.append(position)
+
+			samples += header["samples"]
+			position += header["frame_length"]
+
+	if not offsets:
+		return None
+
+	return {
+		"resolution": resolution,
+		"duration": round(samples / sample_rate, 3),
+		"offsets": offsets,
+	}
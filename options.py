@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Options - Command line option parsing shared by the capsule tools
+"""
+
+import sys
+
+
+def get_option(name, default=None):
+	"""Return the value of a --name=value command line option"""
+	prefix = f"--{name}="
+	for arg in sys.argv:
+		if arg.startswith(prefix):
+			return arg[len(prefix):]
+	return default
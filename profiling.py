@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Profiling - Shared stage timing switch for scan.py, host.py, rip.py and generate_manifests.py
+Run any of them with --profile to print per-stage wall time when the script exits,
+or with --profile=<file> to also dump cProfile stats (readable with python -m pstats <file>)
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_FLAG = "--profile"
+
+# Used to hand timings recorded before the venv re-exec over to the child process
+STAGES_ENV = "VIBE_CAPSULE_PROFILE_STAGES"
+
+_enabled = False
+_handed_off = False
+_start_time = None
+_stages = []  # [name, elapsed seconds, nesting depth], in the order stages started
+_nesting = threading.local()
+_profiler = None
+_stats_file = None
+
+
+def enable_from_argv(argv=None):
+	"""Turn on profiling if --profile or --profile=<file> was passed
+
+	Safe to call more than once; only the first call has any effect.
+	"""
+	global _enabled, _start_time, _stages, _profiler, _stats_file
+
+	if _enabled:
+		return True
+
+	argv = sys.argv if argv is None else argv
+	for arg in argv:
+		if arg == PROFILE_FLAG:
+			break
+		if arg.startswith(PROFILE_FLAG + "="):
+			_stats_file = arg.split("=", 1)[1] or None
+			break
+	else:
+		return False
+
+	_enabled = True
+	_start_time = time.time()
+
+	# Pick up stages recorded by the parent process (venv bootstrap)
+	inherited = os.environ.pop(STAGES_ENV, None)
+	if inherited:
+		try:
+			state = json.loads(inherited)
+			_start_time = state["start"]
+			_stages = [list(entry) for entry in state["stages"]]
+		except (ValueError, KeyError, TypeError):
+			pass
+
+	if _stats_file:
+		import cProfile
+		_profiler = cProfile.Profile()
+		_profiler.enable()
+
+	atexit.register(_finish)
+	return True
+
+
+def is_enabled():
+	"""Return True if profiling was switched on for this process"""
+	return _enabled
+
+
+@contextmanager
+def stage(name):
+	"""Record the wall time spent inside the block under the given stage name
+
+	Stages opened inside another stage are recorded as its children, and
+	reported indented under it.
+	"""
+	if not _enabled:
+		yield
+		return
+
+	depth = getattr(_nesting, "depth", 0)
+	entry = [name, 0.0, depth]
+	_stages.append(entry)  # Reserve the slot so parents are listed before their children
+	_nesting.depth = depth + 1
+	started = time.perf_counter()
+	try:
+		yield
+	finally:
+		entry[1] = time.perf_counter() - started
+		_nesting.depth = depth
+
+
+def record(name, elapsed):
+	"""Record an already measured stage duration in seconds"""
+	if _enabled:
+		_stages.append([name, elapsed, getattr(_nesting, "depth", 0)])
+
+
+def child_env():
+	"""Environment for a re-executed child that should carry on recording
+
+	The child prints the combined report, so this process stays quiet on exit.
+	"""
+	global _handed_off
+
+	env = os.environ.copy()
+	if _enabled:
+		env[STAGES_ENV] = json.dumps({"start": _start_time, "stages": _stages})
+		_handed_off = True
+	return env
+
+
+def print_report():
+	"""Print the recorded stage timings"""
+	wall = time.time() - _start_time
+	name_width = max([len(name) + 2 * depth for name, _, depth in _stages] + [len("total (wall)")])
+
+	print()
+	print("=" * 60)
+	print("Stage timings")
+	print("=" * 60)
+
+	if not _stages:
+		print("  No stages recorded.")
+
+	# Nested stages are part of their parent's time, so only top-level shares add up
+	for name, elapsed, depth in _stages:
+		share = (elapsed / wall * 100) if wall > 0 else 0
+		label = "  " * depth + name
+		print(f"  {label:<{name_width}}  {elapsed:9.3f}s  {share:5.1f}%")
+
+	print(f"  {'total (wall)':<{name_width}}  {wall:9.3f}s")
+
+
+def _finish():
+	"""Stop the profiler and print the report (registered with atexit)"""
+	if _handed_off:
+		return
+
+	print_report()
+
+	if _profiler is not None:
+		_profiler.disable()
+		try:
+			_profiler.dump_stats(_stats_file)
+			print(f"\n✓ cProfile stats written to {_stats_file}")
+			print(f"  View with: python -m pstats {_stats_file}")
+		except OSError as e:
+			print(f"\n✗ Could not write profile stats to {_stats_file}: {e}")
@@ -39,17 +39,21 @@ let playerReady = false;
 let songs = [];
 let animationFrameId = null;
 let prePlaySeekTime = 0;
-let preloadedAudio = {}; // Cache for preloaded audio elements
-let currentPreloadIndex = 0;
-let priorityPreloadQueue = []; // Songs requested by user that need priority preloading
-let isPreloadingPriority = false;
-let totalBytesLoaded = 0; // Track total filesize of all preloaded songs
 let cachedTracks = new Set(); // Track which songs are cached for offline use
 let CACHE_NAME = null; // Will be loaded from manifest.json
+let trackIndex = null; // Paged track data (scan.py --paged), null when using tracks.json
+let nextTrackPage = 0;
+let trackPageRequest = null;
+let playlistEndObserver = null;
+let highlightedSongIndex = 0; // Playlist row currently marked as playing
+let albumArtwork = null; // Pre-sized album art from manifest.json (scan.py), if any
+
+// Data baked into a pre-rendered index.html by generate_manifests.py, if any
+const capsuleDataElement = document.getElementById('capsuleData');
+const capsuleData = capsuleDataElement ? JSON.parse(capsuleDataElement.textContent) : null;
 
 // Load cache name from manifest.json first, then load tracks
-fetch('manifest.json')
-	.then(response => response.json())
+(capsuleData ? Promise.resolve(capsuleData.manifest) : fetch('manifest.json').then(response => response.json()))
 	.then(manifest => {
 		CACHE_NAME = manifest.cache_name || manifest.name;
 		console.log('Using cache name:', CACHE_NAME);
@@ -59,14 +63,28 @@ fetch('manifest.json')
 			document.title = manifest.name;
 		}
 
-		// Now that we have CACHE_NAME, load tracks
-		return fetch('tracks/tracks.json');
-	})
-	.then(response => {
-		if (!response.ok) {
-			throw new Error('tracks.json not found');
+		if (manifest.artwork && manifest.artwork.length > 0) {
+			albumArtwork = manifest.artwork;
 		}
-		return response.json();
+
+		// Now that we have CACHE_NAME, load tracks (first page only for paged capsules)
+		if (capsuleData) {
+			if (capsuleData.tracks_index) {
+				// The embedded tracks are the first page
+				trackIndex = capsuleData.tracks_index;
+				nextTrackPage = 1;
+			}
+			return capsuleData.tracks;
+		}
+		if (manifest.tracks_index) {
+			return loadTrackIndex(manifest.tracks_index);
+		}
+		return fetch('tracks/tracks.json').then(response => {
+			if (!response.ok) {
+				throw new Error('tracks.json not found');
+			}
+			return response.json();
+		});
 	})
 	.then(data => {
 		songs = shuffle ? shuffleArray(data) : data;
@@ -76,10 +94,15 @@ fetch('manifest.json')
 			// Check which tracks are already cached before rendering
 			return checkCachedTracks().then(() => {
 				renderPlaylist();
+				if (capsuleData && !capsuleData.tracks_index) {
+					refreshEmbeddedTracks(JSON.stringify(capsuleData.tracks));
+				}
 				// Pre-cache resources first, then songs
-				return preloadResources().then(() => {
-					startPreloadingSongs();
-				});
+				return preloadResources()
+					.then(checkStorageBudget)
+					.then(() => {
+						startPreloadingSongs();
+					});
 			});
 		} else {
 			updateCurrentSongDisplay('No tracks found');
@@ -92,6 +115,9 @@ fetch('manifest.json')
 
 // Audio event listeners
 audio.addEventListener('play', () => {
+	if (audioContext && audioContext.state !== 'running') {
+		audioContext.resume().catch(() => {});
+	}
 	startProgressBar();
 	const song = songs[currentSongIndex];
 	const songText = `${song.artist} – ${song.title}`;
@@ -114,16 +140,28 @@ audio.addEventListener('play', () => {
 	if ('mediaSession' in navigator) {
 		// Convert relative path to absolute URL for media session
 		// Use document.baseURI to correctly resolve paths in subdirectories
-		const albumArtUrl = new URL('tracks/album_art.jpg', document.baseURI).href;
-		navigator.mediaSession.metadata = new MediaMetadata({
-			title: song.title,
-			artist: song.artist,
-			artwork: [
+		// Prefer the track's own pre-sized cover, then the pre-sized album art
+		const presizedArtwork = song.artwork || albumArtwork;
+		let artwork;
+		if (presizedArtwork) {
+			artwork = presizedArtwork.map(image => ({
+				src: new URL(image.src, document.baseURI).href,
+				sizes: image.sizes,
+				type: image.type
+			}));
+		} else {
+			const albumArtUrl = new URL('tracks/album_art.jpg', document.baseURI).href;
+			artwork = [
 				{ src: albumArtUrl, sizes: '860x860', type: 'image/jpeg' },
 				{ src: albumArtUrl, sizes: '512x512', type: 'image/jpeg' },
 				{ src: albumArtUrl, sizes: '256x256', type: 'image/jpeg' },
 				{ src: albumArtUrl, sizes: '128x128', type: 'image/jpeg' }
-			]
+			];
+		}
+		navigator.mediaSession.metadata = new MediaMetadata({
+			title: song.title,
+			artist: song.artist,
+			artwork: artwork
 		});
 
 		// Set action handlers after playback starts (required for iOS)
@@ -183,50 +221,173 @@ audio.addEventListener('loadedmetadata', () => {
 	resetProgressBar();
 });
 
+// Paged track loading for large capsules
+function loadTrackIndex(indexUrl) {
+	return fetch(indexUrl)
+		.then(response => {
+			if (!response.ok) {
+				throw new Error('Track index not found');
+			}
+			return response.json();
+		})
+		.then(index => {
+			trackIndex = index;
+			nextTrackPage = 0;
+			console.log(`Paged tracks: ${index.total} tracks in ${index.pages.length} pages`);
+			return fetchTrackPage();
+		});
+}
+
+function fetchTrackPage() {
+	const pageUrl = trackIndex.pages[nextTrackPage];
+	return fetch(pageUrl)
+		.then(response => {
+			if (!response.ok) {
+				throw new Error(`HTTP error! status: ${response.status}`);
+			}
+			return response.json();
+		})
+		.then(page => {
+			nextTrackPage++;
+			return page;
+		});
+}
+
+function hasMoreTrackPages() {
+	return trackIndex !== null && nextTrackPage < trackIndex.pages.length;
+}
+
+// Append the next page of tracks to the playlist (no-op when everything is loaded)
+function loadNextTrackPage() {
+	if (!hasMoreTrackPages()) {
+		return Promise.resolve();
+	}
+	if (trackPageRequest) {
+		return trackPageRequest;
+	}
+
+	trackPageRequest = fetchTrackPage()
+		.then(page => {
+			const start = songs.length;
+			const newSongs = shuffle ? shuffleArray(page) : page;
+			songs.push(...newSongs);
+			return checkCachedTracks(newSongs).then(() => {
+				appendPlaylistItems(start);
+				startPreloadingSongs(newSongs);
+			});
+		})
+		.catch(error => {
+			console.error('Failed to load track page:', error);
+		})
+		.finally(() => {
+			trackPageRequest = null;
+		});
+
+	return trackPageRequest;
+}
+
+// Load the next page once the end of the playlist scrolls into view
+function observePlaylistEnd() {
+	if (playlistEndObserver) {
+		playlistEndObserver.disconnect();
+	}
+	if (!hasMoreTrackPages() || !('IntersectionObserver' in window) || !playlist.lastElementChild) {
+		return;
+	}
+
+	playlistEndObserver = new IntersectionObserver(entries => {
+		if (entries.some(entry => entry.isIntersecting)) {
+			loadNextTrackPage();
+		}
+	}, { root: playlist, rootMargin: '400px' });
+	playlistEndObserver.observe(playlist.lastElementChild);
+}
+
+// A pre-rendered page can be older than a hand-edited tracks.json, so check it
+// once the playlist is up and switch over if nothing has started playing yet
+function refreshEmbeddedTracks(embeddedJson) {
+	return fetch('tracks/tracks.json', { cache: 'no-cache' })
+		.then(response => response.ok ? response.json() : null)
+		.then(data => {
+			if (!data || data.length === 0 || JSON.stringify(data) === embeddedJson || audio.src) {
+				return;
+			}
+			console.log('tracks.json changed since index.html was generated, using it instead');
+			songs = shuffle ? shuffleArray(data) : data;
+			currentSongIndex = 0;
+			updateCurrentSongDisplay(`Ready to play: ${songs[0].artist} – ${songs[0].title}`);
+			renderPlaylist();
+		})
+		.catch(error => console.log('Could not check tracks.json:', error));
+}
+
 function renderPlaylist() {
 	playlist.innerHTML = '';
+	appendPlaylistItems(0);
+}
+
+function appendPlaylistItems(start) {
+	const fragment = document.createDocumentFragment();
+	for (let index = start; index < songs.length; index++) {
+		fragment.appendChild(createPlaylistItem(index));
+	}
+	playlist.appendChild(fragment);
+	observePlaylistEnd();
+}
+
+// Rebuild only the given playlist rows (e.g. the old and new current song)
+function refreshPlaylistItems(indices) {
+	const playlistItems = playlist.children;
+	new Set(indices).forEach(index => {
+		if (playlistItems[index]) {
+			playlist.replaceChild(createPlaylistItem(index), playlistItems[index]);
+		}
+	});
+	observePlaylistEnd();
+}
+
+function createPlaylistItem(index) {
+	const song = songs[index];
 	const currentDisplayText = currentSongDisplay.textContent;
 	const isInitialized = currentDisplayText !== 'No song playing';
 
-	songs.forEach((song, index) => {
-		const item = document.createElement('div');
-		item.classList.add('playlist-item');
+	const item = document.createElement('div');
+	item.classList.add('playlist-item');
 
-		const contentDiv = document.createElement('div');
-		contentDiv.classList.add('playlist-item-content');
+	const contentDiv = document.createElement('div');
+	contentDiv.classList.add('playlist-item-content');
 
-		const titleDiv = document.createElement('div');
-		titleDiv.classList.add('playlist-item-title');
-		if (isInitialized && index === currentSongIndex) {
-			titleDiv.classList.add('current');
-		}
-		titleDiv.textContent = song.title;
+	const titleDiv = document.createElement('div');
+	titleDiv.classList.add('playlist-item-title');
+	if (isInitialized && index === currentSongIndex) {
+		titleDiv.classList.add('current');
+	}
+	titleDiv.textContent = song.title;
 
-		const artistDiv = document.createElement('div');
-		artistDiv.classList.add('playlist-item-artist');
-		if (isInitialized && index === currentSongIndex) {
-			artistDiv.classList.add('current');
-		}
-		artistDiv.textContent = song.artist;
+	const artistDiv = document.createElement('div');
+	artistDiv.classList.add('playlist-item-artist');
+	if (isInitialized && index === currentSongIndex) {
+		artistDiv.classList.add('current');
+	}
+	artistDiv.textContent = song.artist;
 
-		// Set cached status for visual indication
-		const isCached = cachedTracks.has(song.filename);
-		if (!isCached) {
-			contentDiv.classList.add('uncached');
-		}
+	// Set cached status for visual indication
+	const isCached = cachedTracks.has(song.filename);
+	if (!isCached) {
+		contentDiv.classList.add('uncached');
+	}
 
-		contentDiv.appendChild(titleDiv);
-		contentDiv.appendChild(artistDiv);
+	contentDiv.appendChild(titleDiv);
+	contentDiv.appendChild(artistDiv);
 
-		const loopIcon = document.createElement('span');
-		loopIcon.textContent = '🔁';
-		loopIcon.style.display = (song.looping || false) ? 'inline' : 'none';
+	const loopIcon = document.createElement('span');
+	loopIcon.textContent = '🔁';
+	loopIcon.style.display = (song.looping || false) ? 'inline' : 'none';
 
-		item.appendChild(contentDiv);
-		item.appendChild(loopIcon);
-		item.addEventListener('click', () => toggleLooping(index));
-		playlist.appendChild(item);
-	});
+	item.appendChild(contentDiv);
+	item.appendChild(loopIcon);
+	item.addEventListener('click', () => toggleLooping(index));
+	return item;
 }
 
 function toggleLooping(index) {
@@ -242,7 +403,7 @@ function toggleLooping(index) {
 		}
 		// Toggle looping
 		songs[index].looping = !(songs[index].looping || false);
-		renderPlaylist();
+		refreshPlaylistItems([index]);
 	} else {
 		playSong(index);
 	}
@@ -265,22 +426,18 @@ function playSong(index) {
 	const song = songs[currentSongIndex];
 	console.log(`Attempting to play: ${song.artist} – ${song.title}`);
 	console.log(`Filename: ${song.filename}`);
-	console.log(`Is in preloadedAudio: ${!!preloadedAudio[song.filename]}`);
-
-	// Use preloaded blob if available, otherwise load from server
-	if (preloadedAudio[song.filename]) {
-		const blobUrl = preloadedAudio[song.filename].blobUrl;
-		console.log(`Playing from preloaded blob: ${song.filename}`);
-		console.log(`Blob URL: ${blobUrl}`);
-		audio.src = blobUrl;
-	} else {
-		console.log(`Song not preloaded, loading: ${song.filename}`);
-		audio.src = `tracks/${song.filename}`;
+	console.log(`Is cached: ${cachedTracks.has(song.filename)}`);
+
+	// Always stream by URL: the service worker answers from Cache Storage
+	// (including range requests) once the track is cached
+	audio.src = `tracks/${song.filename}`;
+	if (!cachedTracks.has(song.filename)) {
 		// Request priority preloading for this song
 		requestPriorityPreload(song.filename);
 	}
 
 	console.log(`Audio src set to: ${audio.src}`);
+	applyReplayGain(song);
 
 	// For iOS PWA: We need to call load() and play() synchronously
 	// Reset any previous state first
@@ -316,9 +473,62 @@ function playSong(index) {
 	// Optimistically set playing state
 	isPlaying = true;
 	updatePlayPauseButton();
-	renderPlaylist();
+
+	// Only the previous and new current rows change
+	refreshPlaylistItems([highlightedSongIndex, currentSongIndex]);
+	highlightedSongIndex = currentSongIndex;
+
+	// Fetch the next page of a paged capsule before playback runs out of songs
+	if (currentSongIndex >= songs.length - 2) {
+		loadNextTrackPage();
+	}
 }
 
+// Apply the ReplayGain values precomputed by scan.py --analyze through a Web
+// Audio GainNode: iOS ignores audio.volume, and a gain node can also turn
+// quiet tracks up (never past their peak, so nothing clips)
+let audioContext = null;
+let replayGainNode = null;
+let replayGain = 1;
+
+function applyReplayGain(song) {
+	const replaygain = song.replaygain;
+	replayGain = 1;
+	if (replaygain) {
+		const linearGain = Math.pow(10, replaygain.track_gain / 20);
+		const peakLimit = replaygain.track_peak > 0 ? 1 / replaygain.track_peak : linearGain;
+		replayGain = Math.min(linearGain, peakLimit);
+	}
+	if (replayGainNode) {
+		replayGainNode.gain.value = replayGain;
+	}
+}
+
+// Browsers only let an AudioContext start inside a tap or key press, so the
+// graph is built (or woken up after an interruption) on the listener's input.
+// Capsules without ReplayGain values keep the plain <audio> element.
+function ensureAudioGraph() {
+	if (audioContext) {
+		if (audioContext.state !== 'running') {
+			audioContext.resume().catch(() => {});
+		}
+		return;
+	}
+	const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+	if (!AudioContextClass || !songs.some(song => song.replaygain)) {
+		return;
+	}
+	audioContext = new AudioContextClass();
+	replayGainNode = audioContext.createGain();
+	replayGainNode.gain.value = replayGain;
+	audioContext.createMediaElementSource(audio).connect(replayGainNode);
+	replayGainNode.connect(audioContext.destination);
+}
+
+['pointerdown', 'touchend', 'keydown'].forEach(type => {
+	document.addEventListener(type, ensureAudioGraph, { capture: true, passive: true });
+});
+
 function updateCurrentSongDisplay(text) {
 	currentSongDisplay.innerHTML = `<span>${text}</span>`;
 	// Initialize marquee effect after a brief delay to ensure DOM is updated
@@ -520,6 +730,14 @@ function updatePlayPauseButton() {
 
 function nextSong() {
 	if (!playerReady) return;
+	// At the end of the loaded pages, load the next one instead of wrapping around
+	if (currentSongIndex + 1 >= songs.length && hasMoreTrackPages()) {
+		loadNextTrackPage().then(() => {
+			currentSongIndex = (currentSongIndex + 1) % songs.length;
+			playSong(currentSongIndex);
+		});
+		return;
+	}
 	currentSongIndex = (currentSongIndex + 1) % songs.length;
 	playSong(currentSongIndex);
 }
@@ -592,10 +810,20 @@ function resetProgressBar() {
 	progressBar.style.setProperty('--progress', '0');
 }
 
+// The browser's duration, or the exact one scan.py measured while the browser
+// can't tell (e.g. streamed responses without a length report Infinity)
+function trackDuration() {
+	if (isFinite(audio.duration) && audio.duration > 0) {
+		return audio.duration;
+	}
+	const song = songs[currentSongIndex];
+	return song && song.duration ? song.duration : NaN;
+}
+
 function updateProgressBar() {
-	if (audio.duration && !isDragging && !isSeeking) {
+	if (trackDuration() && !isDragging && !isSeeking) {
 		const currentTime = audio.currentTime;
-		const duration = audio.duration;
+		const duration = trackDuration();
 		const progressPercentage = (currentTime / duration) * 100;
 		const displayPercentage = isNaN(progressPercentage) ? 0 : progressPercentage;
 		progressBar.style.setProperty('--progress', displayPercentage);
@@ -629,30 +857,37 @@ function applySeek(clickPercentage) {
 	// If audio hasn't been loaded yet, load it but don't play
 	if (!audio.src || audio.src === '') {
 		const song = songs[currentSongIndex];
-
-		// Use preloaded blob if available, otherwise load from server
-		if (preloadedAudio[song.filename]) {
-			audio.src = preloadedAudio[song.filename].blobUrl;
-		} else {
-			audio.src = `tracks/${song.filename}`;
-		}
+		audio.src = `tracks/${song.filename}`;
+		applyReplayGain(song);
 
 		// Wait for metadata to be loaded before seeking
 		audio.addEventListener('loadedmetadata', function setInitialTime() {
-			const duration = audio.duration;
+			const duration = trackDuration();
 			const seekTime = duration * clickPercentage;
 			attemptSeekWithRetry(seekTime, clickPercentage);
 			prePlaySeekTime = seekTime;
 			audio.removeEventListener('loadedmetadata', setInitialTime);
 		}, { once: true });
-	} else if (audio.duration) {
-		const duration = audio.duration;
+	} else if (trackDuration()) {
+		const duration = trackDuration();
 		const seekTime = duration * clickPercentage;
 		attemptSeekWithRetry(seekTime, clickPercentage);
 		prePlaySeekTime = seekTime;
 	}
 }
 
+// Ranges the browser can jump to without downloading what comes before:
+// all of a track served with byte-range support (host.py, or the service
+// worker for cached tracks), otherwise only what's buffered
+function isTimeSeekable(time) {
+	for (let i = 0; i < audio.seekable.length; i++) {
+		if (time >= audio.seekable.start(i) && time <= audio.seekable.end(i)) {
+			return true;
+		}
+	}
+	return false;
+}
+
 function isTimeBuffered(time) {
 	// Check if the given time is within any buffered time range
 	for (let i = 0; i < audio.buffered.length; i++) {
@@ -675,6 +910,13 @@ function attemptSeekWithRetry(seekTime, targetPercentage) {
 	// Try to seek
 	audio.currentTime = seekTime;
 
+	// The browser fetches the target bytes directly, no need to poll for data
+	if (isTimeSeekable(seekTime)) {
+		isSeeking = false;
+		targetSeekTime = null;
+		return;
+	}
+
 	// Handler to check if we reached the target after seeking completes
 	function checkSeekSuccess() {
 		// Allow small tolerance for floating point comparison
@@ -810,7 +1052,7 @@ function preloadResources() {
 		'resources/pause.png',
 		'resources/prev.png',
 		'resources/next.png',
-		'tracks/album_art.jpg'
+		...(albumArtwork ? albumArtwork.map(image => image.src) : ['tracks/album_art.jpg'])
 	];
 
 	const imagePromises = resources.map(src => {
@@ -833,117 +1075,119 @@ function preloadResources() {
 	});
 }
 
-function startPreloadingSongs() {
-	// Start with the first song
-	currentPreloadIndex = 0;
-	preloadNextSong();
-}
-
-function preloadNextSong() {
-	if (currentPreloadIndex >= songs.length) {
-		const totalMB = (totalBytesLoaded / 1024 / 1024).toFixed(2);
-		console.log(`All songs preloaded - Total size: ${totalMB} MB (${totalBytesLoaded} bytes)`);
+// Track downloads are scheduled by the service worker (see generate_manifests.py)
+// The player only tells it the playlist order and which track to fetch next
+function postToServiceWorker(message) {
+	if (!('serviceWorker' in navigator)) {
 		return;
 	}
+	navigator.serviceWorker.ready.then(registration => {
+		if (registration.active) {
+			registration.active.postMessage(message);
+		}
+	});
+}
 
-	const song = songs[currentPreloadIndex];
-	const filename = song.filename;
+// Posted on every load, even with nothing new here: the service worker also
+// picks up the rest of the capsule's tracks that an earlier visit didn't finish
+function startPreloadingSongs(songsToCache = songs) {
+	const uncached = songsToCache.filter(song => !cachedTracks.has(song.filename));
+	console.log(`Asking service worker to cache ${uncached.length} track(s)`);
+	postToServiceWorker({
+		type: 'precache',
+		tracks: uncached.map(song => `tracks/${song.filename}`)
+	});
+}
 
-	// Skip if already preloaded in memory
-	if (preloadedAudio[filename]) {
-		currentPreloadIndex++;
-		preloadNextSong();
-		return;
-	}
+// Mark tracks as cached as the service worker finishes them
+if ('serviceWorker' in navigator) {
+	navigator.serviceWorker.addEventListener('message', event => {
+		const data = event.data || {};
+		if (data.type === 'storage-full') {
+			console.warn(`Not enough storage to save ${data.skipped} track(s) offline`);
+			return;
+		}
+		if (data.type !== 'cached') {
+			return;
+		}
+		const song = songs.find(s => trackUrl(s.filename) === data.url);
+		if (song) {
+			console.log(`✓ Cached for offline: ${song.artist} – ${song.title}`);
+			cachedTracks.add(song.filename);
+			updateTrackCachedStatus(song.filename);
+		}
+	});
+}
 
-	// If already cached, load from cache into memory
-	if (cachedTracks.has(filename)) {
-		console.log(`Loading from cache: ${song.artist} – ${song.title}`);
-		loadFromCache(filename).then(() => {
-			currentPreloadIndex++;
-			setTimeout(() => preloadNextSong(), 100);
-		}).catch(err => {
-			console.error(`Failed to load from cache, fetching instead:`, err);
-			// If cache load fails, fetch from network
-			fetchAndPreloadSong(song, filename);
-		});
+// Compare the install plan from resource-manifest.json with the storage the
+// browser will give us, and warn up front if the whole mix won't fit offline
+async function checkStorageBudget() {
+	if (!navigator.storage || !navigator.storage.estimate) {
 		return;
 	}
 
-	console.log(`Preloading: ${song.artist} – ${song.title}`);
-	fetchAndPreloadSong(song, filename);
-}
+	try {
+		const response = await fetch('resource-manifest.json');
+		const plan = (await response.json()).install_plan;
+		if (!plan) {
+			return;
+		}
 
-function fetchAndPreloadSong(song, filename) {
-	// Use fetch to force full download of the entire file
-	fetch(`tracks/${filename}`)
-		.then(response => {
-			if (!response.ok) {
-				throw new Error(`HTTP error! status: ${response.status}`);
+		const { usage = 0, quota = Infinity } = await navigator.storage.estimate();
+		let available = quota - usage;
+		let playableSeconds = 0;
+		let totalSeconds = 0;
+		for (const track of plan.tracks) {
+			totalSeconds += track.duration;
+			if (cachedTracks.has(track.url.slice('tracks/'.length))) {
+				playableSeconds += track.duration;
+			} else if (track.bytes <= available) {
+				available -= track.bytes;
+				playableSeconds += track.duration;
 			}
-			// Get total file size for progress tracking
-			const contentLength = response.headers.get('content-length');
-			console.log(`Downloading ${song.title} (${(contentLength / 1024 / 1024).toFixed(2)} MB)...`);
-
-			// Read the entire response as a blob
-			return response.blob();
-		})
-		.then(blob => {
-			// Add blob size to total
-			totalBytesLoaded += blob.size;
-
-			// Create a blob URL that will persist in memory
-			const blobUrl = URL.createObjectURL(blob);
-
-			preloadedAudio[filename] = {
-				blobUrl: blobUrl,
-				blob: blob
-			};
-
-			console.log(`✓ Fully preloaded: ${song.artist} – ${song.title}`);
+		}
 
-			// Store in Cache API for offline access
-			return storeBlobInCache(filename, blob).then(() => {
-				// Mark as cached and update UI
-				cachedTracks.add(filename);
-				updateTrackCachedStatus(filename);
+		const neededMB = (plan.total_bytes / 1024 / 1024).toFixed(1);
+		console.log(`Install plan: ${neededMB} MB total, ${((quota - usage) / 1024 / 1024).toFixed(1)} MB available`);
+		if (playableSeconds < totalSeconds) {
+			const minutes = Math.floor(playableSeconds / 60);
+			const totalMinutes = Math.round(totalSeconds / 60);
+			console.warn(`Only room for ${minutes} of ${totalMinutes} minutes offline`);
+			if (!isPlaying) {
+				updateCurrentSongDisplay(`Only room to save ${minutes} of ${totalMinutes} minutes offline`);
+			}
+		}
+	} catch (error) {
+		console.error('Failed to check storage budget:', error);
+	}
+}
 
-				// Move to next song
-				currentPreloadIndex++;
-				setTimeout(() => preloadNextSong(), 100);
-			});
-		})
-		.catch(error => {
-			console.error(`Failed to preload ${filename}:`, error);
-			currentPreloadIndex++;
-			preloadNextSong();
-		});
+// Absolute URL of a track, as used for Cache Storage keys
+function trackUrl(filename) {
+	return new URL(`tracks/${filename}`, window.location.href).href;
 }
 
-// Check which tracks are already cached on app load
-async function checkCachedTracks() {
+// Check which tracks are already cached (on app load, and for each new page)
+async function checkCachedTracks(songsToCheck = songs) {
 	try {
 		const cache = await caches.open(CACHE_NAME);
 		const cachedRequests = await cache.keys();
+		const cachedUrls = new Set(cachedRequests.map(request => request.url));
 
 		// Check each song to see if it's cached
-		for (const song of songs) {
-			// Build the same absolute URL that storeBlobInCache uses for consistency
-			const absoluteUrl = new URL(`tracks/${song.filename}`, window.location.href).href;
-			const isInCache = cachedRequests.some(request => request.url === absoluteUrl);
-			if (isInCache) {
+		for (const song of songsToCheck) {
+			if (cachedUrls.has(trackUrl(song.filename))) {
 				cachedTracks.add(song.filename);
 			}
 		}
 
 		console.log(`Found ${cachedTracks.size}/${songs.length} tracks already cached`);
-		console.log('Cached tracks:', Array.from(cachedTracks));
 	} catch (error) {
 		console.error('Failed to check cached tracks:', error);
 	}
 }
 
-// Debug function to check preloaded state
+// Debug function to check playback and cache state
 window.debugAudioState = function() {
 	console.log('=== Audio State Debug ===');
 	console.log('Player ready:', playerReady);
@@ -951,72 +1195,16 @@ window.debugAudioState = function() {
 	console.log('Current song index:', currentSongIndex);
 	console.log('Total songs:', songs.length);
 	console.log('Cached tracks count:', cachedTracks.size);
-	console.log('Preloaded audio count:', Object.keys(preloadedAudio).length);
 	console.log('Current audio src:', audio.src);
 	console.log('Audio paused:', audio.paused);
 	console.log('Audio error:', audio.error);
 	if (songs[currentSongIndex]) {
 		console.log('Current song:', songs[currentSongIndex].filename);
-		console.log('Is preloaded:', !!preloadedAudio[songs[currentSongIndex].filename]);
 		console.log('Is cached:', cachedTracks.has(songs[currentSongIndex].filename));
 	}
 	console.log('======================');
 };
 
-// Load a track from cache into memory
-async function loadFromCache(filename) {
-	try {
-		const cache = await caches.open(CACHE_NAME);
-		// Try both relative and absolute URLs
-		let response = await cache.match(`tracks/${filename}`);
-		if (!response) {
-			// Try with absolute URL
-			const absoluteUrl = new URL(`tracks/${filename}`, window.location.href).href;
-			response = await cache.match(absoluteUrl);
-		}
-
-		if (!response) {
-			throw new Error('Not in cache');
-		}
-
-		const blob = await response.blob();
-
-		// Add blob size to total
-		totalBytesLoaded += blob.size;
-
-		// Create a blob URL that will persist in memory
-		const blobUrl = URL.createObjectURL(blob);
-
-		preloadedAudio[filename] = {
-			blobUrl: blobUrl,
-			blob: blob
-		};
-		console.log(`✓ Loaded from cache: ${filename}`);
-	} catch (error) {
-		console.error(`Failed to load from cache: ${filename}`, error);
-		throw error;
-	}
-}
-
-// Store blob in Cache API for offline access
-async function storeBlobInCache(filename, blob) {
-	try {
-		const cache = await caches.open(CACHE_NAME);
-		const response = new Response(blob, {
-			headers: {
-				'Content-Type': 'audio/mpeg',
-				'Content-Length': blob.size
-			}
-		});
-		// Use absolute URL for consistency
-		const absoluteUrl = new URL(`tracks/${filename}`, window.location.href).href;
-		await cache.put(absoluteUrl, response);
-		console.log(`✓ Cached for offline: ${filename}`);
-	} catch (error) {
-		console.error(`Failed to cache ${filename}:`, error);
-	}
-}
-
 // Update UI to show track is cached
 function updateTrackCachedStatus(filename) {
 	const songIndex = songs.findIndex(s => s.filename === filename);
@@ -1032,98 +1220,11 @@ function updateTrackCachedStatus(filename) {
 	}
 }
 
-// Priority preloading system
+// Priority preloading: ask the service worker to fetch this track next
 function requestPriorityPreload(filename) {
-	// Skip if already preloaded or already in priority queue
-	if (preloadedAudio[filename] || priorityPreloadQueue.includes(filename)) {
-		return;
-	}
-
-	console.log(`🔥 Priority preload requested: ${filename}`);
-	priorityPreloadQueue.push(filename);
-
-	// Start priority preloading if not already running
-	if (!isPreloadingPriority) {
-		processPriorityPreload();
-	}
-}
-
-function processPriorityPreload() {
-	if (priorityPreloadQueue.length === 0) {
-		isPreloadingPriority = false;
-		return;
-	}
-
-	isPreloadingPriority = true;
-	const filename = priorityPreloadQueue.shift();
-
-	// Check if already preloaded (might have finished during normal preloading)
-	if (preloadedAudio[filename]) {
-		processPriorityPreload();
-		return;
-	}
-
-	// Find the song info
-	const song = songs.find(s => s.filename === filename);
-	if (!song) {
-		processPriorityPreload();
-		return;
-	}
-
-	// If already cached, load from cache
 	if (cachedTracks.has(filename)) {
-		console.log(`🔥 Priority loading from cache: ${song.artist} – ${song.title}`);
-		loadFromCache(filename).then(() => {
-			processPriorityPreload();
-		}).catch(err => {
-			console.error(`Failed to load from cache, fetching instead:`, err);
-			priorityFetchAndPreloadSong(song, filename);
-		});
 		return;
 	}
-
-	console.log(`🔥 Priority preloading: ${song.artist} – ${song.title}`);
-	priorityFetchAndPreloadSong(song, filename);
-}
-
-function priorityFetchAndPreloadSong(song, filename) {
-	// Use fetch to force full download of the entire file
-	fetch(`tracks/${filename}`)
-		.then(response => {
-			if (!response.ok) {
-				throw new Error(`HTTP error! status: ${response.status}`);
-			}
-			return response.blob();
-		})
-		.then(blob => {
-			// Create a blob URL that will persist in memory
-			const blobUrl = URL.createObjectURL(blob);
-
-			preloadedAudio[filename] = {
-				blobUrl: blobUrl,
-				blob: blob
-			};
-
-			// Next time this song plays, it will use the cached version
-			console.log(`✓ Priority preloaded: ${song.artist} – ${song.title}`);
-
-			// Store in Cache API for offline access
-			return storeBlobInCache(filename, blob).then(() => {
-				// Mark as cached and update UI
-				cachedTracks.add(filename);
-				updateTrackCachedStatus(filename);
-
-				// Process next priority request
-				processPriorityPreload();
-			});
-		})
-		.catch(error => {
-			// Ignore abort errors (happens when normal preload finishes first)
-			if (error.name === 'AbortError' || error.message.includes('aborted')) {
-				// This is expected - normal preloading probably finished first
-			} else {
-				console.error(`Failed to priority preload ${filename}:`, error);
-			}
-			processPriorityPreload();
-		});
+	console.log(`🔥 Priority preload requested: ${filename}`);
+	postToServiceWorker({ type: 'prioritize', url: `tracks/${filename}` });
 }
@@ -5,16 +5,68 @@ Uses system tools: ffmpeg/ffprobe (no Python dependencies needed)
 """
 
 import os
+import queue
+import re
 import sys
 import subprocess
 import shutil
+import threading
 import time
 from pathlib import Path
 import platform
 
+import profiling
+from options import get_option
+
 SCRIPT_DIR = Path(__file__).parent.absolute()
 TRACKS_DIR = SCRIPT_DIR / "tracks"
 
+# Pipelined ripping (--pipelined): tracks are copied off the disc into a
+# local staging folder while encoders work through the ones already copied
+STAGING_DIR = SCRIPT_DIR / ".cache" / "rip-staging"
+DEFAULT_ENCODERS = max(1, min(4, os.cpu_count() or 1))
+STAGED_TRACKS_AHEAD = 2  # Tracks staged beyond the ones being encoded
+
+# Formats ffmpeg can turn into MP3 (shared with scan.py's ingestion)
+AUDIO_EXTENSIONS = ['.wav', '.aiff', '.aif', '.flac', '.m4a', '.mp3']
+
+# Encoding profiles (--encoding=NAME). -qscale:a is LAME's VBR quality (lower
+# is better and bigger), -compression_level its algorithm effort (lower is
+# slower and better). kbps is a typical average, used until a trial encode
+# measures the real thing.
+ENCODING_PROFILES = {
+	"transparent": {
+		"args": ['-codec:a', 'libmp3lame', '-qscale:a', '2'],
+		"kbps": 190,
+		"description": "VBR ~190 kbps, sounds the same as the CD to most listeners",
+	},
+	"speed": {
+		"args": ['-codec:a', 'libmp3lame', '-qscale:a', '4', '-compression_level', '7'],
+		"kbps": 165,
+		"description": "VBR ~165 kbps with LAME's fast algorithm, for the quickest rip",
+	},
+	"size": {
+		"args": ['-codec:a', 'libmp3lame', '-qscale:a', '6', '-compression_level', '2'],
+		"kbps": 115,
+		"description": "VBR ~115 kbps, for the smallest download",
+	},
+}
+DEFAULT_ENCODING = "transparent"
+
+# --encoding=auto takes the first of these that fits the budget (best quality first)
+AUTO_ENCODING_ORDER = ["transparent", "speed", "size"]
+DEFAULT_TARGET_KBPS = 160
+TRIAL_SECONDS = 10  # Sample taken from the middle of each track
+TRIAL_DIR = SCRIPT_DIR / ".cache" / "rip-trial"
+
+# Uncompressed CD audio (44.1 kHz, 16-bit stereo): a fixed profile's rip is
+# sized from file sizes alone, without probing or reading the disc
+CD_BYTES_PER_SECOND = 44100 * 2 * 2
+PCM_EXTENSIONS = {'.wav', '.aiff', '.aif'}
+
+# Default encoder settings, also used by scan.py
+MP3_ENCODER_ARGS = ENCODING_PROFILES[DEFAULT_ENCODING]["args"]
+
 
 def check_ffmpeg():
 	"""Check if ffmpeg is installed, offer to install if not"""
@@ -129,7 +181,6 @@ def find_cd_mount():
 
 def natural_sort_key(path):
 	"""Generate a key for natural sorting of filenames with numbers"""
-	import re
 	# Split filename into text and number parts
 	parts = []
 	for part in re.split(r'(\d+)', str(path.name)):
@@ -142,10 +193,9 @@ def natural_sort_key(path):
 
 def get_audio_files(mount_point):
 	"""Get all audio files from the CD mount point"""
-	audio_extensions = ['*.wav', '*.aiff', '*.aif', '*.flac', '*.mp3']
 	audio_files = []
 
-	for ext in audio_extensions:
+	for ext in (f"*{extension}" for extension in AUDIO_EXTENSIONS):
 		audio_files.extend(mount_point.glob(ext))
 		# Also check subdirectories (some CDs have nested structures)
 		audio_files.extend(mount_point.glob(f"*/{ext}"))
@@ -182,21 +232,44 @@ def print_progress_bar(progress, eta_str="", width=40):
 	print(output, end='', flush=True)
 
 
+def build_mp3_command(input_file, output_file, metadata, progress=False, encoder_args=MP3_ENCODER_ARGS):
+	"""Build the ffmpeg command that encodes an audio file to a tagged MP3
+
+	metadata maps ID3 field names (track, title, artist...) to values;
+	tags already in the source file are carried over by ffmpeg as well.
+	encoder_args picks the encoder settings (see ENCODING_PROFILES).
+	"""
+	cmd = ['ffmpeg', '-i', str(input_file), *encoder_args]
+	for key, value in metadata.items():
+		cmd += ['-metadata', f'{key}={value}']
+	if progress:
+		cmd += ['-progress', 'pipe:1']
+	cmd += ['-y', str(output_file)]
+	return cmd
+
+
+def encode_mp3(input_file, output_file, metadata, encoder_args=MP3_ENCODER_ARGS):
+	"""Encode an audio file to MP3 without progress output, returning True on success"""
+	try:
+		subprocess.run(build_mp3_command(input_file, output_file, metadata, encoder_args=encoder_args),
+		               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+		               stderr=subprocess.DEVNULL, check=True)
+		return True
+	except (subprocess.CalledProcessError, OSError):
+		return False
+
+
 def convert_to_mp3(input_file, output_file, track_num, title, artist,
-                   total_size, processed_size, start_time):
+                   total_size, processed_size, start_time, encoder_args=MP3_ENCODER_ARGS):
 	"""Convert an audio file to MP3 using ffmpeg with progress bar and ETA"""
 	try:
 		duration = get_audio_duration(input_file)
 
-		cmd = [
-			'ffmpeg', '-i', str(input_file),
-			'-codec:a', 'libmp3lame', '-qscale:a', '2',
-			'-metadata', f'track={track_num}',
-			'-metadata', f'title={title}',
-			'-metadata', f'artist={artist}',
-			'-progress', 'pipe:1', '-y',
-			str(output_file)
-		]
+		cmd = build_mp3_command(input_file, output_file, {
+			'track': track_num,
+			'title': title,
+			'artist': artist,
+		}, progress=True, encoder_args=encoder_args)
 
 		process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
 		                          stderr=subprocess.DEVNULL, universal_newlines=True)
@@ -256,8 +329,341 @@ def sanitize_filename(filename):
 	return name
 
 
-def rip_cd():
-	"""Main function to rip CD to MP3 files"""
+def output_path(idx, audio_file, padding_width):
+	"""Pick the /tracks file for a ripped track, e.g. '03 Song Title.mp3'
+
+	Returns (output_file, cleaned_name).
+	"""
+	base_name = sanitize_filename(audio_file.name)
+
+	# Remove leading track number to avoid duplicates like "01 1 Track"
+	cleaned_name = re.sub(r'^\d+\s*[-.]?\s*', '', base_name) or base_name
+
+	padded_idx = str(idx).zfill(padding_width)
+	output_file = TRACKS_DIR / f"{padded_idx} {cleaned_name}.mp3"
+
+	# Handle duplicate filenames
+	counter = 1
+	while output_file.exists():
+		output_file = TRACKS_DIR / f"{padded_idx} {cleaned_name}_{counter}.mp3"
+		counter += 1
+
+	return output_file, cleaned_name
+
+
+def format_duration(seconds):
+	"""Format seconds as '3m 07s'"""
+	return f"{int(seconds / 60)}m {int(seconds % 60):02d}s"
+
+
+def rip_sequential(audio_files, artist, encoder_args=MP3_ENCODER_ARGS):
+	"""Copy or encode each track straight off the disc, one at a time
+
+	Returns the number of tracks ripped.
+	"""
+	success_count = 0
+	start_time = time.time()
+	total_size = sum(f.stat().st_size for f in audio_files)
+	processed_size = 0
+	padding_width = len(str(len(audio_files)))
+
+	for idx, audio_file in enumerate(audio_files, start=1):
+		output_file, cleaned_name = output_path(idx, audio_file, padding_width)
+
+		print(f"[{idx}/{len(audio_files)}] {audio_file.name} -> {output_file.name}")
+
+		if audio_file.suffix.lower() == '.mp3':
+			try:
+				with profiling.stage(f"copy track {idx}"):
+					shutil.copy2(audio_file, output_file)
+				success_count += 1
+				print(f"[████████████████████████████████████████] 100%")
+				print(f"✓ Copied")
+			except Exception as e:
+				print(f"✗ Error: {e}")
+		else:
+			with profiling.stage(f"encode track {idx}"):
+				converted = convert_to_mp3(audio_file, output_file, idx, cleaned_name, artist,
+				                           total_size, processed_size, start_time, encoder_args)
+			if converted:
+				success_count += 1
+				print(f"✓ Converted to MP3")
+			else:
+				print(f"✗ Conversion failed")
+
+		processed_size += audio_file.stat().st_size
+
+	return success_count
+
+
+def rip_pipelined(audio_files, artist, encoders=DEFAULT_ENCODERS, encoder_args=MP3_ENCODER_ARGS):
+	"""Read the disc and encode at the same time
+
+	One reader thread copies tracks off the disc in order, as fast as the
+	drive allows, into STAGING_DIR; encoder threads turn the staged copies
+	into MP3s. The drive streams sequentially instead of seeking back and
+	forth for ffmpeg, and at most encoders + STAGED_TRACKS_AHEAD tracks sit
+	in the staging folder at once. Returns the number of tracks ripped.
+	"""
+	padding_width = len(str(len(audio_files)))
+	jobs = []
+	for idx, audio_file in enumerate(audio_files, start=1):
+		output_file, cleaned_name = output_path(idx, audio_file, padding_width)
+		jobs.append((idx, audio_file, output_file, cleaned_name))
+
+	shutil.rmtree(STAGING_DIR, ignore_errors=True)
+	STAGING_DIR.mkdir(parents=True, exist_ok=True)
+
+	staged = queue.Queue()
+	# Taken before a track is copied and given back once its staged copy is
+	# gone, so the limit covers the copy in progress too
+	staging_slots = threading.Semaphore(encoders + STAGED_TRACKS_AHEAD)
+	print_lock = threading.Lock()
+	timings = {"read": 0.0, "encode": 0.0, "read_bytes": 0}
+	success_count = 0
+
+	def report(message):
+		with print_lock:
+			print(message, flush=True)
+
+	def read_disc():
+		for job in jobs:
+			idx, audio_file = job[0], job[1]
+			staged_file = STAGING_DIR / f"{idx:03d}{audio_file.suffix.lower()}"
+			staging_slots.acquire()
+			started = time.perf_counter()
+			try:
+				shutil.copyfile(audio_file, staged_file)
+			except OSError as e:
+				report(f"✗ [{idx}/{len(jobs)}] Could not read {audio_file.name}: {e}")
+				staged_file.unlink(missing_ok=True)
+				staged_file = None
+				staging_slots.release()
+			elapsed = time.perf_counter() - started
+			timings["read"] += elapsed
+			if staged_file:
+				timings["read_bytes"] += staged_file.stat().st_size
+			staged.put((job, staged_file, elapsed))
+		for _ in range(encoders):
+			staged.put(None)
+
+	def encode_staged():
+		nonlocal success_count
+		while True:
+			item = staged.get()
+			if item is None:
+				return
+			(idx, audio_file, output_file, cleaned_name), staged_file, read_time = item
+			if staged_file is None:
+				continue
+
+			started = time.perf_counter()
+			if audio_file.suffix.lower() == '.mp3':
+				try:
+					shutil.move(staged_file, output_file)
+					ok = True
+				except OSError:
+					ok = False
+			else:
+				ok = encode_mp3(staged_file, output_file, {
+					'track': idx,
+					'title': cleaned_name,
+					'artist': artist,
+				}, encoder_args)
+				staged_file.unlink(missing_ok=True)
+			staging_slots.release()
+			elapsed = time.perf_counter() - started
+
+			with print_lock:
+				timings["encode"] += elapsed
+				if ok:
+					success_count += 1
+					print(f"✓ [{idx}/{len(jobs)}] {output_file.name} · read {read_time:.1f}s · encode {elapsed:.1f}s", flush=True)
+				else:
+					print(f"✗ [{idx}/{len(jobs)}] {audio_file.name}: conversion failed", flush=True)
+
+	print(f"Reading the disc while {encoders} encoder(s) convert staged tracks...")
+	threads = [threading.Thread(target=read_disc, daemon=True)]
+	threads += [threading.Thread(target=encode_staged, daemon=True) for _ in range(encoders)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	shutil.rmtree(STAGING_DIR, ignore_errors=True)
+
+	read_rate = timings["read_bytes"] / timings["read"] / 1024 / 1024 if timings["read"] else 0
+	print(f"  Disc read: {format_duration(timings['read'])} ({read_rate:.1f} MB/s)")
+	print(f"  Encoding:  {format_duration(timings['encode'])} across {encoders} encoder(s)")
+	profiling.record("disc read", timings["read"])
+	profiling.record("encode", timings["encode"])
+
+	return success_count
+
+
+def trial_encode(audio_files, durations, profiles):
+	"""Measure each encoding profile on a short sample of every track
+
+	A TRIAL_SECONDS clip from the middle of each track is read off the disc
+	once, then encoded with every profile. Returns {profile: {"kbps", "speed"}}
+	where speed is seconds of audio encoded per second; profiles that failed
+	to encode are left out.
+	"""
+	shutil.rmtree(TRIAL_DIR, ignore_errors=True)
+	TRIAL_DIR.mkdir(parents=True, exist_ok=True)
+
+	samples = []
+	for index, (audio_file, duration) in enumerate(zip(audio_files, durations)):
+		if not duration or audio_file.suffix.lower() == '.mp3':
+			continue
+		length = min(TRIAL_SECONDS, duration)
+		sample = TRIAL_DIR / f"{index}.wav"
+		result = subprocess.run(
+			['ffmpeg', '-v', 'error', '-ss', f"{max(0, duration / 2 - length / 2):.2f}", '-t', f"{length:.2f}",
+			 '-i', str(audio_file), '-vn', '-codec:a', 'pcm_s16le', '-y', str(sample)],
+			stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+		)
+		if result.returncode == 0 and sample.exists():
+			samples.append((sample, length))
+
+	results = {}
+	for name in profiles:
+		total_bytes = 0
+		total_seconds = 0.0
+		total_time = 0.0
+		for sample, length in samples:
+			output = sample.with_name(f"{sample.stem}-{name}.mp3")
+			started = time.perf_counter()
+			if not encode_mp3(sample, output, {}, ENCODING_PROFILES[name]["args"]):
+				continue
+			total_time += time.perf_counter() - started
+			total_bytes += output.stat().st_size
+			total_seconds += length
+			output.unlink(missing_ok=True)
+		if total_seconds and total_time:
+			results[name] = {
+				"kbps": total_bytes * 8 / total_seconds / 1000,
+				"speed": total_seconds / total_time,
+			}
+
+	shutil.rmtree(TRIAL_DIR, ignore_errors=True)
+	return results
+
+
+def project_rip(audio_files, durations, profile, trial, encoders=1):
+	"""Projected output size (bytes) and encode time (seconds, or None) for a profile
+
+	MP3s on the disc are copied as they are; everything else is estimated from
+	the trial encode, or from the profile's typical bitrate without one.
+	"""
+	measured = trial.get(profile)
+	kbps = measured["kbps"] if measured else ENCODING_PROFILES[profile]["kbps"]
+
+	size = 0
+	encode_seconds = 0.0
+	for audio_file, duration in zip(audio_files, durations):
+		if audio_file.suffix.lower() == '.mp3':
+			size += audio_file.stat().st_size
+		else:
+			size += (duration or 0) * kbps * 1000 / 8
+			encode_seconds += duration or 0
+
+	encode_time = encode_seconds / measured["speed"] / encoders if measured else None
+	return {"kbps": kbps, "bytes": int(size), "seconds": encode_time}
+
+
+def pcm_duration(audio_file):
+	"""Playing time of an uncompressed CD track from its size, or None for other formats"""
+	if audio_file.suffix.lower() not in PCM_EXTENSIONS:
+		return None
+	return audio_file.stat().st_size / CD_BYTES_PER_SECOND
+
+
+def choose_encoding(audio_files, encoding, encoders, target_kbps=None, max_size_mb=None):
+	"""Pick the encoding profile and report the rip's projected size
+
+	encoding is a profile name or "auto", which trial-encodes a sample of
+	every track and takes the best-quality profile whose measured bitrate is
+	within target_kbps and whose projected capsule (the MP3s already in
+	/tracks plus this disc) is within max_size_mb. A named profile is
+	projected from its typical bitrate instead, so nothing is read off the
+	disc before ripping starts. Returns the chosen profile's name.
+	"""
+	existing_bytes = sum(path.stat().st_size for path in TRACKS_DIR.glob("*.mp3"))
+	profiles = AUTO_ENCODING_ORDER if encoding == "auto" else [encoding]
+
+	if encoding == "auto":
+		with profiling.stage("duration probe"):
+			durations = [get_audio_duration(audio_file) for audio_file in audio_files]
+		print(f"\nTrial encoding {TRIAL_SECONDS}s from each track...")
+		with profiling.stage("trial encode"):
+			trial = trial_encode(audio_files, durations, profiles)
+	else:
+		durations = [pcm_duration(audio_file) for audio_file in audio_files]
+		trial = {}
+		unsized = sum(
+			1 for audio_file, duration in zip(audio_files, durations)
+			if duration is None and audio_file.suffix.lower() != '.mp3'
+		)
+		print()
+		if unsized:
+			print(f"Note: {unsized} compressed track(s) are left out of the projection")
+	projections = {
+		name: project_rip(audio_files, durations, name, trial, encoders)
+		for name in profiles
+	}
+
+	for name in profiles:
+		projection = projections[name]
+		eta = f"  ~{format_duration(projection['seconds'])}" if projection["seconds"] is not None else ""
+		source = "measured" if name in trial else "typical"
+		print(f"  {name.ljust(12)} {projection['kbps']:4.0f} kbps ({source})  "
+		      f"{projection['bytes'] / 1024 / 1024:7.1f} MB{eta}")
+
+	chosen = encoding
+	if encoding == "auto":
+		if target_kbps is None and max_size_mb is None:
+			target_kbps = DEFAULT_TARGET_KBPS
+		budget = []
+		if target_kbps is not None:
+			budget.append(f"{target_kbps} kbps")
+		if max_size_mb is not None:
+			budget.append(f"{max_size_mb:g} MB in total")
+
+		def fits(name):
+			projection = projections[name]
+			if target_kbps is not None and projection["kbps"] > target_kbps:
+				return False
+			if max_size_mb is not None and existing_bytes + projection["bytes"] > max_size_mb * 1024 * 1024:
+				return False
+			return True
+
+		chosen = next((name for name in AUTO_ENCODING_ORDER if fits(name)), None)
+		if chosen:
+			print(f"✓ Using '{chosen}': the best quality within {' and '.join(budget)}")
+		else:
+			chosen = min(AUTO_ENCODING_ORDER, key=lambda name: projections[name]["bytes"])
+			print(f"Warning: no profile fits {' and '.join(budget)}; using '{chosen}', the smallest")
+
+	projection = projections[chosen]
+	summary = (f"Projected: {projection['bytes'] / 1024 / 1024:.1f} MB from this disc, "
+	           f"{(existing_bytes + projection['bytes']) / 1024 / 1024:.1f} MB capsule in total")
+	if projection["seconds"] is not None:
+		summary += f"; about {format_duration(projection['seconds'])} of encoding"
+	print(summary)
+	return chosen
+
+
+def rip_cd(pipelined=False, encoders=DEFAULT_ENCODERS, encoding=DEFAULT_ENCODING,
+           target_kbps=None, max_size_mb=None):
+	"""Main function to rip CD to MP3 files
+
+	Args:
+		pipelined: Stage tracks off the disc while encoding (see rip_pipelined)
+		encoders: How many tracks to encode at once in pipelined mode
+		encoding: A name from ENCODING_PROFILES, or "auto" to pick one that
+		          fits target_kbps / max_size_mb (see choose_encoding)
+	"""
 	print("=" * 60)
 	print("💿 vibe capsule - CD Ripper")
 	print("=" * 60)
@@ -276,7 +682,8 @@ def rip_cd():
 
 	# Find CD mount point
 	print("\nSearching for audio CD...")
-	mount_point = find_cd_mount()
+	with profiling.stage("disc discovery"):
+		mount_point = find_cd_mount()
 
 	if not mount_point:
 		print("✗ No audio CD found.")
@@ -289,7 +696,8 @@ def rip_cd():
 	print(f"✓ Found CD at: {mount_point}")
 
 	# Get audio files from CD
-	audio_files = get_audio_files(mount_point)
+	with profiling.stage("file discovery"):
+		audio_files = get_audio_files(mount_point)
 
 	if not audio_files:
 		print("✗ No audio files found on the CD.")
@@ -307,58 +715,25 @@ def rip_cd():
 	if not artist:
 		artist = "Unknown Artist"
 
-	print("\nRipping CD...")
+	# Project the rip's size (and time, when auto trial-encodes) before committing to it
+	encoding = choose_encoding(audio_files, encoding, encoders if pipelined else 1,
+	                           target_kbps, max_size_mb)
+	encoder_args = ENCODING_PROFILES[encoding]["args"]
+
+	print(f"\nRipping CD ({encoding}: {ENCODING_PROFILES[encoding]['description']})...")
 	print("-" * 60)
 
-	success_count = 0
 	start_time = time.time()
-	total_size = sum(f.stat().st_size for f in audio_files)
-	processed_size = 0
-	padding_width = len(str(len(audio_files)))
-
-	for idx, audio_file in enumerate(audio_files, start=1):
-		base_name = sanitize_filename(audio_file.name)
-		
-		# Remove leading track number to avoid duplicates like "01 1 Track"
-		import re
-		cleaned_name = re.sub(r'^\d+\s*[-.]?\s*', '', base_name) or base_name
-		
-		padded_idx = str(idx).zfill(padding_width)
-		output_file = TRACKS_DIR / f"{padded_idx} {cleaned_name}.mp3"
-
-		# Handle duplicate filenames
-		counter = 1
-		while output_file.exists():
-			output_file = TRACKS_DIR / f"{padded_idx} {cleaned_name}_{counter}.mp3"
-			counter += 1
-
-		print(f"[{idx}/{len(audio_files)}] {audio_file.name} -> {output_file.name}")
-
-		if audio_file.suffix.lower() == '.mp3':
-			try:
-				shutil.copy2(audio_file, output_file)
-				success_count += 1
-				print(f"[████████████████████████████████████████] 100%")
-				print(f"✓ Copied")
-			except Exception as e:
-				print(f"✗ Error: {e}")
-		else:
-			if convert_to_mp3(audio_file, output_file, idx, cleaned_name, artist,
-			                 total_size, processed_size, start_time):
-				success_count += 1
-				print(f"✓ Converted to MP3")
-			else:
-				print(f"✗ Conversion failed")
-
-		processed_size += audio_file.stat().st_size
+	if pipelined:
+		success_count = rip_pipelined(audio_files, artist, encoders, encoder_args)
+	else:
+		success_count = rip_sequential(audio_files, artist, encoder_args)
 
 	# Calculate total time
 	total_time = time.time() - start_time
-	total_minutes = int(total_time / 60)
-	total_secs = int(total_time % 60)
 
 	print("-" * 60)
-	print(f"\n✓ Successfully ripped {success_count}/{len(audio_files)} tracks in {total_minutes}m {total_secs}s.")
+	print(f"\n✓ Successfully ripped {success_count}/{len(audio_files)} tracks in {format_duration(total_time)}.")
 
 	if success_count > 0:
 		print(f"\nTracks saved to: {TRACKS_DIR}")
@@ -382,7 +757,26 @@ def rip_cd():
 
 def main():
 	"""Main entry point"""
-	rip_cd()
+	profiling.enable_from_argv()
+	try:
+		encoders = max(1, int(get_option("encoders", DEFAULT_ENCODERS)))
+		target_kbps = get_option("target-kbps")
+		target_kbps = int(target_kbps) if target_kbps is not None else None
+		max_size_mb = get_option("max-size")
+		max_size_mb = float(max_size_mb) if max_size_mb is not None else None
+	except ValueError:
+		print("✗ --encoders, --target-kbps and --max-size must be numbers")
+		sys.exit(1)
+
+	# A budget on its own means "pick a profile for me"
+	default_encoding = "auto" if target_kbps is not None or max_size_mb is not None else DEFAULT_ENCODING
+	encoding = get_option("encoding", default_encoding)
+	if encoding != "auto" and encoding not in ENCODING_PROFILES:
+		print(f"✗ --encoding must be auto or one of: {', '.join(ENCODING_PROFILES)}")
+		sys.exit(1)
+
+	rip_cd(pipelined="--pipelined" in sys.argv, encoders=encoders, encoding=encoding,
+	       target_kbps=target_kbps, max_size_mb=max_size_mb)
 
 
 if __name__ == "__main__":
@@ -8,12 +8,44 @@ import os
 import sys
 import subprocess
 import json
+import re
+import hashlib
+import math
+import shutil
+import tempfile
 from pathlib import Path
 
+import profiling
+from options import get_option
+
 SCRIPT_DIR = Path(__file__).parent.absolute()
 VENV_DIR = SCRIPT_DIR / "venv"
 TRACKS_DIR = SCRIPT_DIR / "tracks"
 OUTPUT_FILE = TRACKS_DIR / "tracks.json"
+TRACKS_INDEX_FILE = TRACKS_DIR / "tracks-index.json"
+TRACK_PAGES_DIR = TRACKS_DIR / "pages"
+DEFAULT_PAGE_SIZE = 500
+
+# Artwork: embedded cover art and album_art.jpg are resized into tracks/art
+ART_DIR = TRACKS_DIR / "art"
+ARTWORK_FILE = ART_DIR / "artwork.json"
+ALBUM_ART_FILE = TRACKS_DIR / "album_art.jpg"
+ICON_SOURCE_FILE = SCRIPT_DIR / "resources" / "icon.png"
+ARTWORK_SIZES = [512, 256, 96]  # Lock screen / media session artwork
+ICON_SIZES = [512, 192]  # Home screen icons
+ARTWORK_QUALITY = 82
+
+# Seek indexes: one time -> byte offset table per track, as sidecar JSON files
+SEEK_INDEX_DIR = TRACKS_DIR / "seek"
+SEEK_INDEX_RESOLUTION = 1.0  # Seconds between entries
+
+# Analysis results are cached by content hash, outside the deployed tracks/ folder
+CACHE_DIR = SCRIPT_DIR / ".cache"
+HASH_CACHE_FILE = CACHE_DIR / "hashes.json"
+ANALYSIS_CACHE_FILE = CACHE_DIR / "analysis.json"
+REPLAYGAIN_REFERENCE_LUFS = -18.0  # ReplayGain 2.0 reference level
+TRANSCODE_CACHE_DIR = CACHE_DIR / "transcodes"
+TRANSCODE_RECORD_FILE = CACHE_DIR / "transcodes.json"
 REQUIREMENTS_FILE = SCRIPT_DIR / "requirements.txt"
 
 
@@ -51,24 +83,722 @@ def setup_venv():
 
 def run_in_venv():
 	"""Re-run this script in the virtual environment"""
-	python_path = setup_venv()
+	with profiling.stage("venv bootstrap"):
+		python_path = setup_venv()
 
-	# Re-run this script with the venv Python
+	# Re-run this script with the venv Python, forwarding any options
 	print("Running scanner in virtual environment...\n")
-	subprocess.check_call([str(python_path), __file__, "--in-venv"])
+	subprocess.check_call([str(python_path), __file__, "--in-venv", *sys.argv[1:]],
+	                      env=profiling.child_env())
 	sys.exit(0)
 
 
+def read_source_tags(source_file):
+	"""Read title and artist from a FLAC/M4A/WAV/AIFF file, with scan.py's fallbacks"""
+	import mutagen
+
+	title = None
+	artist = None
+	try:
+		audio = mutagen.File(source_file, easy=True)
+		if audio is not None and audio.tags:
+			title = (audio.tags.get('title') or [None])[0]
+			artist = (audio.tags.get('artist') or [None])[0]
+	except Exception:
+		pass
+
+	return {
+		"title": title or source_file.stem,
+		"artist": artist or "Unknown Artist"
+	}
+
+
+def link_or_copy(source, destination):
+	"""Hard link source to destination (replacing it), copying if linking isn't possible"""
+	temp_file = destination.with_name(f".{destination.name}.tmp")
+	if temp_file.exists():
+		temp_file.unlink()
+	try:
+		os.link(source, temp_file)
+	except OSError:
+		shutil.copy2(source, temp_file)
+	os.replace(temp_file, destination)
+
+
+def ingest_sources(encoding=None):
+	"""Transcode FLAC/M4A/WAV/AIFF files in tracks/ to MP3 next to them
+
+	Encoding reuses rip.py's ffmpeg settings and tagging and runs in a worker
+	pool; encoding names one of rip.py's profiles (default: its default).
+	Encoded files are cached in .cache/transcodes by source hash and profile,
+	so a source is only ever encoded once per profile; later scans just re-link
+	the cached MP3. MP3s that were not created by this step are never overwritten.
+	"""
+	from concurrent.futures import ThreadPoolExecutor
+	from hashes import cached_file_digests
+	from rip import AUDIO_EXTENSIONS, DEFAULT_ENCODING, ENCODING_PROFILES, check_ffmpeg, encode_mp3
+
+	encoding = encoding or DEFAULT_ENCODING
+	encoder_args = ENCODING_PROFILES[encoding]["args"]
+
+	source_extensions = {extension for extension in AUDIO_EXTENSIONS if extension != '.mp3'}
+	sources = sorted(
+		path for path in TRACKS_DIR.iterdir()
+		if path.is_file() and path.suffix.lower() in source_extensions
+	)
+	if not sources:
+		return
+
+	print(f"Found {len(sources)} non-MP3 source file(s) to ingest.")
+	if not check_ffmpeg():
+		print("✗ ffmpeg not found. Install it (or run rip.py once) to convert these files.\n")
+		return
+
+	# Which MP3s in tracks/ came from which source hash
+	record = {}
+	if TRANSCODE_RECORD_FILE.exists():
+		try:
+			with open(TRANSCODE_RECORD_FILE, 'r', encoding='utf-8') as f:
+				record = json.load(f)
+		except (OSError, ValueError):
+			pass
+
+	digests = cached_file_digests(sources, HASH_CACHE_FILE)
+	TRANSCODE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+	jobs = []
+	claimed = {}  # target name -> the source converted to it
+	for source in sources:
+		digest = digests[source]
+		target = source.with_suffix('.mp3')
+		# song.flac and song.m4a would both become song.mp3: the first (by name) wins
+		if target.name in claimed:
+			print(f"  Skipping {source.name}: {claimed[target.name].name} becomes {target.name} instead")
+			continue
+		claimed[target.name] = source
+		if digest is None:
+			print(f"✗ Could not read {source.name}")
+			continue
+		# Default-profile keys are the plain hash, as before profiles existed
+		if encoding != DEFAULT_ENCODING:
+			digest = f"{digest}-{encoding}"
+		if target.exists() and target.name not in record:
+			print(f"  Skipping {source.name}: {target.name} already exists")
+			continue
+		if target.exists() and record.get(target.name) == digest:
+			continue
+		jobs.append((source, target, digest))
+
+	if not jobs:
+		print("✓ All source files already converted.\n")
+		return
+
+	# The same source under two names shares one encode
+	jobs_by_digest = {}
+	for source, target, digest in jobs:
+		jobs_by_digest.setdefault(digest, []).append((source, target))
+
+	def transcode(item):
+		digest, members = item
+		cached = TRANSCODE_CACHE_DIR / f"{digest}.mp3"
+		encoded = False
+		if not cached.exists():
+			source = members[0][0]
+			with tempfile.NamedTemporaryFile(dir=TRANSCODE_CACHE_DIR, prefix=f"{digest}.",
+			                                 suffix=".partial.mp3", delete=False) as f:
+				partial = Path(f.name)
+			try:
+				if encode_mp3(source, partial, read_source_tags(source), encoder_args):
+					os.replace(partial, cached)
+					encoded = True
+			except OSError:
+				pass
+			finally:
+				partial.unlink(missing_ok=True)
+			# Another scan may have cached it in the meantime
+			if not cached.exists():
+				return digest, members, False, False
+		for _, target in members:
+			link_or_copy(cached, target)
+		return digest, members, True, encoded
+
+	ingested_count = 0
+	encoded_count = 0
+	with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+		for digest, members, ok, encoded in pool.map(transcode, jobs_by_digest.items()):
+			for index, (source, target) in enumerate(members):
+				if not ok:
+					print(f"✗ Conversion failed: {source.name}")
+					continue
+				record[target.name] = digest
+				ingested_count += 1
+				encoded_count += encoded and index == 0
+				print(f"✓ {source.name} → {target.name}{'' if encoded and index == 0 else ' (cached)'}")
+
+	with open(TRANSCODE_RECORD_FILE, 'w', encoding='utf-8') as f:
+		json.dump(record, f, indent="\t")
+
+	print(f"✓ Ingested {ingested_count}/{len(jobs)} changed source file(s) ({encoded_count} encoded, "
+	      f"{ingested_count - encoded_count} from cache).\n")
+
+
+def find_duplicates(mp3_files):
+	"""Find exact and re-tagged duplicate MP3 files
+
+	Files are grouped by the size of their audio frames (ID3/APE tags stripped)
+	and only hashed when another file has the same size, so a library without
+	duplicates costs a few small reads per file. Files whose frames can't be
+	located fall back to whole-file hashing.
+
+	Returns a list of (kind, files) tuples, files sorted by name with the one
+	to keep first, and kind either "exact" (byte-identical copies) or
+	"retagged" (same audio, different tags). When a track has both, each set
+	of identical copies is reported as "exact" and its first file stands in
+	for the set in the "retagged" group, so every extra file is listed once.
+	"""
+	from concurrent.futures import ThreadPoolExecutor
+	from hashes import digest_files, DEFAULT_WORKERS
+	from mpeg import audio_data_range
+
+	files = sorted(mp3_files)
+
+	def locate(mp3_file):
+		try:
+			return mp3_file, audio_data_range(mp3_file), mp3_file.stat().st_size
+		except OSError:
+			return mp3_file, None, None
+
+	with ThreadPoolExecutor(max_workers=DEFAULT_WORKERS) as pool:
+		located = list(pool.map(locate, files))
+
+	# Candidates share an audio payload size (or a file size without one)
+	candidates = {}
+	for mp3_file, audio_range, file_size in located:
+		if audio_range:
+			key = ("audio", audio_range[1] - audio_range[0])
+			job = (mp3_file, audio_range[0], audio_range[1])
+		elif file_size is not None:
+			key = ("file", file_size)
+			job = (mp3_file, 0, None)
+		else:
+			continue
+		candidates.setdefault(key, []).append(job)
+
+	jobs = {
+		(key[0], job[0]): job
+		for key, group in candidates.items() if len(group) > 1
+		for job in group
+	}
+	digests = digest_files(jobs)
+
+	groups = {}
+	for (kind, mp3_file), digest in digests.items():
+		if digest:
+			groups.setdefault((kind, digest), []).append(mp3_file)
+
+	sizes = {mp3_file: file_size for mp3_file, _, file_size in located}
+	duplicates = []
+	for group in groups.values():
+		if len(group) < 2:
+			continue
+
+		# Same audio: split into byte-identical copies with a whole-file hash,
+		# only needed where two files in the group have the same size
+		size_counts = {}
+		for mp3_file in group:
+			size_counts[sizes[mp3_file]] = size_counts.get(sizes[mp3_file], 0) + 1
+		full = digest_files({
+			mp3_file: (mp3_file, 0, None)
+			for mp3_file in group if size_counts[sizes[mp3_file]] > 1
+		})
+		copies = {}
+		for mp3_file in sorted(group):
+			copies.setdefault(full.get(mp3_file) or mp3_file, []).append(mp3_file)
+
+		for copy_group in copies.values():
+			if len(copy_group) > 1:
+				duplicates.append(("exact", copy_group))
+		# One file per set of identical copies stands in for the different tags
+		if len(copies) > 1:
+			duplicates.append(("retagged", sorted(copy_group[0] for copy_group in copies.values())))
+
+	return sorted(duplicates, key=lambda duplicate: (duplicate[1][0], duplicate[0]))
+
+
+def report_duplicates(duplicates, drop):
+	"""Print duplicate groups and return the set of files to leave out"""
+	dropped = set()
+
+	print(f"Found {len(duplicates)} set(s) of duplicate tracks:")
+	for kind, group in duplicates:
+		label = "identical files" if kind == "exact" else "same audio, different tags"
+		print(f"  {label}:")
+		print(f"    keep  {group[0].name}")
+		for duplicate in group[1:]:
+			print(f"    {'drop' if drop else 'dup '}  {duplicate.name}")
+			dropped.add(duplicate)
+
+	if drop:
+		print(f"Leaving {len(dropped)} duplicate(s) out of {OUTPUT_FILE.name}.\n")
+		return dropped
+
+	print("Run with --dedupe to leave duplicates out of tracks.json.\n")
+	return set()
+
+
+def read_track_metadata(mp3_file):
+	"""Read title and artist from an MP3 file's ID3 tags, plus its duration
+
+	Returns a tracks.json entry, falling back to the filename for the title
+	and "Unknown Artist" for the artist.
+	"""
+	from mutagen.mp3 import MP3
+
+	audio = MP3(mp3_file)
+
+	# Try to get ID3 tags
+	title = None
+	artist = None
+
+	if audio.tags:
+		# Try different title tags
+		if 'TIT2' in audio.tags:  # Title
+			title = str(audio.tags['TIT2'])
+
+		# Try different artist tags
+		if 'TPE1' in audio.tags:  # Artist
+			artist = str(audio.tags['TPE1'])
+
+	# Fallback to filename for title if not found
+	if not title:
+		title = mp3_file.stem  # filename without extension
+
+	# Fallback to "Unknown Artist" if not found
+	if not artist:
+		artist = "Unknown Artist"
+
+	return {
+		"title": title,
+		"artist": artist,
+		"filename": mp3_file.name,
+		"duration": round(audio.info.length, 2)
+	}
+
+
+def extract_metadata(mp3_files):
+	"""Read metadata for each MP3 file, skipping files that can't be parsed"""
+	tracks = []
+
+	for mp3_file in sorted(mp3_files):
+		try:
+			track_info = read_track_metadata(mp3_file)
+			tracks.append(track_info)
+			print(f"✓ {track_info['artist']} - {track_info['title']}")
+
+		except Exception as e:
+			print(f"✗ Error reading {mp3_file.name}: {e}")
+			continue
+
+	return tracks
+
+
+TRACK_NUMBER_PATTERN = r'^\d+\s*[-.]?\s*'
+
+
+def titles_have_track_numbers(titles):
+	"""True if every title starts with a track number (and there is at least one)"""
+	titles = list(titles)
+	return bool(titles) and all(re.match(TRACK_NUMBER_PATTERN, title) for title in titles)
+
+
+def strip_track_number(title):
+	"""Remove a leading track number, keeping the title if nothing would remain"""
+	return re.sub(TRACK_NUMBER_PATTERN, '', title) or title
+
+
+def strip_track_numbers(tracks):
+	"""Strip leading track numbers from titles if ALL titles start with one"""
+	if titles_have_track_numbers(track['title'] for track in tracks):
+		print("\nDetected track numbers in all titles. Stripping them...")
+		for track in tracks:
+			original_title = track['title']
+			track['title'] = strip_track_number(original_title)
+			if track['title'] != original_title:
+				print(f"  {original_title} → {track['title']}")
+
+
+def read_embedded_art(mp3_file):
+	"""Return the front cover (or first) APIC image embedded in an MP3, or None"""
+	from mutagen.id3 import ID3, ID3NoHeaderError
+
+	try:
+		tags = ID3(mp3_file)
+	except ID3NoHeaderError:
+		return None
+
+	pictures = tags.getall("APIC")
+	if not pictures:
+		return None
+
+	front_cover = next((picture for picture in pictures if picture.type == 3), pictures[0])
+	return front_cover.data
+
+
+def write_image_variants(data, name, sizes, image_format):
+	"""Write downscaled, recompressed copies of an image into tracks/art
+
+	Images are never upscaled; if the source is smaller than every size, a
+	single recompressed copy at its own size is written.
+	Returns a list of {"src", "sizes", "type"} descriptors, largest first.
+	"""
+	from io import BytesIO
+	from PIL import Image
+
+	image = Image.open(BytesIO(data))
+	image.load()
+
+	if image_format == "PNG":
+		extension, mime_type = "png", "image/png"
+		image = image.convert("RGBA")
+	else:
+		extension, mime_type = "jpg", "image/jpeg"
+		image = image.convert("RGB")
+
+	width, height = image.size
+	largest = max(width, height)
+	targets = [size for size in sizes if size <= largest] or [largest]
+
+	variants = []
+	for size in targets:
+		scale = size / largest
+		dimensions = (max(1, round(width * scale)), max(1, round(height * scale)))
+		output_file = ART_DIR / f"{name}-{size}.{extension}"
+
+		resized = image if dimensions == image.size else image.resize(dimensions, Image.LANCZOS)
+		if image_format == "PNG":
+			resized.save(output_file, "PNG", optimize=True)
+		else:
+			resized.save(output_file, "JPEG", quality=ARTWORK_QUALITY, optimize=True, progressive=True)
+
+		variants.append({
+			"src": f"{TRACKS_DIR.name}/{ART_DIR.name}/{output_file.name}",
+			"sizes": f"{dimensions[0]}x{dimensions[1]}",
+			"type": mime_type
+		})
+
+	return variants
+
+
+def process_artwork(tracks):
+	"""Extract embedded cover art and write pre-sized variants
+
+	Identical images are stored once (named by content hash), and images
+	already converted by a previous scan are reused. Adds an "artwork" list
+	to each track that has embedded art, and writes tracks/art/artwork.json
+	with the album art and home screen icon variants for generate_manifests.py.
+	"""
+	try:
+		import PIL
+	except ImportError:
+		print("\nArtwork thumbnails unavailable (Pillow library not installed)")
+		return
+
+	from concurrent.futures import ThreadPoolExecutor
+
+	ART_DIR.mkdir(parents=True, exist_ok=True)
+
+	previous_images = {}
+	if ARTWORK_FILE.exists():
+		try:
+			with open(ARTWORK_FILE, 'r', encoding='utf-8') as f:
+				previous_images = json.load(f).get("images", {})
+		except (OSError, ValueError):
+			pass
+
+	# Collect unique images: key -> (data, sizes, format)
+	sources = {}
+	track_art = {}
+
+	def add_source(data, sizes, image_format):
+		key = f"{hashlib.sha1(data).hexdigest()[:12]}-{image_format.lower()}"
+		sources.setdefault(key, (data, sizes, image_format))
+		return key
+
+	for track in tracks:
+		try:
+			data = read_embedded_art(TRACKS_DIR / track['filename'])
+		except Exception as e:
+			print(f"✗ Error reading artwork from {track['filename']}: {e}")
+			continue
+		if data:
+			track_art[track['filename']] = add_source(data, ARTWORK_SIZES, "JPEG")
+
+	album_key = add_source(ALBUM_ART_FILE.read_bytes(), ARTWORK_SIZES, "JPEG") if ALBUM_ART_FILE.exists() else None
+	icon_key = add_source(ICON_SOURCE_FILE.read_bytes(), ICON_SIZES, "PNG") if ICON_SOURCE_FILE.exists() else None
+
+	def is_current(key):
+		variants = previous_images.get(key)
+		return bool(variants) and all((SCRIPT_DIR / variant["src"]).exists() for variant in variants)
+
+	def convert(key):
+		data, sizes, image_format = sources[key]
+		try:
+			return key, write_image_variants(data, key, sizes, image_format)
+		except Exception as e:
+			print(f"✗ Could not convert image {key}: {e}")
+			return key, []
+
+	images = {key: previous_images[key] for key in sources if is_current(key)}
+	pending = [key for key in sources if key not in images]
+	with ThreadPoolExecutor() as pool:
+		images.update(pool.map(convert, pending))
+
+	for track in tracks:
+		key = track_art.get(track['filename'])
+		if key and images.get(key):
+			track['artwork'] = images[key]
+		else:
+			track.pop('artwork', None)
+
+	# Remove variants of images that are no longer used
+	referenced = {Path(variant["src"]).name for variants in images.values() for variant in variants}
+	for art_file in ART_DIR.iterdir():
+		if art_file != ARTWORK_FILE and art_file.name not in referenced:
+			art_file.unlink()
+
+	artwork = {
+		"album": images.get(album_key, []),
+		"icons": images.get(icon_key, []),
+		"images": images
+	}
+	with open(ARTWORK_FILE, 'w', encoding='utf-8') as f:
+		json.dump(artwork, f, indent="\t")
+
+	print(f"\n✓ Artwork: {len(track_art)} track(s) with embedded art, "
+	      f"{len(sources)} unique image(s), {len(pending)} newly converted.")
+
+
+def measure_loudness(mp3_file):
+	"""Measure integrated loudness (LUFS) and true peak (dBFS) with ffmpeg's ebur128 filter"""
+	cmd = [
+		'ffmpeg', '-hide_banner', '-nostats',
+		'-i', str(mp3_file),
+		'-map', '0:a:0',
+		'-af', 'ebur128=peak=true',
+		'-f', 'null', '-'
+	]
+	result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+	                        universal_newlines=True, check=True)
+
+	# The summary at the end of the output has the whole-file values
+	summary = result.stderr[result.stderr.rfind("Summary:"):]
+	loudness = re.search(r'I:\s*(-?[\d.]+|-inf) LUFS', summary)
+	peak = re.search(r'Peak:\s*(-?[\d.]+|-inf) dBFS', summary)
+	if not loudness or not peak:
+		raise ValueError("could not parse ffmpeg loudness summary")
+
+	return float(loudness.group(1)), float(peak.group(1))
+
+
+def write_seek_indexes(tracks):
+	"""Write a seek index sidecar for each track and reference it from tracks.json
+
+	Each sidecar maps playing time to the byte offset of the frame playing
+	then, one entry per SEEK_INDEX_RESOLUTION seconds, so a range-capable
+	server (host.py answers ?t=<seconds>) can start a track anywhere without
+	reading what comes before. The frame walk also gives an exact duration,
+	which replaces mutagen's estimate for VBR files. Indexes are rebuilt only
+	when the MP3 is newer than its sidecar, and sidecars for tracks that are
+	gone are removed.
+	"""
+	from mpeg import build_seek_index
+
+	SEEK_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+	wanted = set()
+	built = 0
+
+	for track in tracks:
+		mp3_file = TRACKS_DIR / track['filename']
+		index_file = SEEK_INDEX_DIR / f"{track['filename']}.json"
+		wanted.add(index_file.name)
+
+		index = None
+		if index_file.exists() and index_file.stat().st_mtime_ns >= mp3_file.stat().st_mtime_ns:
+			try:
+				with open(index_file, 'r', encoding='utf-8') as f:
+					index = json.load(f)
+			except (OSError, ValueError):
+				index = None
+
+		if index is None:
+			try:
+				index = build_seek_index(mp3_file, SEEK_INDEX_RESOLUTION)
+			except OSError as e:
+				print(f"✗ Could not index {mp3_file.name}: {e}")
+			if index is None:
+				track.pop('seek_index', None)
+				continue
+			with open(index_file, 'w', encoding='utf-8') as f:
+				json.dump(index, f, separators=(',', ':'))
+			built += 1
+
+		track['duration'] = round(index['duration'], 2)
+		track['seek_index'] = index_file.relative_to(SCRIPT_DIR).as_posix()
+
+	for stale in SEEK_INDEX_DIR.glob("*.json"):
+		if stale.name not in wanted:
+			stale.unlink()
+
+	if built:
+		print(f"✓ Built seek indexes for {built} track(s)")
+
+
+def analyze_tracks(tracks):
+	"""Precompute ReplayGain values and gapless info for each track
+
+	Loudness is measured with ffmpeg in a worker pool, and results are cached
+	by content hash so unchanged tracks are never decoded twice. Encoder delay
+	and padding come from the LAME header and need no decoding.
+	"""
+	from concurrent.futures import ThreadPoolExecutor
+	from hashes import cached_file_digests
+	from mpeg import read_encoder_gapless
+
+	paths = {track['filename']: TRACKS_DIR / track['filename'] for track in tracks}
+	digests = cached_file_digests(list(paths.values()), HASH_CACHE_FILE)
+
+	cache = {}
+	if ANALYSIS_CACHE_FILE.exists():
+		try:
+			with open(ANALYSIS_CACHE_FILE, 'r', encoding='utf-8') as f:
+				cache = json.load(f)
+		except (OSError, ValueError):
+			pass
+
+	has_ffmpeg = shutil.which('ffmpeg') is not None
+	if not has_ffmpeg:
+		print("\nLoudness analysis unavailable (ffmpeg not found). Recording gapless info only.")
+
+	pending = sorted({
+		digest for digest in digests.values()
+		if digest and "loudness" not in cache.get(digest, {}) and has_ffmpeg
+	})
+	digest_paths = {digests[path]: path for path in paths.values() if digests[path]}
+
+	def analyze(digest):
+		mp3_file = digest_paths[digest]
+		try:
+			loudness, peak = measure_loudness(mp3_file)
+			return digest, {"loudness": loudness, "peak": peak}
+		except (subprocess.CalledProcessError, ValueError) as e:
+			print(f"✗ Could not analyze {mp3_file.name}: {e}")
+			return digest, None
+
+	if pending:
+		print(f"\nAnalyzing loudness of {len(pending)} track(s)...")
+		with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+			for digest, result in pool.map(analyze, pending):
+				if result:
+					cache.setdefault(digest, {}).update(result)
+
+	for track in tracks:
+		mp3_file = paths[track['filename']]
+		digest = digests[mp3_file]
+		entry = cache.setdefault(digest, {}) if digest else {}
+
+		if "gapless" not in entry:
+			entry["gapless"] = read_encoder_gapless(mp3_file)
+
+		# Digital silence measures -inf LUFS and gets no gain
+		if math.isfinite(entry.get("loudness", float("-inf"))):
+			gain = REPLAYGAIN_REFERENCE_LUFS - entry["loudness"]
+			track['replaygain'] = {
+				"track_gain": round(gain, 2),
+				"track_peak": round(10 ** (entry["peak"] / 20), 6),
+				"loudness": entry["loudness"]
+			}
+		if entry["gapless"]:
+			track['gapless'] = entry["gapless"]
+
+	CACHE_DIR.mkdir(parents=True, exist_ok=True)
+	with open(ANALYSIS_CACHE_FILE, 'w', encoding='utf-8') as f:
+		json.dump(cache, f)
+
+	analyzed = sum(1 for track in tracks if 'replaygain' in track)
+	print(f"\n✓ Analysis: {analyzed}/{len(tracks)} track(s) with ReplayGain values "
+	      f"({len(pending)} newly measured).")
+
+
+def write_tracks_json(tracks):
+	"""Write the track list to tracks.json"""
+	with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+		json.dump(tracks, f, indent="\t", ensure_ascii=False)
+
+
+def write_track_pages(tracks, page_size=DEFAULT_PAGE_SIZE, root=SCRIPT_DIR):
+	"""Write tracks as a compact index plus paged shards for large libraries
+
+	Shards are named after their content so a changed page gets a new URL
+	(and a new service worker), while unchanged pages stay cached.
+	root is the capsule folder whose /tracks gets the pages.
+	Returns the index that was written to tracks-index.json.
+	"""
+	tracks_dir = Path(root) / TRACKS_DIR.name
+	pages_dir = tracks_dir / TRACK_PAGES_DIR.name
+	pages_dir.mkdir(parents=True, exist_ok=True)
+
+	pages = []
+	for number, start in enumerate(range(0, len(tracks), page_size)):
+		content = json.dumps(tracks[start:start + page_size], separators=(',', ':'), ensure_ascii=False)
+		digest = hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]
+		page_file = pages_dir / f"{number:04d}-{digest}.json"
+		if not page_file.exists():
+			page_file.write_text(content, encoding='utf-8')
+		pages.append(f"{tracks_dir.name}/{pages_dir.name}/{page_file.name}")
+
+	# Remove shards left over from a previous scan
+	for page_file in pages_dir.glob("*.json"):
+		if f"{tracks_dir.name}/{pages_dir.name}/{page_file.name}" not in pages:
+			page_file.unlink()
+
+	index = {
+		"total": len(tracks),
+		"page_size": page_size,
+		"pages": pages
+	}
+	with open(tracks_dir / TRACKS_INDEX_FILE.name, 'w', encoding='utf-8') as f:
+		json.dump(index, f, separators=(',', ':'))
+
+	return index
+
+
 def scan_tracks():
 	"""Main function to scan MP3 files and generate tracks.json"""
-	# Import mutagen here (only after venv is active)
+	# Check mutagen is available (only after venv is active)
 	try:
-		from mutagen.mp3 import MP3
-		from mutagen.id3 import ID3
+		import mutagen
 	except ImportError:
 		print("Error: mutagen library not found. Please check your installation.")
 		sys.exit(1)
 
+	# Paged output (--paged or --page-size=N) for very large libraries
+	page_size = None
+	if "--paged" in sys.argv or get_option("page-size"):
+		try:
+			page_size = int(get_option("page-size", DEFAULT_PAGE_SIZE))
+		except ValueError:
+			page_size = 0
+		if page_size < 1:
+			print("Error: --page-size must be a positive whole number")
+			sys.exit(1)
+
+	# Encoding profile for converted sources (--encoding=NAME, see rip.py)
+	from rip import ENCODING_PROFILES
+	encoding = get_option("encoding")
+	if encoding is not None and encoding not in ENCODING_PROFILES:
+		print(f"Error: --encoding must be one of: {', '.join(ENCODING_PROFILES)}")
+		sys.exit(1)
+
 	# Check if tracks directory exists, create if it doesn't
 	if not TRACKS_DIR.exists():
 		print(f"Creating {TRACKS_DIR.name} directory...")
@@ -84,86 +814,65 @@ def scan_tracks():
 			print(f"Scan cancelled. {OUTPUT_FILE.name} was not modified.")
 			sys.exit(0)
 
+	# Convert FLAC/M4A/WAV/AIFF sources to MP3 first
+	with profiling.stage("source ingestion"):
+		ingest_sources(encoding)
+
 	# Find all MP3 files
-	mp3_files = list(TRACKS_DIR.glob("*.mp3"))
+	with profiling.stage("file discovery"):
+		mp3_files = list(TRACKS_DIR.glob("*.mp3"))
 
 	if not mp3_files:
 		print(f"No MP3 files found in {TRACKS_DIR}")
 		print(f"\nPlease add MP3 files to the {TRACKS_DIR.name} directory and run this script again.")
 		sys.exit(0)
 
-	print(f"Found {len(mp3_files)} MP3 file(s). Extracting metadata...\n")
-
-	tracks = []
-
-	for mp3_file in sorted(mp3_files):
-		try:
-			audio = MP3(mp3_file)
-
-			# Try to get ID3 tags
-			title = None
-			artist = None
+	print(f"Found {len(mp3_files)} MP3 file(s).")
 
-			if audio.tags:
-				# Try different title tags
-				if 'TIT2' in audio.tags:  # Title
-					title = str(audio.tags['TIT2'])
+	# Detect copies of the same track under different names
+	if "--no-dedupe-check" not in sys.argv:
+		with profiling.stage("duplicate detection"):
+			duplicates = find_duplicates(mp3_files)
+		if duplicates:
+			dropped = report_duplicates(duplicates, drop="--dedupe" in sys.argv)
+			mp3_files = [mp3_file for mp3_file in mp3_files if mp3_file not in dropped]
 
-				# Try different artist tags
-				if 'TPE1' in audio.tags:  # Artist
-					artist = str(audio.tags['TPE1'])
+	print("Extracting metadata...\n")
 
-			# Fallback to filename for title if not found
-			if not title:
-				title = mp3_file.stem  # filename without extension
-
-			# Fallback to "Unknown Artist" if not found
-			if not artist:
-				artist = "Unknown Artist"
-
-			track_info = {
-				"title": title,
-				"artist": artist,
-				"filename": mp3_file.name
-			}
-
-			tracks.append(track_info)
-			print(f"✓ {track_info['artist']} - {track_info['title']}")
-
-		except Exception as e:
-			print(f"✗ Error reading {mp3_file.name}: {e}")
-			continue
-
-	# Check if ALL titles start with numbers
-	# If so, strip the leading numbers from all titles
-	import re
-	all_have_leading_numbers = all(
-		re.match(r'^\d+\s*[-.]?\s*', track['title'])
-		for track in tracks
-	)
-
-	if all_have_leading_numbers and tracks:
-		print("\nDetected track numbers in all titles. Stripping them...")
-		for track in tracks:
-			original_title = track['title']
-			# Remove leading number pattern
-			cleaned_title = re.sub(r'^\d+\s*[-.]?\s*', '', original_title)
-			if cleaned_title:  # Only update if something remains
-				track['title'] = cleaned_title
-				if cleaned_title != original_title:
-					print(f"  {original_title} → {cleaned_title}")
+	with profiling.stage("tag parsing"):
+		tracks = extract_metadata(mp3_files)
+		strip_track_numbers(tracks)
 
 	if not tracks:
 		print("\nNo valid MP3 files could be processed.")
 		sys.exit(1)
 
+	# Extract cover art and write pre-sized variants
+	with profiling.stage("artwork"):
+		process_artwork(tracks)
+
+	# Time -> byte offset tables, plus exact durations (mutagen estimates VBR files)
+	with profiling.stage("seek index"):
+		write_seek_indexes(tracks)
+
+	# Loudness and gapless analysis (opt-in, decodes every new track once)
+	if "--analyze" in sys.argv:
+		with profiling.stage("loudness analysis"):
+			analyze_tracks(tracks)
+
 	# Write to tracks.json
 	try:
-		with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-			json.dump(tracks, f, indent="\t", ensure_ascii=False)
+		with profiling.stage("JSON write"):
+			write_tracks_json(tracks)
 
 		print(f"\n✓ Successfully generated {OUTPUT_FILE.name} with {len(tracks)} track(s).")
 
+		# Paged mode: also write a compact index and shards for lazy loading
+		if page_size:
+			with profiling.stage("JSON write (pages)"):
+				index = write_track_pages(tracks, page_size)
+			print(f"✓ Wrote {TRACKS_INDEX_FILE.name} with {len(index['pages'])} page(s) of up to {page_size} track(s).")
+
 	except Exception as e:
 		print(f"\nError writing {OUTPUT_FILE.name}: {e}")
 		sys.exit(1)
@@ -171,6 +880,8 @@ def scan_tracks():
 
 def main():
 	"""Main entry point"""
+	profiling.enable_from_argv()
+
 	# Check if we're already running in venv
 	if "--in-venv" not in sys.argv:
 		run_in_venv()
@@ -0,0 +1,224 @@
+"""Tests for deploy.py against a local directory and a stub S3 server"""
+
+import hashlib
+import hmac
+import json
+import re
+import shutil
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from deploy import DEPLOY_MANIFEST, ENTRY_POINTS, deploy, deploy_files
+from generate_manifests import build_pwa_files
+from mpeg import build_seek_index
+
+REPO = Path(__file__).parent.parent
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417-byte frames
+FRAME = b"\xFF\xFB\x90\x00" + b"\x00" * 413
+
+ACCESS_KEY = "test-key"
+SECRET_KEY = "test-secret"
+
+
+def write_manifests(root):
+	for name, content in build_pwa_files(root, "Test", "/", quiet=True).items():
+		(root / name).write_text(content, encoding="utf-8")
+
+
+def make_capsule(root, names=("a.mp3", "b.mp3")):
+	"""A capsule with a few silent tracks, their seek indexes and manifests"""
+	shutil.copytree(REPO / "resources", root / "resources")
+	(root / "tracks" / "seek").mkdir(parents=True)
+	tracks = []
+	for number, name in enumerate(names, 1):
+		track = root / "tracks" / name
+		track.write_bytes(FRAME * (50 * number))
+		(root / "tracks" / "seek" / f"{name}.json").write_text(json.dumps(build_seek_index(track)))
+		tracks.append({
+			"filename": name,
+			"title": name,
+			"artist": "Artist",
+			"seek_index": f"tracks/seek/{name}.json",
+		})
+	(root / "tracks" / "tracks.json").write_text(json.dumps(tracks), encoding="utf-8")
+	write_manifests(root)
+	return root
+
+
+def remove_track(root, name):
+	tracks = json.loads((root / "tracks" / "tracks.json").read_text(encoding="utf-8"))
+	tracks = [track for track in tracks if track["filename"] != name]
+	(root / "tracks" / "tracks.json").write_text(json.dumps(tracks), encoding="utf-8")
+	(root / "tracks" / name).unlink()
+	(root / "tracks" / "seek" / f"{name}.json").unlink()
+	write_manifests(root)
+
+
+def last_summary(capsys):
+	return re.findall(r"✓ Uploaded (\d+) file\(s\), removed (\d+)", capsys.readouterr().out)[-1]
+
+
+class S3Stub(BaseHTTPRequestHandler):
+	"""Just enough of S3 for deploy.py: signed GET, PUT and DELETE of objects"""
+
+	def log_message(self, format, *args):
+		pass
+
+	def check_signature(self, body):
+		"""Recompute the SigV4 signature from what arrived and compare"""
+		authorization = re.fullmatch(
+			r"AWS4-HMAC-SHA256 Credential=([^/]+)/([^,]+), SignedHeaders=([^,]+), Signature=(\w+)",
+			self.headers["Authorization"],
+		)
+		access_key, scope, signed_headers, signature = authorization.groups()
+		assert access_key == ACCESS_KEY
+		assert self.headers["x-amz-content-sha256"] == hashlib.sha256(body).hexdigest()
+
+		names = signed_headers.split(";")
+		canonical_request = "\n".join([
+			self.command,
+			urlsplit(self.path).path,
+			"",
+			"".join(f"{name}:{self.headers[name].strip()}\n" for name in names),
+			signed_headers,
+			self.headers["x-amz-content-sha256"],
+		])
+		string_to_sign = "\n".join([
+			"AWS4-HMAC-SHA256",
+			self.headers["x-amz-date"],
+			scope,
+			hashlib.sha256(canonical_request.encode()).hexdigest(),
+		])
+		key = f"AWS4{SECRET_KEY}".encode()
+		for part in scope.split("/"):
+			key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+		assert hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest() == signature
+
+	def reply(self, status, body=b""):
+		self.send_response(status)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def handle_signed(self, body=b""):
+		try:
+			self.check_signature(body)
+		except (AssertionError, AttributeError, TypeError):
+			self.server.bad_signatures.append(self.path)
+			self.reply(403)
+			return False
+		self.server.requests.append((self.command, self.path))
+		return True
+
+	def do_GET(self):
+		if self.handle_signed():
+			if self.path in self.server.objects:
+				self.reply(200, self.server.objects[self.path])
+			else:
+				self.reply(404)
+
+	def do_PUT(self):
+		body = self.rfile.read(int(self.headers["Content-Length"]))
+		if self.handle_signed(body):
+			self.server.objects[self.path] = body
+			self.reply(200)
+
+	def do_DELETE(self):
+		if self.handle_signed():
+			self.server.objects.pop(self.path, None)
+			self.reply(204)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+	monkeypatch.setenv("AWS_ACCESS_KEY_ID", ACCESS_KEY)
+	monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", SECRET_KEY)
+	monkeypatch.delenv("AWS_SESSION_TOKEN", raising=False)
+	server = ThreadingHTTPServer(("127.0.0.1", 0), S3Stub)
+	server.objects = {}
+	server.requests = []
+	server.bad_signatures = []
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	server.endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+	yield server
+	server.shutdown()
+	server.server_close()
+
+
+def test_local_deploy_uploads_only_the_changed_file_and_removes_stale_ones(tmp_path, capsys):
+	root = make_capsule(tmp_path / "capsule")
+	site = tmp_path / "site"
+
+	assert deploy(str(site), root=root)
+	assert last_summary(capsys) == (str(len(deploy_files(root))), "0")
+	for path in deploy_files(root):
+		assert (site / path).read_bytes() == (root / path).read_bytes()
+
+	# Seek indexes aren't in resource-manifest.json's revisions, so rebuilding
+	# one changes nothing else
+	sidecar = root / "tracks" / "seek" / "a.mp3.json"
+	sidecar.write_text(json.dumps(build_seek_index(root / "tracks" / "a.mp3", 0.5)))
+	before = {path: (site / path).stat().st_mtime_ns for path in deploy_files(root)}
+
+	assert deploy(str(site), root=root)
+	assert last_summary(capsys) == ("1", "0")
+	assert (site / "tracks/seek/a.mp3.json").read_bytes() == sidecar.read_bytes()
+	changed = [path for path, mtime in before.items() if (site / path).stat().st_mtime_ns != mtime]
+	assert changed == ["tracks/seek/a.mp3.json"]
+
+	remove_track(root, "b.mp3")
+	assert deploy(str(site), root=root)
+	assert last_summary(capsys)[1] == "2"
+	assert not (site / "tracks" / "b.mp3").exists()
+	assert not (site / "tracks" / "seek" / "b.mp3.json").exists()
+	deployed = json.loads((site / DEPLOY_MANIFEST).read_text())["files"]
+	assert sorted(deployed) == sorted(deploy_files(root))
+
+
+def test_s3_deploy_signs_every_request(tmp_path, s3, capsys):
+	root = make_capsule(tmp_path)
+	files = deploy_files(root)
+
+	assert deploy("s3://bucket/site", endpoint=s3.endpoint, root=root)
+
+	assert s3.bad_signatures == []
+	puts = [path for method, path in s3.requests if method == "PUT"]
+	assert sorted(puts) == sorted(f"/bucket/site/{path}" for path in [*files, DEPLOY_MANIFEST])
+	# Entry points go up after the content they point at
+	entry_points = [puts.index(f"/bucket/site/{path}") for path in ENTRY_POINTS]
+	content = [puts.index(f"/bucket/site/{path}") for path in files if path not in ENTRY_POINTS]
+	assert max(content) < min(entry_points)
+	assert s3.objects["/bucket/site/tracks/a.mp3"] == (root / "tracks" / "a.mp3").read_bytes()
+
+	manifest = json.loads(s3.objects[f"/bucket/site/{DEPLOY_MANIFEST}"])["files"]
+	assert sorted(manifest) == sorted(files)
+
+
+def test_s3_deploy_reads_its_manifest_and_deletes_stale_objects(tmp_path, s3, capsys):
+	root = make_capsule(tmp_path)
+	assert deploy("s3://bucket/site", endpoint=s3.endpoint, root=root)
+
+	s3.requests.clear()
+	assert deploy("s3://bucket/site", endpoint=s3.endpoint, root=root)
+	assert s3.requests == [
+		("GET", f"/bucket/site/{DEPLOY_MANIFEST}"),
+		("PUT", f"/bucket/site/{DEPLOY_MANIFEST}"),
+	]
+
+	remove_track(root, "b.mp3")
+	s3.requests.clear()
+	assert deploy("s3://bucket/site", endpoint=s3.endpoint, root=root)
+
+	assert s3.bad_signatures == []
+	deletes = sorted(path for method, path in s3.requests if method == "DELETE")
+	assert deletes == ["/bucket/site/tracks/b.mp3", "/bucket/site/tracks/seek/b.mp3.json"]
+	assert "/bucket/site/tracks/b.mp3" not in s3.objects
+	assert last_summary(capsys)[1] == "2"
@@ -0,0 +1,49 @@
+"""Tests for scan.find_duplicates"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from scan import find_duplicates
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417-byte frames
+FRAME = b"\xFF\xFB\x90\x00" + b"\x00" * 413
+
+
+def id3v2(title):
+	"""A minimal ID3v2.3 tag holding a TIT2 frame"""
+	body = b"TIT2" + (len(title) + 1).to_bytes(4, "big") + b"\x00\x00\x00" + title.encode()
+	size = len(body)
+	synchsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+	return b"ID3\x03\x00\x00" + synchsafe + body
+
+
+def write_mp3(path, title, frames=8):
+	path.write_bytes(id3v2(title) + FRAME * frames)
+	return path
+
+
+def test_identical_copies_and_retagged_copy_are_reported_separately(tmp_path):
+	original = write_mp3(tmp_path / "a.mp3", "Song")
+	copy = write_mp3(tmp_path / "b.mp3", "Song")
+	retagged = write_mp3(tmp_path / "c.mp3", "Song (Remastered)")
+
+	assert find_duplicates([retagged, copy, original]) == [
+		("exact", [original, copy]),
+		("retagged", [original, retagged]),
+	]
+
+
+def test_retagged_copies_only(tmp_path):
+	first = write_mp3(tmp_path / "a.mp3", "Song")
+	second = write_mp3(tmp_path / "b.mp3", "Song!")
+
+	assert find_duplicates([first, second]) == [("retagged", [first, second])]
+
+
+def test_different_audio_is_not_a_duplicate(tmp_path):
+	first = write_mp3(tmp_path / "a.mp3", "Song", frames=8)
+	second = write_mp3(tmp_path / "b.mp3", "Song", frames=9)
+
+	assert find_duplicates([first, second]) == []
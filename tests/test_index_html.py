@@ -0,0 +1,47 @@
+"""Tests for the stylesheet generate_manifests.py inlines into index.html"""
+
+import json
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from generate_manifests import build_pwa_files
+from verify import verify_capsule
+
+REPO = Path(__file__).parent.parent
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417-byte frames
+FRAME = b"\xFF\xFB\x90\x00" + b"\x00" * 413
+
+
+def make_capsule(root):
+	shutil.copytree(REPO / "resources", root / "resources")
+	(root / "tracks").mkdir()
+	(root / "tracks" / "song.mp3").write_bytes(FRAME * 8)
+	track = {"filename": "song.mp3", "title": "Song", "artist": "Artist"}
+	(root / "tracks" / "tracks.json").write_text(json.dumps([track]), encoding="utf-8")
+	for name, content in build_pwa_files(root, "Test", "/", quiet=True).items():
+		(root / name).write_text(content, encoding="utf-8")
+	return root
+
+
+def test_inlined_styles_point_at_resources(tmp_path):
+	root = make_capsule(tmp_path)
+	page = (root / "index.html").read_text(encoding="utf-8")
+
+	assert "url('resources/play.png')" in page
+	assert "url('play.png')" not in page
+	static_files = json.loads((root / "resource-manifest.json").read_text())["static_files"]
+	assert "resources/next.png" in static_files
+	assert verify_capsule(root)[0] == []
+
+
+def test_missing_stylesheet_image_fails_verification(tmp_path):
+	root = make_capsule(tmp_path)
+	(root / "resources" / "pause.png").unlink()
+
+	problems = verify_capsule(root)[0]
+
+	assert "resources/pause.png: missing" in problems
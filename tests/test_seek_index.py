@@ -0,0 +1,41 @@
+"""Tests for mpeg.build_seek_index and host.seek_offset"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from host import seek_offset
+from mpeg import build_seek_index
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417-byte frames of 1152 samples
+FRAME = b"\xFF\xFB\x90\x00" + b"\x00" * 413
+FRAME_SECONDS = 1152 / 44100
+
+
+def test_offsets_start_at_the_frame_playing_each_second(tmp_path):
+	track = tmp_path / "song.mp3"
+	track.write_bytes(FRAME * 100)
+
+	index = build_seek_index(track)
+
+	assert index["duration"] == round(100 * FRAME_SECONDS, 3)
+	assert len(index["offsets"]) == 3
+	for second, offset in enumerate(index["offsets"]):
+		assert offset % len(FRAME) == 0
+		assert (offset // len(FRAME)) * FRAME_SECONDS >= second
+		assert (offset // len(FRAME) - 1) * FRAME_SECONDS < second
+
+
+def test_seek_offset_reads_the_sidecar(tmp_path):
+	track = tmp_path / "song.mp3"
+	track.write_bytes(FRAME * 100)
+	(tmp_path / "seek").mkdir()
+	index = build_seek_index(track)
+	(tmp_path / "seek" / "song.mp3.json").write_text(json.dumps(index))
+
+	assert seek_offset(track, "1.5") == index["offsets"][1]
+	assert seek_offset(track, "600") == index["offsets"][-1]
+	assert seek_offset(track, "soon") is None
+	assert seek_offset(tmp_path / "other.mp3", "1") is None
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Verify - Pre-flight check of a capsule before it ships
+Makes sure every file listed in resource-manifest.json exists, has the size and
+content hash generate_manifests.py recorded, and that every MP3 has valid audio
+frames. Standard library only, so it can run outside the virtual environment.
+
+Usage:
+	python verify.py [--deep]
+
+By default files are hashed through the digest cache in .cache/hashes.json,
+so only files whose size or modification time changed are read again.
+--deep re-reads everything, which also catches corruption that left the
+modification time alone.
+"""
+
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import mpeg
+import profiling
+from hashes import DEFAULT_WORKERS, cached_file_digests, digest_files
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+
+
+def check_file(root, url, expected_bytes, is_track):
+	"""Check one listed file; returns (problems, size or None if missing)"""
+	path = root / url
+	try:
+		size = path.stat().st_size
+	except OSError:
+		return ["missing"], None
+
+	problems = []
+	if expected_bytes is not None and size != expected_bytes:
+		problems.append(f"is {size} bytes, expected {expected_bytes}")
+
+	if is_track:
+		try:
+			if mpeg.audio_data_range(path) is None:
+				problems.append("no MPEG audio frames found")
+		except OSError as e:
+			problems.append(f"could not be read ({e})")
+
+	return problems, size
+
+
+def verify_capsule(root=SCRIPT_DIR, deep=False, workers=DEFAULT_WORKERS):
+	"""Check every file listed in the capsule's resource-manifest.json
+
+	Returns (problems, file_count, total_bytes) where problems is a list of
+	"path: what's wrong" strings. Raises OSError / ValueError if
+	resource-manifest.json itself can't be read.
+	"""
+	root = Path(root)
+	with open(root / "resource-manifest.json", "r", encoding="utf-8") as f:
+		resource_manifest = json.load(f)
+
+	revisions = resource_manifest.get("revisions", {})
+	tracks = set(resource_manifest.get("tracks", []))
+	planned_bytes = {
+		track["url"]: track["bytes"]
+		for track in resource_manifest.get("install_plan", {}).get("tracks", [])
+	}
+	urls = list(dict.fromkeys(
+		"index.html" if url == "./" else url
+		for url in [
+			*resource_manifest.get("static_files", []),
+			*resource_manifest.get("tracks", []),
+		]
+	))
+
+	def run(url):
+		expected_bytes = revisions.get(url, {}).get("bytes", planned_bytes.get(url))
+		return url, check_file(root, url, expected_bytes, url in tracks)
+
+	with profiling.stage("file checks"):
+		with ThreadPoolExecutor(max_workers=workers) as pool:
+			results = dict(pool.map(run, urls))
+
+	problems = []
+	total_bytes = 0
+	to_hash = {}
+	for url in urls:
+		file_problems, size = results[url]
+		problems.extend(f"{url}: {problem}" for problem in file_problems)
+		total_bytes += size or 0
+		# A size mismatch already says the content changed
+		if not file_problems and url in revisions:
+			to_hash[url] = root / url
+
+	with profiling.stage("hash checks"):
+		if deep:
+			digests = digest_files({url: (path, 0, None) for url, path in to_hash.items()}, workers)
+		else:
+			cached = cached_file_digests(list(to_hash.values()), root / ".cache" / "hashes.json", workers)
+			digests = {url: cached[path] for url, path in to_hash.items()}
+
+	for url, digest in digests.items():
+		if digest is None:
+			problems.append(f"{url}: could not be read")
+		elif digest != revisions[url]["sha256"]:
+			problems.append(f"{url}: content changed since generate_manifests.py last ran")
+
+	if not revisions:
+		problems.append("resource-manifest.json has no recorded revisions; re-run generate_manifests.py")
+
+	return problems, len(urls), total_bytes
+
+
+def report(problems, file_count, total_bytes, elapsed):
+	"""Print the outcome of verify_capsule(); returns True if nothing is wrong"""
+	size = f"{total_bytes / 1024 / 1024:.1f} MB"
+	if not problems:
+		print(f"✓ Verified {file_count} file(s), {size}, in {elapsed:.1f}s")
+		return True
+
+	for problem in problems:
+		print(f"✗ {problem}")
+	print(f"✗ {len(problems)} problem(s) in {file_count} file(s), {size} (checked in {elapsed:.1f}s)")
+	print("  Re-run scan.py and generate_manifests.py after fixing /tracks, then verify again")
+	return False
+
+
+def run_verification(root=SCRIPT_DIR, deep=False):
+	"""Verify the capsule and print the result; returns True if it's ready to ship"""
+	started = time.perf_counter()
+	try:
+		problems, file_count, total_bytes = verify_capsule(root, deep)
+	except (OSError, ValueError) as e:
+		print(f"✗ Could not read resource-manifest.json ({e}); run generate_manifests.py first")
+		return False
+	return report(problems, file_count, total_bytes, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+	profiling.enable_from_argv()
+	sys.exit(0 if run_verification(deep="--deep" in sys.argv) else 1)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Watcher - Notices file changes in a set of directories
+Uses inotify on Linux and falls back to polling file modification times elsewhere
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+DEBOUNCE_SECONDS = 0.5
+POLL_INTERVAL = 1.0
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_MODIFY)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def open_inotify(directories):
+	"""Start watching directories with inotify
+
+	Returns (name, wait) where wait(timeout) blocks for up to timeout seconds
+	and returns the set of changed paths, or None if inotify is unavailable.
+	"""
+	if not sys.platform.startswith("linux"):
+		return None
+
+	try:
+		libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+		fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+	except (OSError, AttributeError):
+		return None
+
+	if fd < 0:
+		return None
+
+	watches = {}
+	for directory in directories:
+		wd = libc.inotify_add_watch(fd, os.fsencode(str(directory)), WATCH_MASK)
+		if wd < 0:
+			os.close(fd)
+			return None
+		watches[wd] = Path(directory)
+
+	def wait(timeout):
+		readable, _, _ = select.select([fd], [], [], timeout)
+		if not readable:
+			return set()
+
+		try:
+			data = os.read(fd, 64 * 1024)
+		except BlockingIOError:
+			return set()
+
+		changed = set()
+		offset = 0
+		while offset + EVENT_HEADER.size <= len(data):
+			wd, _mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+			offset += EVENT_HEADER.size
+			name = data[offset:offset + length].rstrip(b"\0")
+			offset += length
+			if wd in watches and name:
+				changed.add(watches[wd] / os.fsdecode(name))
+		return changed
+
+	return "inotify", wait
+
+
+def snapshot(directories):
+	"""Map every file in the directories to its (mtime, size)"""
+	files = {}
+	for directory in directories:
+		try:
+			entries = list(os.scandir(directory))
+		except OSError:
+			continue
+		for entry in entries:
+			try:
+				if entry.is_file():
+					stat = entry.stat()
+					files[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+			except OSError:
+				continue
+	return files
+
+
+def open_polling(directories):
+	"""Start watching directories by polling modification times
+
+	Returns (name, wait) with the same contract as open_inotify().
+	"""
+	previous = snapshot(directories)
+
+	def wait(timeout):
+		nonlocal previous
+		time.sleep(timeout)
+		current = snapshot(directories)
+		changed = {
+			path for path in previous.keys() | current.keys()
+			if previous.get(path) != current.get(path)
+		}
+		previous = current
+		return changed
+
+	return "polling", wait
+
+
+def watch(directories, on_change, debounce=DEBOUNCE_SECONDS, on_start=None):
+	"""Call on_change(paths) whenever files in the directories change
+
+	Changes are collected until the directories have been quiet for `debounce`
+	seconds, so a batch of files copied in at once triggers a single call.
+	Runs forever; start it on a daemon thread.
+	"""
+	name, wait = open_inotify(directories) or open_polling(directories)
+	if on_start:
+		on_start(name)
+
+	pending = set()
+	while True:
+		changed = wait(debounce if pending else POLL_INTERVAL)
+		if changed:
+			pending |= changed
+			continue
+
+		if pending:
+			batch, pending = pending, set()
+			try:
+				on_change(batch)
+			except Exception as e:
+				print(f"✗ Error handling changes: {e}")